@@ -7,16 +7,22 @@ from http.server import BaseHTTPRequestHandler
 import json
 import os
 import sys
+import tempfile
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from api.db import (
-    get_dates, get_status, update_status_with_results,
-    get_alerted_products, add_alerted_products_batch
-)
-from vatican_client import VaticanClient
+from vatican_client import VaticanClient, filter_products
 from telegram_notifier import TelegramNotifier
+from notification_queue import NotificationQueue
+from notification_channels import create_notifier
+from request_budget import RequestBudget, SupabaseBudgetStore
+from date_scheduler import DateScheduler, SupabaseCheckStore, parse_date
+from storage import create_storage
+from api.db import get_request_stats
+from config import MAX_DATES_PER_CHECK
+
+storage = create_storage('supabase')
 
 
 class handler(BaseHTTPRequestHandler):
@@ -44,7 +50,7 @@ class handler(BaseHTTPRequestHandler):
             product_filter = os.environ.get('PRODUCT_FILTER', '')
 
             # Get target dates from database
-            target_dates = get_dates()
+            target_dates = storage.get_dates()
 
             if not target_dates:
                 self._send_response({
@@ -54,69 +60,116 @@ class handler(BaseHTTPRequestHandler):
                 })
                 return
 
-            # Initialize Vatican client
-            client = VaticanClient()
-            notifier = TelegramNotifier()
+            # Budget is shared across invocations through Supabase
+            budget = RequestBudget(store=SupabaseBudgetStore())
+            allowance = budget.cycle_allowance()
+            if allowance == 0:
+                self._send_response({
+                    'success': True,
+                    'message': 'Presupuesto de peticiones agotado',
+                    'availability': {},
+                    'budget': budget.get_status()
+                })
+                return
+
+            # Rotate across invocations: the dates checked longest ago go first
+            # (nearest first among ties), capped like the embedded monitor by
+            # MAX_DATES_PER_CHECK and the budget allowance
+            valid_dates = sorted(
+                (d for d in target_dates if d and parse_date(d)),
+                key=parse_date
+            )
+            limits = [allowance] if allowance > 0 else []
+            if MAX_DATES_PER_CHECK > 0:
+                limits.append(MAX_DATES_PER_CHECK)
+            checks = SupabaseCheckStore()
+            scheduler = DateScheduler(max_per_cycle=0, interval_seconds=budget.interval_seconds)
+            scheduler.restore(checks.load(valid_dates))
+            dates_to_check = scheduler.select(valid_dates, min(limits) if limits else None)
 
-            # Check availability
+            # Initialize Vatican client
+            client = VaticanClient(budget=budget)
+            # Serverless: no background sender, so the queue is drained before
+            # responding (rate limits and RetryAfter are still honoured)
+            notifications = NotificationQueue(path=os.path.join(tempfile.gettempdir(), 'notification_queue.db'))
+            notifier = create_notifier(TelegramNotifier(queue=notifications))
+
+            # Check availability; failed requests are not marked as checked, so
+            # those dates stay first in line for the next invocation
             availability = {}
-            for date in target_dates:
-                if not date:
+            checked_dates = []
+            for date in dates_to_check:
+                data = client.search_availability(date, visitor_num, visit_tag, who_id)
+                if data.get('error'):
                     continue
+                checked_dates.append(date)
 
-                products = client.get_available_products(
-                    visit_date=date,
-                    visitor_num=visitor_num,
-                    tag=visit_tag,
-                    who_id=who_id,
-                    product_filter=product_filter if product_filter else None
-                )
-
+                products = filter_products(data.get('visits', []), product_filter or None)
                 if products:
                     availability[date] = products
-
-            # Filter new availability (not alerted before)
-            alerted = get_alerted_products()
+            checks.save(checked_dates)
+
+            # Server-side dedup: only this cycle's candidate keys are sent, and
+            # the ones never alerted before come back already marked, so two
+            # overlapping invocations cannot alert the same product
+            candidates = [
+                f"{date}_{product.get('id', 0)}"
+                for date, products in availability.items()
+                for product in products
+            ]
+            new_product_keys = set(storage.claim_alerted(candidates))
             new_availability = {}
-            new_product_keys = []
-
             for date, products in availability.items():
-                new_products = []
-                for product in products:
-                    key = f"{date}_{product.get('id', 0)}"
-                    if key not in alerted:
-                        new_products.append(product)
-                        new_product_keys.append(key)
-
+                new_products = [p for p in products if f"{date}_{p.get('id', 0)}" in new_product_keys]
                 if new_products:
                     new_availability[date] = new_products
 
             # Send Telegram alert for new availability
             alert_sent = False
             if new_availability and notifier.is_configured():
-                success = notifier.send_availability_alert(new_availability)
-                if success:
-                    alert_sent = True
-                    # Batch insert all new product keys
-                    add_alerted_products_batch(new_product_keys)
-
-            # Update status with results and increment counters in one operation
-            updated_status = update_status_with_results(
-                last_check=datetime.now().isoformat(),
-                last_results=availability,
+                alert_sent = notifier.send_availability_alert(new_availability)
+            if new_product_keys and not alert_sent:
+                # Never enqueued: unmark so the next run alerts again
+                storage.release_alerted(new_product_keys)
+            # Best effort: whatever does not go out in time stays queued (keys
+            # still claimed) and is sent by the next warm invocation's drain
+            if notifications.pending_count():
+                notifications.drain(timeout=10)
+
+            # Normalised snapshot: only products whose state changed are written
+            # and last_results is rebuilt server-side when something changed;
+            # the full blob is only sent if the snapshot could not be recorded
+            checked_at = datetime.now().isoformat()
+            changes = storage.record_availability(
+                checked_dates, availability, observed_at=checked_at, tracked_dates=target_dates
+            )
+
+            # Update status and increment counters in one operation
+            updated_status = storage.update_status_with_results(
+                last_check=checked_at,
+                last_results=availability if changes < 0 else None,
                 increment_check=True,
                 increment_alert=alert_sent
             )
+            storage.append_history({
+                'checked_at': checked_at,
+                'queries': len(dates_to_check),
+                'available': {date: len(products) for date, products in availability.items()},
+                'alerts': int(alert_sent)
+            })
             check_count = updated_status.get('check_count', 0)
             alerts_sent = updated_status.get('alerts_sent', 0) if alert_sent else 0
 
             self._send_response({
                 'success': True,
                 'check_count': check_count,
-                'dates_checked': len(target_dates),
+                'dates_checked': len(checked_dates),
                 'availability': availability,
+                'availability_changes': changes,
                 'new_availability': new_availability,
-                'alerts_sent': alerts_sent
+                'alerts_sent': alerts_sent,
+                'budget': budget.get_status(),
+                'db': get_request_stats()
             })
 
         except Exception as e:
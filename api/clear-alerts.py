@@ -8,7 +8,9 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from api.db import clear_alerted_products
+from storage import create_storage
+
+storage = create_storage('supabase')
 
 
 class handler(BaseHTTPRequestHandler):
@@ -21,7 +23,7 @@ class handler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         try:
-            success = clear_alerted_products()
+            success = storage.clear_alerted()
 
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
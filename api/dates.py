@@ -8,7 +8,10 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from api.db import get_dates, add_date, remove_date
+from storage import create_storage
+from date_ranges import expand_date_request, literal_dates
+
+storage = create_storage('supabase')
 
 
 class handler(BaseHTTPRequestHandler):
@@ -21,75 +24,64 @@ class handler(BaseHTTPRequestHandler):
 
     def do_GET(self):
         try:
-            dates = get_dates()
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps({'dates': dates}).encode())
+            self._send({'dates': storage.get_dates()})
         except Exception as e:
             self._error(str(e))
 
     def do_POST(self):
+        """
+        Add dates: a single 'date', a 'dates' list, ranges or months filtered
+        by weekday ('from'/'to', 'month', 'weekdays', 'ranges'). Everything is
+        validated in one pass and written with a single request.
+        """
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
-            data = json.loads(body)
-
-            date = data.get('date', '').strip()
-            if not date:
-                self._error('Fecha requerida', 400)
+            data = self._read_json()
+            try:
+                dates, invalid = expand_date_request(data)
+            except ValueError as e:
+                self._error(str(e), 400)
                 return
 
-            # Validate format DD/MM/YYYY
-            import re
-            if not re.match(r'^\d{2}/\d{2}/\d{4}$', date):
-                self._error('Formato invalido. Use DD/MM/YYYY', 400)
+            if not dates:
+                self._error('Formato invalido. Use DD/MM/YYYY' if invalid else 'Fecha requerida', 400)
                 return
 
-            dates = get_dates()
-            if date in dates:
+            added = storage.add_dates(dates)
+            if not added and data.get('date') and len(dates) == 1:
                 self._error('Fecha ya existe', 400)
                 return
 
-            add_date(date)
-            dates = get_dates()
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps({'success': True, 'dates': dates}).encode())
+            self._send({'success': True, 'added': added, 'invalid': invalid, 'dates': storage.get_dates()})
 
         except Exception as e:
             self._error(str(e))
 
     def do_DELETE(self):
+        """Remove dates (same body format as POST)."""
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
-            data = json.loads(body)
-
-            date = data.get('date', '').strip()
-            if not date:
-                self._error('Fecha requerida', 400)
+            data = self._read_json()
+            try:
+                dates, invalid = expand_date_request(data)
+            except ValueError as e:
+                self._error(str(e), 400)
                 return
 
-            remove_date(date)
-            dates = get_dates()
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps({'success': True, 'dates': dates}).encode())
+            removed = storage.remove_dates(dates + literal_dates(data))
+            self._send({'success': True, 'removed': removed, 'invalid': invalid, 'dates': storage.get_dates()})
 
         except Exception as e:
             self._error(str(e))
 
-    def _error(self, message, code=500):
+    def _read_json(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(content_length) or b'{}')
+
+    def _send(self, data, code=200):
         self.send_response(code)
         self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps({'error': message}).encode())
+        self.wfile.write(json.dumps(data).encode())
+
+    def _error(self, message, code=500):
+        self._send({'error': message}, code)
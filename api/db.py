@@ -1,14 +1,93 @@
 """
 Supabase Database Client for Vatican Monitor
 Using REST API directly to avoid async issues in serverless
+
+All calls share one pooled keep-alive session, so a warm process reuses the
+TLS connection to Supabase instead of opening a new one per call. Every
+request has a (connect, read) timeout, connection failures and 429/5xx
+responses are retried with backoff (non-idempotent POSTs only when the
+request never reached the server), and request counts and latency are
+exposed through get_request_stats().
 """
 import os
 import json
+import threading
+import time
 import requests
-from datetime import datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY', '')
+SUPABASE_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', 3.05))
+SUPABASE_READ_TIMEOUT = float(os.environ.get('SUPABASE_READ_TIMEOUT', 10))
+SUPABASE_RETRIES = int(os.environ.get('SUPABASE_RETRIES', 2))
+SUPABASE_POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE', 10))
+
+
+def _create_session() -> requests.Session:
+    retry = Retry(
+        total=SUPABASE_RETRIES,
+        connect=SUPABASE_RETRIES,
+        read=SUPABASE_RETRIES,
+        status=SUPABASE_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # Reads and deletes are safe to repeat; POSTs (inserts, RPC increments)
+        # are only retried on connection errors, before anything was sent
+        allowed_methods=frozenset({'GET', 'HEAD', 'DELETE', 'OPTIONS'}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SUPABASE_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = _create_session()
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'by_endpoint': {}}
+
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request through the pooled session, recording count and latency."""
+    kwargs.setdefault('timeout', (SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT))
+    endpoint = f"{method} {url.split('/rest/v1/', 1)[-1]}"
+    started = time.perf_counter()
+    failed = True
+    try:
+        response = _session.request(method, url, **kwargs)
+        failed = response.status_code >= 400
+        return response
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _stats_lock:
+            _stats['requests'] += 1
+            _stats['errors'] += int(failed)
+            _stats['total_ms'] += elapsed_ms
+            _stats['max_ms'] = max(_stats['max_ms'], elapsed_ms)
+            entry = _stats['by_endpoint'].setdefault(endpoint, {'requests': 0, 'total_ms': 0.0})
+            entry['requests'] += 1
+            entry['total_ms'] += elapsed_ms
+
+
+def get_request_stats() -> dict:
+    """Request count, errors and latency (ms) since the process started."""
+    with _stats_lock:
+        count = _stats['requests']
+        return {
+            'requests': count,
+            'errors': _stats['errors'],
+            'avg_ms': round(_stats['total_ms'] / count, 1) if count else 0.0,
+            'max_ms': round(_stats['max_ms'], 1),
+            'by_endpoint': {
+                name: {'requests': e['requests'], 'avg_ms': round(e['total_ms'] / e['requests'], 1)}
+                for name, e in _stats['by_endpoint'].items()
+            }
+        }
 
 
 def _headers():
@@ -29,7 +108,8 @@ def _api_url(table: str) -> str:
 def get_dates() -> list:
     """Get all target dates."""
     try:
-        response = requests.get(
+        response = _request(
+            'GET',
             _api_url('target_dates'),
             headers=_headers(),
             params={'select': 'date'}
@@ -45,7 +125,8 @@ def get_dates() -> list:
 def add_date(date: str) -> bool:
     """Add a date to monitor."""
     try:
-        response = requests.post(
+        response = _request(
+            'POST',
             _api_url('target_dates'),
             headers=_headers(),
             json={'date': date}
@@ -59,7 +140,8 @@ def add_date(date: str) -> bool:
 def remove_date(date: str) -> bool:
     """Remove a date from monitoring."""
     try:
-        response = requests.delete(
+        response = _request(
+            'DELETE',
             _api_url('target_dates'),
             headers=_headers(),
             params={'date': f'eq.{date}'}
@@ -70,12 +152,54 @@ def remove_date(date: str) -> bool:
         return False
 
 
+def add_dates(dates: list) -> list:
+    """Add several dates in one request; returns the ones that were new."""
+    if not dates:
+        return []
+    try:
+        headers = _headers()
+        headers['Prefer'] = 'return=representation,resolution=ignore-duplicates'
+        response = _request(
+            'POST',
+            _api_url('target_dates'),
+            headers=headers,
+            params={'on_conflict': 'date', 'select': 'date'},
+            json=[{'date': date} for date in dates]
+        )
+        if response.status_code in [200, 201]:
+            return [row['date'] for row in response.json()]
+        return []
+    except Exception as e:
+        print(f"Error adding dates: {e}")
+        return []
+
+
+def remove_dates(dates: list) -> list:
+    """Remove several dates in one request; returns the ones that existed."""
+    if not dates:
+        return []
+    try:
+        response = _request(
+            'DELETE',
+            _api_url('target_dates'),
+            headers=_headers(),
+            params={'date': f"in.({','.join(json.dumps(d) for d in dates)})", 'select': 'date'}
+        )
+        if response.status_code == 200:
+            return [row['date'] for row in response.json()]
+        return []
+    except Exception as e:
+        print(f"Error removing dates: {e}")
+        return []
+
+
 # ============ STATUS ============
 
 def get_status() -> dict:
     """Get monitor status."""
     try:
-        response = requests.get(
+        response = _request(
+            'GET',
             _api_url('monitor_status'),
             headers=_headers(),
             params={'id': 'eq.1'}
@@ -98,6 +222,23 @@ def get_status() -> dict:
         }
 
 
+def get_status_with_dates() -> dict:
+    """Status row plus 'target_dates' in a single request (get_status_with_dates RPC)."""
+    try:
+        # STABLE function: called with GET so it is retried like any other read
+        response = _request(
+            'GET',
+            f"{SUPABASE_URL}/rest/v1/rpc/get_status_with_dates",
+            headers=_headers()
+        )
+        if response.status_code == 200 and response.json():
+            return response.json()
+        print(f"Error getting status with dates: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Error getting status with dates: {e}")
+    return {**get_status(), 'target_dates': get_dates()}
+
+
 def update_status(check_count: int = None, alerts_sent: int = None,
                   last_check: str = None, last_results: dict = None) -> bool:
     """Update monitor status."""
@@ -115,7 +256,8 @@ def update_status(check_count: int = None, alerts_sent: int = None,
     try:
         headers = _headers()
         headers['Prefer'] = 'resolution=merge-duplicates'
-        response = requests.post(
+        response = _request(
+            'POST',
             _api_url('monitor_status'),
             headers=headers,
             json=updates
@@ -126,56 +268,53 @@ def update_status(check_count: int = None, alerts_sent: int = None,
         return False
 
 
+def _rpc_update_status(last_check: str = None, last_results: dict = None,
+                       increment_check: int = 0, increment_alert: int = 0) -> dict:
+    """
+    Atomically increment the counters and store the results in one round trip
+    (update_status_with_results in supabase_schema.sql). Returns the new row,
+    or {} on failure. Null results/last_check keep the stored values.
+    """
+    try:
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/update_status_with_results",
+            headers=_headers(),
+            json={
+                'p_last_check': last_check,
+                'p_last_results': last_results,
+                'p_increment_check': int(increment_check),
+                'p_increment_alert': int(increment_alert)
+            }
+        )
+        if response.status_code == 200 and response.json():
+            return response.json()[0]
+        print(f"Error updating status: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Error updating status: {e}")
+    return {}
+
+
 def increment_check_count() -> int:
-    """Increment and return new check count."""
-    status = get_status()
-    new_count = status.get('check_count', 0) + 1
-    update_status(check_count=new_count)
-    return new_count
+    """Atomically increment and return the check count."""
+    return _rpc_update_status(increment_check=1).get('check_count', 0)
 
 
 def increment_alerts_sent() -> int:
-    """Increment and return new alerts count."""
-    status = get_status()
-    new_count = status.get('alerts_sent', 0) + 1
-    update_status(alerts_sent=new_count)
-    return new_count
+    """Atomically increment and return the alerts count."""
+    return _rpc_update_status(increment_alert=1).get('alerts_sent', 0)
 
 
 def update_status_with_results(last_check: str, last_results: dict,
                                 increment_check: bool = True,
-                                increment_alert: bool = False) -> dict:
+                                increment_alert: int = 0) -> dict:
     """
-    Update status with results and optionally increment counters in a single operation.
-    Returns the updated status.
+    Store results and increment counters atomically in a single round trip,
+    so overlapping cron/manual checks never lose an increment.
+    Returns the updated status (the last known status if the call fails).
     """
-    status = get_status()
-    updates = {
-        'id': 1,
-        'last_check': last_check,
-        'last_results': last_results,
-        'updated_at': datetime.now().isoformat()
-    }
-
-    if increment_check:
-        updates['check_count'] = status.get('check_count', 0) + 1
-    if increment_alert:
-        updates['alerts_sent'] = status.get('alerts_sent', 0) + 1
-
-    try:
-        headers = _headers()
-        headers['Prefer'] = 'resolution=merge-duplicates'
-        response = requests.post(
-            _api_url('monitor_status'),
-            headers=headers,
-            json=updates
-        )
-        if response.status_code in [200, 201]:
-            return updates
-    except Exception as e:
-        print(f"Error updating status with results: {e}")
-
-    return status
+    status = _rpc_update_status(last_check, last_results, increment_check, increment_alert)
+    return status or get_status()
 
 
 # ============ ALERTED PRODUCTS ============
@@ -183,7 +322,8 @@ def update_status_with_results(last_check: str, last_results: dict,
 def get_alerted_products() -> set:
     """Get set of already alerted products."""
     try:
-        response = requests.get(
+        response = _request(
+            'GET',
             _api_url('alerted_products'),
             headers=_headers(),
             params={'select': 'product_key'}
@@ -196,10 +336,32 @@ def get_alerted_products() -> set:
         return set()
 
 
+def count_alerted_products() -> int:
+    """Number of alerted products, counted server-side (HEAD with count=exact)."""
+    try:
+        headers = _headers()
+        headers['Prefer'] = 'count=exact'
+        response = _request(
+            'HEAD',
+            _api_url('alerted_products'),
+            headers=headers,
+            params={'select': 'product_key'}
+        )
+        # Content-Range: 0-24/25 (or */0 when empty)
+        total = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+        if response.status_code in [200, 206] and total.isdigit():
+            return int(total)
+        return 0
+    except Exception as e:
+        print(f"Error counting alerted products: {e}")
+        return 0
+
+
 def add_alerted_product(product_key: str) -> bool:
     """Add a product to alerted set."""
     try:
-        response = requests.post(
+        response = _request(
+            'POST',
             _api_url('alerted_products'),
             headers=_headers(),
             json={
@@ -223,7 +385,8 @@ def add_alerted_products_batch(product_keys: list) -> bool:
     try:
         headers = _headers()
         headers['Prefer'] = 'resolution=ignore-duplicates'
-        response = requests.post(
+        response = _request(
+            'POST',
             _api_url('alerted_products'),
             headers=headers,
             json=records
@@ -234,10 +397,53 @@ def add_alerted_products_batch(product_keys: list) -> bool:
         return False
 
 
+def claim_alerted_products(product_keys: list) -> list:
+    """
+    Mark the given keys as alerted and return the ones that were not already
+    (claim_alerted_products RPC: insert-on-conflict-returning). Only this
+    cycle's candidates are sent, and concurrent invocations never both get
+    the same key.
+    """
+    if not product_keys:
+        return []
+    try:
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/claim_alerted_products",
+            headers=_headers(),
+            json={'p_product_keys': product_keys}
+        )
+        if response.status_code == 200:
+            return [row['product_key'] if isinstance(row, dict) else row for row in response.json()]
+        print(f"Error claiming alerted products: HTTP {response.status_code}")
+        return []
+    except Exception as e:
+        print(f"Error claiming alerted products: {e}")
+        return []
+
+
+def release_alerted_products(product_keys: list) -> bool:
+    """Unmark keys claimed for an alert that could not be sent."""
+    if not product_keys:
+        return True
+    try:
+        response = _request(
+            'DELETE',
+            _api_url('alerted_products'),
+            headers=_headers(),
+            params={'product_key': f"in.({','.join(json.dumps(k) for k in product_keys)})"}
+        )
+        return response.status_code in [200, 204]
+    except Exception as e:
+        print(f"Error releasing alerted products: {e}")
+        return False
+
+
 def clear_alerted_products() -> bool:
     """Clear all alerted products."""
     try:
-        response = requests.delete(
+        response = _request(
+            'DELETE',
             _api_url('alerted_products'),
             headers=_headers(),
             params={'id': 'gt.0'}
@@ -246,3 +452,267 @@ def clear_alerted_products() -> bool:
     except Exception as e:
         print(f"Error clearing alerted products: {e}")
         return False
+
+
+# ============ AVAILABILITY SNAPSHOT ============
+
+def record_availability(dates: list, rows: list, observed_at: str = None,
+                        tracked_dates: list = None) -> int:
+    """
+    Record one check in availability_snapshot/availability_transitions
+    (record_availability RPC). Only rows whose state changed are written,
+    dates outside `tracked_dates` (if given) are pruned, and last_results is
+    rebuilt server-side when anything changed.
+    Returns the number of snapshot rows changed, or -1 on failure.
+    """
+    try:
+        payload = {'p_dates': dates, 'p_products': rows}
+        if observed_at:
+            payload['p_observed_at'] = observed_at
+        if tracked_dates is not None:
+            payload['p_tracked_dates'] = tracked_dates
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/record_availability",
+            headers=_headers(),
+            json=payload
+        )
+        if response.status_code == 200:
+            return int(response.json())
+        print(f"Error recording availability: HTTP {response.status_code}")
+        return -1
+    except Exception as e:
+        print(f"Error recording availability: {e}")
+        return -1
+
+
+def get_availability_transitions(limit: int = 50) -> list:
+    """Most recent availability changes, newest first."""
+    try:
+        response = _request(
+            'GET',
+            _api_url('availability_transitions'),
+            headers=_headers(),
+            params={
+                'select': 'date,product_id,from_state,to_state,observed_at',
+                'order': 'observed_at.desc',
+                'limit': limit
+            }
+        )
+        if response.status_code == 200:
+            return response.json()
+        return []
+    except Exception as e:
+        print(f"Error getting availability transitions: {e}")
+        return []
+
+
+# ============ CHECK HISTORY ============
+
+def add_check_history(entry: dict, keep: int = 500) -> bool:
+    """Append one check to the history, keeping only the newest `keep` rows."""
+    try:
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/add_check_history",
+            headers=_headers(),
+            json={
+                'p_checked_at': entry.get('checked_at') or datetime.now().isoformat(),
+                'p_entry': entry,
+                'p_keep': keep
+            }
+        )
+        return response.status_code in [200, 204]
+    except Exception as e:
+        print(f"Error adding check history: {e}")
+        return False
+
+
+def get_check_history(limit: int = 50) -> list:
+    """Get the most recent checks, newest first."""
+    try:
+        response = _request(
+            'GET',
+            _api_url('check_history'),
+            headers=_headers(),
+            params={'select': 'entry', 'order': 'id.desc', 'limit': limit}
+        )
+        if response.status_code == 200:
+            return [row['entry'] for row in response.json()]
+        return []
+    except Exception as e:
+        print(f"Error getting check history: {e}")
+        return []
+
+
+# ============ REQUEST BUDGET ============
+
+def get_request_budget(window_keys: list) -> dict:
+    """Get request counters for the given budget windows."""
+    try:
+        response = _request(
+            'GET',
+            _api_url('request_budget'),
+            headers=_headers(),
+            params={
+                'select': 'window_key,count',
+                'window_key': f"in.({','.join(window_keys)})"
+            }
+        )
+        if response.status_code == 200:
+            counts = {row['window_key']: row['count'] for row in response.json()}
+            return {key: counts.get(key, 0) for key in window_keys}
+        return {}
+    except Exception as e:
+        print(f"Error getting request budget: {e}")
+        return {}
+
+
+def increment_request_budget(window_keys: list, amount: int = 1) -> dict:
+    """Atomically add `amount` to each budget window and return the new counters."""
+    try:
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/increment_request_budget",
+            headers=_headers(),
+            json={'p_window_keys': window_keys, 'p_amount': amount}
+        )
+        if response.status_code == 200:
+            return {row['window_key']: row['count'] for row in response.json()}
+        return {}
+    except Exception as e:
+        print(f"Error incrementing request budget: {e}")
+        return {}
+
+
+def get_date_checks(dates: list) -> dict:
+    """Last time each date was queried upstream, as naive local datetimes."""
+    if not dates:
+        return {}
+    try:
+        response = _request(
+            'GET',
+            _api_url('date_checks'),
+            headers=_headers(),
+            params={
+                'select': 'date,checked_at',
+                'date': f"in.({','.join(json.dumps(d) for d in dates)})"
+            }
+        )
+        if response.status_code == 200:
+            return {
+                row['date']: datetime.fromisoformat(row['checked_at']).astimezone().replace(tzinfo=None)
+                for row in response.json()
+            }
+        return {}
+    except Exception as e:
+        print(f"Error getting date checks: {e}")
+        return {}
+
+
+def mark_dates_checked(dates: list, checked_at: datetime) -> bool:
+    """Record that the given dates were queried upstream (one upsert)."""
+    if not dates:
+        return True
+    try:
+        stamp = checked_at.astimezone(timezone.utc).isoformat()
+        headers = _headers()
+        headers['Prefer'] = 'return=minimal,resolution=merge-duplicates'
+        response = _request(
+            'POST',
+            _api_url('date_checks'),
+            headers=headers,
+            params={'on_conflict': 'date'},
+            json=[{'date': date, 'checked_at': stamp} for date in dates]
+        )
+        return response.status_code in [200, 201, 204]
+    except Exception as e:
+        print(f"Error marking dates checked: {e}")
+        return False
+
+
+# ============ LEADER LEASES ============
+
+def acquire_lease(name: str, holder: str, ttl_seconds: float) -> bool:
+    """Acquire or renew a lease; True if `holder` now owns it."""
+    try:
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/acquire_lease",
+            headers=_headers(),
+            json={'p_name': name, 'p_holder': holder, 'p_ttl_seconds': ttl_seconds}
+        )
+        return response.status_code == 200 and response.json() is True
+    except Exception as e:
+        print(f"Error acquiring lease: {e}")
+        return False
+
+
+def acquire_leases(names: list, holder: str, ttl_seconds: float) -> list:
+    """Acquire or renew several leases at once; returns the names now owned by `holder`."""
+    if not names:
+        return []
+    try:
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/acquire_leases",
+            headers=_headers(),
+            json={'p_names': names, 'p_holder': holder, 'p_ttl_seconds': ttl_seconds}
+        )
+        if response.status_code == 200:
+            return [row['name'] if isinstance(row, dict) else row for row in response.json()]
+        return []
+    except Exception as e:
+        print(f"Error acquiring leases: {e}")
+        return []
+
+
+def release_leases(names: list, holder: str) -> bool:
+    """Release the given leases held by `holder`."""
+    if not names:
+        return True
+    try:
+        response = _request(
+            'DELETE',
+            _api_url('monitor_leases'),
+            headers=_headers(),
+            params={'name': f"in.({','.join(json.dumps(n) for n in names)})", 'holder': f'eq.{holder}'}
+        )
+        return response.status_code in [200, 204]
+    except Exception as e:
+        print(f"Error releasing leases: {e}")
+        return False
+
+
+# ============ SHARD MEMBERSHIP ============
+
+def shard_heartbeat(worker_id: str, ttl_seconds: float) -> list:
+    """Renew a worker's membership and return every live worker id."""
+    try:
+        response = _request(
+            'POST',
+            f"{SUPABASE_URL}/rest/v1/rpc/shard_heartbeat",
+            headers=_headers(),
+            json={'p_worker_id': worker_id, 'p_ttl_seconds': ttl_seconds}
+        )
+        if response.status_code == 200:
+            return [row['worker_id'] if isinstance(row, dict) else row for row in response.json()]
+        return [worker_id]
+    except Exception as e:
+        print(f"Error in shard heartbeat: {e}")
+        return [worker_id]
+
+
+def shard_leave(worker_id: str) -> bool:
+    """Remove a worker from the shard ring."""
+    try:
+        response = _request(
+            'DELETE',
+            _api_url('shard_workers'),
+            headers=_headers(),
+            params={'worker_id': f'eq.{worker_id}'}
+        )
+        return response.status_code in [200, 204]
+    except Exception as e:
+        print(f"Error leaving shard: {e}")
+        return False
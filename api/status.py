@@ -1,7 +1,15 @@
 """
 Vercel Serverless Function - Get Status
+
+Status and target dates come from one get_status_with_dates RPC (a single
+Supabase round trip), cached in process for STORAGE_CACHE_SECONDS so warm
+invocations often need none. Responses carry a strong ETag built from
+monitor_status.status_version (If-None-Match -> 304) and are gzip/brotli
+compressed. With ?since=<version> only the dates whose results changed
+after that version are returned.
 """
 from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 import json
 import sys
 import os
@@ -9,34 +17,91 @@ import os
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from api.db import get_status, get_dates
+from storage import create_storage
+from http_cache import json_response
+
+storage = create_storage('supabase')
+
+
+def build_status(status: dict = None) -> dict:
+    """Full dashboard status (shared with the /api/stream fallback)."""
+    status = status if status is not None else storage.get_status_with_dates()
+    dates = status.get('target_dates', [])
+
+    return {
+        'version': status.get('status_version', 0),
+        'running': True,
+        'check_count': status.get('check_count', 0),
+        'alerts_sent': status.get('alerts_sent', 0),
+        'last_check': status.get('last_check'),
+        'last_results': status.get('last_results', {}),
+        'target_dates': dates,
+        'visit_tag': os.environ.get('VISIT_TAG', 'MV-Biglietti'),
+        'visitor_num': int(os.environ.get('VISITOR_NUM', 1)),
+        'product_filter': os.environ.get('PRODUCT_FILTER', ''),
+        'interval_seconds': int(os.environ.get('CHECK_INTERVAL_SECONDS', 1800))
+    }
+
+
+def status_changes(status: dict, since: int) -> dict:
+    """Changes after version `since` (full status if `since` is unknown)."""
+    version = status.get('status_version', 0)
+    if since < 0 or since > version:
+        return {**build_status(status), 'delta': False}
+
+    changes = {
+        'version': version,
+        'since': since,
+        'delta': True,
+        'check_count': status.get('check_count', 0),
+        'alerts_sent': status.get('alerts_sent', 0),
+        'last_check': status.get('last_check')
+    }
+    results = status.get('last_results') or {}
+    changed = {
+        date: results.get(date)
+        for date, changed_at in (status.get('result_versions') or {}).items()
+        if changed_at > since
+    }
+    if changed:
+        changes['last_results'] = changed
+    if status.get('dates_version', 0) > since:
+        changes['target_dates'] = status.get('target_dates', [])
+    return changes
 
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         try:
-            status = get_status()
-            dates = get_dates()
-
-            response = {
-                'running': True,
-                'check_count': status.get('check_count', 0),
-                'alerts_sent': status.get('alerts_sent', 0),
-                'last_check': status.get('last_check'),
-                'last_results': status.get('last_results', {}),
-                'target_dates': dates,
-                'visit_tag': os.environ.get('VISIT_TAG', 'MV-Biglietti'),
-                'visitor_num': int(os.environ.get('VISITOR_NUM', 1)),
-                'product_filter': os.environ.get('PRODUCT_FILTER', ''),
-                'interval_seconds': int(os.environ.get('CHECK_INTERVAL_SECONDS', 1800))
-            }
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
+            query = parse_qs(urlparse(self.path).query)
+            try:
+                since = int(query['since'][0]) if 'since' in query else None
+            except ValueError:
+                # Like the Flask route (type=int): a bad ?since= is ignored
+                since = None
+
+            status = storage.get_status_with_dates()
+            version = status.get('status_version', 0)
+            if since is None:
+                etag = f'"{version}"'
+                data = lambda: build_status(status)
+            else:
+                etag = f'"{version}-{since}"'
+                data = lambda: status_changes(status, since)
+
+            code, headers, body = json_response(
+                data, etag,
+                accept_encoding=self.headers.get('Accept-Encoding', ''),
+                if_none_match=self.headers.get('If-None-Match', ''),
+                cache_control='max-age=5'
+            )
+
+            self.send_response(code)
+            for name, value in headers.items():
+                self.send_header(name, value)
             self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Cache-Control', 'max-age=5')
             self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
+            self.wfile.write(body)
 
         except Exception as e:
             self.send_response(500)
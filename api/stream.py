@@ -0,0 +1,47 @@
+"""
+Vercel Serverless Function - Status Stream (SSE fallback)
+
+Serverless functions cannot hold a connection open, so this endpoint sends
+one event and closes with a `retry` hint: EventSource reconnects after the
+polling interval, and the dashboard code is the same as with the Flask
+stream. The event id is monitor_status.status_version: when the client's
+Last-Event-ID matches it, only the retry hint is sent and the dates are
+not read.
+"""
+from http.server import BaseHTTPRequestHandler
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.status import build_status, storage
+from status_stream import format_event
+
+# Reconnection delay for EventSource (same as the old polling interval)
+RETRY_MS = 30000
+
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            status = storage.get_status_with_dates()
+            event_id = status.get('status_version', 0)
+
+            if self.headers.get('Last-Event-ID') == str(event_id):
+                body = f"retry: {RETRY_MS}\n\n"
+            else:
+                body = format_event('snapshot', build_status(status), event_id, retry_ms=RETRY_MS)
+
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        except Exception as e:
+            self.send_response(500)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'error': str(e)}).encode())
@@ -1,522 +1,188 @@
 """
 Aplicación web para el monitor de tickets de los Museos Vaticanos
 """
-import os
-import json
-from flask import Flask, render_template_string, jsonify, request
-from monitor import monitor
+from flask import Flask, Response, jsonify, request, stream_with_context
 from vatican_client import VaticanClient
-from config import CHECK_INTERVAL_SECONDS
-
-app = Flask(__name__)
+from subscriptions import (
+    load_subscriptions,
+    add_subscription as create_subscription,
+    remove_subscription as delete_subscription
+)
+from capacity import CapacityProber
+from timeslot_cache import TimeslotCache
+from status_stream import StatusStream
+from http_cache import json_response
+from dashboard import compile_dashboard, dashboard_response
+from date_scheduler import parse_date
+from date_ranges import expand_date_request, literal_dates
+from storage import get_storage
+from config import (
+    CHECK_INTERVAL_SECONDS,
+    MONITOR_MODE,
+    PRODUCT_FILTER,
+    STREAM_MAX_CLIENTS
+)
+
+if MONITOR_MODE == 'worker':
+    # El monitor corre en worker.py; aquí solo se lee estado y se envían órdenes
+    from ipc import RemoteMonitor
+    monitor = RemoteMonitor()
+else:
+    from monitor import monitor
+
+# Sin carpeta estática: el dashboard se sirve ya compilado desde dashboard.py
+app = Flask(__name__, static_folder=None)
+compile_dashboard('flask')
 client = VaticanClient()
+timeslots = TimeslotCache(client)
+storage = get_storage()
+stream = StatusStream(monitor.get_status)
+if MONITOR_MODE != 'worker':
+    # En modo worker no hay aviso entre procesos: el stream relee el estado por IPC
+    monitor.add_listener(stream.notify)
+
 
-# Archivo para persistir las fechas configuradas
-DATES_FILE = 'target_dates.json'
-
-
-def load_target_dates():
-    """Carga las fechas desde el archivo JSON."""
-    if os.path.exists(DATES_FILE):
-        with open(DATES_FILE, 'r') as f:
-            data = json.load(f)
-            return data.get('dates', [])
-    return []
-
-
-def save_target_dates(dates):
-    """Guarda las fechas en el archivo JSON."""
-    with open(DATES_FILE, 'w') as f:
-        json.dump({'dates': dates}, f)
-
-
-def update_monitor_dates(dates):
-    """Actualiza las fechas en el módulo config."""
-    import config
-    config.TARGET_DATES = dates
-
-
-# HTML Template
-HTML_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Vatican Monitor</title>
-    <style>
-        * { box-sizing: border-box; margin: 0; padding: 0; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #1a1a2e 0%, #16213e 100%);
-            min-height: 100vh;
-            color: #fff;
-            padding: 20px;
-        }
-        .container { max-width: 900px; margin: 0 auto; }
-        h1 { text-align: center; margin-bottom: 30px; font-size: 2em; }
-        h1 span { color: #ffd700; }
-
-        .card {
-            background: rgba(255,255,255,0.1);
-            border-radius: 15px;
-            padding: 25px;
-            margin-bottom: 20px;
-            backdrop-filter: blur(10px);
-        }
-        .card h2 {
-            font-size: 1.2em;
-            margin-bottom: 15px;
-            color: #ffd700;
-        }
-
-        /* Status */
-        .status-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-            gap: 15px;
-        }
-        .status-item {
-            background: rgba(0,0,0,0.2);
-            padding: 15px;
-            border-radius: 10px;
-            text-align: center;
-        }
-        .status-item .value {
-            font-size: 1.8em;
-            font-weight: bold;
-            color: #4ade80;
-        }
-        .status-item .label { font-size: 0.85em; opacity: 0.7; margin-top: 5px; }
-
-        /* Dates */
-        .date-input-row {
-            display: flex;
-            gap: 10px;
-            margin-bottom: 15px;
-        }
-        input[type="date"] {
-            flex: 1;
-            padding: 12px 15px;
-            border: none;
-            border-radius: 8px;
-            font-size: 1em;
-            background: rgba(255,255,255,0.9);
-            color: #333;
-        }
-        .btn {
-            padding: 12px 25px;
-            border: none;
-            border-radius: 8px;
-            font-size: 1em;
-            cursor: pointer;
-            transition: all 0.3s;
-            font-weight: 600;
-        }
-        .btn-primary { background: #ffd700; color: #1a1a2e; }
-        .btn-primary:hover { background: #ffed4a; transform: translateY(-2px); }
-        .btn-danger { background: #ef4444; color: #fff; }
-        .btn-danger:hover { background: #dc2626; }
-        .btn-success { background: #22c55e; color: #fff; }
-        .btn-success:hover { background: #16a34a; }
-        .btn-secondary { background: rgba(255,255,255,0.2); color: #fff; }
-        .btn-secondary:hover { background: rgba(255,255,255,0.3); }
-
-        .dates-list {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 10px;
-        }
-        .date-tag {
-            background: rgba(255,215,0,0.2);
-            border: 1px solid #ffd700;
-            padding: 8px 15px;
-            border-radius: 20px;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        .date-tag .remove {
-            background: none;
-            border: none;
-            color: #ef4444;
-            cursor: pointer;
-            font-size: 1.2em;
-            line-height: 1;
-        }
-        .date-tag .remove:hover { color: #dc2626; }
-
-        .no-dates {
-            color: rgba(255,255,255,0.5);
-            font-style: italic;
-            padding: 20px;
-            text-align: center;
-        }
-
-        /* Actions */
-        .actions {
-            display: flex;
-            gap: 10px;
-            flex-wrap: wrap;
-        }
-
-        /* Results */
-        .result-item {
-            background: rgba(0,0,0,0.2);
-            padding: 15px;
-            border-radius: 10px;
-            margin-bottom: 10px;
-        }
-        .result-date {
-            font-weight: bold;
-            color: #ffd700;
-            margin-bottom: 8px;
-        }
-        .result-product {
-            padding: 5px 0;
-            border-bottom: 1px solid rgba(255,255,255,0.1);
-        }
-        .result-product:last-child { border-bottom: none; }
-        .available { color: #4ade80; }
-        .low { color: #fbbf24; }
-        .sold-out { color: #ef4444; }
-
-        /* Loading */
-        .loading {
-            text-align: center;
-            padding: 20px;
-            opacity: 0.7;
-        }
-        .spinner {
-            display: inline-block;
-            width: 20px;
-            height: 20px;
-            border: 2px solid rgba(255,255,255,0.3);
-            border-top-color: #ffd700;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-        }
-        @keyframes spin { to { transform: rotate(360deg); } }
-
-        /* Toast */
-        .toast {
-            position: fixed;
-            bottom: 20px;
-            right: 20px;
-            background: #22c55e;
-            color: #fff;
-            padding: 15px 25px;
-            border-radius: 10px;
-            opacity: 0;
-            transform: translateY(20px);
-            transition: all 0.3s;
-            z-index: 1000;
-        }
-        .toast.show { opacity: 1; transform: translateY(0); }
-        .toast.error { background: #ef4444; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>🏛️ <span>Vatican</span> Monitor</h1>
-
-        <!-- Status Card -->
-        <div class="card">
-            <h2>📊 Estado del Monitor</h2>
-            <div class="status-grid">
-                <div class="status-item">
-                    <div class="value" id="status-running">-</div>
-                    <div class="label">Estado</div>
-                </div>
-                <div class="status-item">
-                    <div class="value" id="status-checks">0</div>
-                    <div class="label">Verificaciones</div>
-                </div>
-                <div class="status-item">
-                    <div class="value" id="status-alerts">0</div>
-                    <div class="label">Alertas Enviadas</div>
-                </div>
-                <div class="status-item">
-                    <div class="value" id="status-interval">-</div>
-                    <div class="label">Intervalo</div>
-                </div>
-            </div>
-        </div>
-
-        <!-- Dates Card -->
-        <div class="card">
-            <h2>📅 Fechas a Monitorear</h2>
-            <div class="date-input-row">
-                <input type="date" id="new-date" min="">
-                <button class="btn btn-primary" onclick="addDate()">+ Agregar</button>
-            </div>
-            <div class="dates-list" id="dates-list">
-                <div class="loading"><span class="spinner"></span> Cargando...</div>
-            </div>
-        </div>
-
-        <!-- Actions Card -->
-        <div class="card">
-            <h2>⚡ Acciones</h2>
-            <div class="actions">
-                <button class="btn btn-success" onclick="checkNow()">🔍 Verificar Ahora</button>
-                <button class="btn btn-secondary" onclick="clearAlerts()">🗑️ Limpiar Historial</button>
-                <button class="btn btn-secondary" onclick="exportExcel()">📊 Exportar Excel</button>
-            </div>
-        </div>
-
-        <!-- Results Card -->
-        <div class="card">
-            <h2>📋 Última Verificación</h2>
-            <div id="last-check-time" style="opacity: 0.7; margin-bottom: 15px;">-</div>
-            <div id="results">
-                <div class="no-dates">Sin resultados aún</div>
-            </div>
-        </div>
-    </div>
-
-    <div class="toast" id="toast"></div>
-
-    <script>
-        // Set min date to today
-        document.getElementById('new-date').min = new Date().toISOString().split('T')[0];
-
-        // Load data on page load
-        loadDates();
-        loadStatus();
-        setInterval(loadStatus, 30000); // Refresh every 30s
-
-        function showToast(message, isError = false) {
-            const toast = document.getElementById('toast');
-            toast.textContent = message;
-            toast.className = 'toast' + (isError ? ' error' : '');
-            toast.classList.add('show');
-            setTimeout(() => toast.classList.remove('show'), 3000);
-        }
-
-        async function loadDates() {
-            try {
-                const res = await fetch('/api/dates');
-                const data = await res.json();
-                renderDates(data.dates || []);
-            } catch (e) {
-                console.error('Error loading dates:', e);
-            }
-        }
-
-        function renderDates(dates) {
-            const container = document.getElementById('dates-list');
-            if (!dates.length) {
-                container.innerHTML = '<div class="no-dates">No hay fechas configuradas. Agrega fechas para monitorear.</div>';
-                return;
-            }
-            container.innerHTML = dates.map(d => `
-                <div class="date-tag">
-                    <span>${formatDate(d)}</span>
-                    <button class="remove" onclick="removeDate('${d}')">&times;</button>
-                </div>
-            `).join('');
-        }
-
-        function formatDate(dateStr) {
-            // Convert DD/MM/YYYY to readable format
-            const parts = dateStr.split('/');
-            const months = ['Ene','Feb','Mar','Abr','May','Jun','Jul','Ago','Sep','Oct','Nov','Dic'];
-            return `${parts[0]} ${months[parseInt(parts[1])-1]} ${parts[2]}`;
-        }
-
-        async function addDate() {
-            const input = document.getElementById('new-date');
-            if (!input.value) {
-                showToast('Selecciona una fecha', true);
-                return;
-            }
-
-            // Convert YYYY-MM-DD to DD/MM/YYYY
-            const parts = input.value.split('-');
-            const dateStr = `${parts[2]}/${parts[1]}/${parts[0]}`;
-
-            try {
-                const res = await fetch('/api/dates', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({date: dateStr})
-                });
-                const data = await res.json();
-                if (data.success) {
-                    renderDates(data.dates);
-                    input.value = '';
-                    showToast('Fecha agregada');
-                } else {
-                    showToast(data.error || 'Error', true);
-                }
-            } catch (e) {
-                showToast('Error al agregar fecha', true);
-            }
-        }
-
-        async function removeDate(dateStr) {
-            try {
-                const res = await fetch('/api/dates', {
-                    method: 'DELETE',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({date: dateStr})
-                });
-                const data = await res.json();
-                if (data.success) {
-                    renderDates(data.dates);
-                    showToast('Fecha eliminada');
-                }
-            } catch (e) {
-                showToast('Error al eliminar', true);
-            }
-        }
-
-        async function loadStatus() {
-            try {
-                const res = await fetch('/api/status');
-                const data = await res.json();
-
-                document.getElementById('status-running').textContent = data.running ? '✅ Activo' : '⏸️ Pausado';
-                document.getElementById('status-running').style.color = data.running ? '#4ade80' : '#fbbf24';
-                document.getElementById('status-checks').textContent = data.check_count || 0;
-                document.getElementById('status-alerts').textContent = data.alerts_sent || 0;
-                document.getElementById('status-interval').textContent = formatInterval(data.interval_seconds);
-
-                if (data.last_check) {
-                    const date = new Date(data.last_check);
-                    document.getElementById('last-check-time').textContent =
-                        'Última verificación: ' + date.toLocaleString('es-ES');
-                }
-
-                renderResults(data.last_results);
-            } catch (e) {
-                console.error('Error loading status:', e);
-            }
-        }
-
-        function formatInterval(seconds) {
-            if (seconds >= 3600) return Math.round(seconds/3600) + 'h';
-            if (seconds >= 60) return Math.round(seconds/60) + 'm';
-            return seconds + 's';
-        }
-
-        function renderResults(results) {
-            const container = document.getElementById('results');
-            if (!results || !Object.keys(results).length) {
-                container.innerHTML = '<div class="no-dates">Sin disponibilidad encontrada</div>';
-                return;
-            }
-
-            container.innerHTML = Object.entries(results).map(([date, products]) => `
-                <div class="result-item">
-                    <div class="result-date">📅 ${formatDate(date)}</div>
-                    ${products.map(p => `
-                        <div class="result-product">
-                            <span class="${p.availability === 'AVAILABLE' ? 'available' : p.availability === 'LOW_AVAILABILITY' ? 'low' : 'sold-out'}">
-                                ${p.availability === 'AVAILABLE' ? '✅' : p.availability === 'LOW_AVAILABILITY' ? '⚠️' : '❌'}
-                            </span>
-                            ${p.name}
-                        </div>
-                    `).join('')}
-                </div>
-            `).join('');
-        }
-
-        async function checkNow() {
-            showToast('Verificando...');
-            try {
-                const res = await fetch('/api/check-now', {method: 'POST'});
-                const data = await res.json();
-                loadStatus();
-                showToast('Verificación completada');
-            } catch (e) {
-                showToast('Error al verificar', true);
-            }
-        }
-
-        async function clearAlerts() {
-            try {
-                await fetch('/api/clear-alerts', {method: 'POST'});
-                showToast('Historial limpiado');
-            } catch (e) {
-                showToast('Error', true);
-            }
-        }
-
-        async function exportExcel() {
-            showToast('Generando Excel... Esto puede tardar unos minutos');
-            try {
-                const res = await fetch('/api/export-excel', {method: 'POST'});
-                const data = await res.json();
-                if (data.success) {
-                    showToast('Excel generado: ' + data.filename);
-                } else {
-                    showToast(data.error || 'Error', true);
-                }
-            } catch (e) {
-                showToast('Error al exportar', true);
-            }
-        }
-    </script>
-</body>
-</html>
-'''
+@app.errorhandler(TimeoutError)
+def worker_timeout(error):
+    """El worker del monitor no respondió a una orden."""
+    return jsonify({'success': False, 'error': str(error)}), 503
 
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    code, headers, body = dashboard_response(
+        'flask',
+        accept_encoding=request.headers.get('Accept-Encoding', ''),
+        if_none_match=request.headers.get('If-None-Match', '')
+    )
+    return Response(body, code, headers)
 
 
 @app.route('/api/status')
 def get_status():
-    """Obtiene el estado actual del monitor."""
-    return jsonify(monitor.get_status())
+    """
+    Obtiene el estado actual del monitor.
+
+    Lleva ETag por versión (If-None-Match -> 304) y con ?since=<versión>
+    devuelve solo las claves y fechas cambiadas desde esa versión.
+    """
+    # Estado en memoria: el ETag se compara antes de construir ninguna respuesta
+    version, status = stream.current()
+    since = request.args.get('since', type=int)
+    if since is None:
+        data, etag = (lambda: {**status, 'version': version}), f'"{version}"'
+    else:
+        data, etag = (lambda: stream.changes_since(since)), f'"{version}-{since}"'
+
+    code, headers, body = json_response(
+        data, etag,
+        accept_encoding=request.headers.get('Accept-Encoding', ''),
+        if_none_match=request.headers.get('If-None-Match', '')
+    )
+    return Response(body, code, headers)
+
+
+@app.route('/api/stream')
+def status_stream():
+    """Server-Sent Events: snapshot al conectar y deltas cuando cambia el estado."""
+    if stream.client_count() >= STREAM_MAX_CLIENTS:
+        # Sin hilos libres para otro stream: el dashboard vuelve a consultar /api/status
+        return jsonify({'success': False, 'error': 'Demasiados streams abiertos'}), 503
+    return Response(
+        stream_with_context(stream.events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/api/dates', methods=['GET'])
 def get_dates():
     """Obtiene las fechas configuradas."""
-    dates = load_target_dates()
-    return jsonify({'dates': dates})
+    return jsonify({'dates': storage.get_dates()})
 
 
 @app.route('/api/dates', methods=['POST'])
 def add_date():
-    """Agrega una fecha a monitorear."""
-    data = request.get_json()
-    date = data.get('date', '').strip()
+    """
+    Agrega fechas a monitorear: una ('date'), una lista ('dates'), rangos o
+    meses con días de la semana ('from'/'to', 'month', 'weekdays', 'ranges').
+    Todas se escriben en una sola operación.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        dates, invalid = expand_date_request(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
 
-    if not date:
-        return jsonify({'success': False, 'error': 'Fecha requerida'})
+    if not dates:
+        error = 'Formato inválido. Use DD/MM/YYYY' if invalid else 'Fecha requerida'
+        return jsonify({'success': False, 'error': error, 'invalid': invalid})
 
-    dates = load_target_dates()
-    if date in dates:
+    added = storage.add_dates(dates)
+    if not added and data.get('date') and len(dates) == 1:
         return jsonify({'success': False, 'error': 'Fecha ya existe'})
+    if added:
+        stream.notify()
 
-    dates.append(date)
-    dates.sort(key=lambda x: (int(x.split('/')[2]), int(x.split('/')[1]), int(x.split('/')[0])))
-
-    save_target_dates(dates)
-    update_monitor_dates(dates)
-
-    return jsonify({'success': True, 'dates': dates})
+    return jsonify({'success': True, 'added': added, 'invalid': invalid, 'dates': storage.get_dates()})
 
 
 @app.route('/api/dates', methods=['DELETE'])
 def remove_date():
-    """Elimina una fecha del monitoreo."""
-    data = request.get_json()
-    date = data.get('date', '').strip()
+    """Elimina fechas del monitoreo (mismo formato que el alta)."""
+    data = request.get_json(silent=True) or {}
+    try:
+        dates, invalid = expand_date_request(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    removed = storage.remove_dates(dates + literal_dates(data))
+    if removed:
+        stream.notify()
+
+    return jsonify({'success': True, 'removed': removed, 'invalid': invalid, 'dates': storage.get_dates()})
+
+
+@app.route('/api/subscriptions', methods=['GET'])
+def get_subscriptions():
+    """Obtiene las suscripciones configuradas."""
+    return jsonify({'subscriptions': load_subscriptions()})
+
+
+@app.route('/api/subscriptions', methods=['POST'])
+def add_subscription():
+    """Agrega una suscripción (chat_id, dates, tag, who_id, visitor_num, product_filter)."""
+    try:
+        subscription, invalid = create_subscription(request.get_json(silent=True) or {})
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'subscription': subscription, 'invalid': invalid})
 
-    dates = load_target_dates()
-    if date in dates:
-        dates.remove(date)
-        save_target_dates(dates)
-        update_monitor_dates(dates)
 
-    return jsonify({'success': True, 'dates': dates})
+@app.route('/api/subscriptions/<subscription_id>', methods=['DELETE'])
+def remove_subscription(subscription_id):
+    """Elimina una suscripción."""
+    removed = delete_subscription(subscription_id)
+    return jsonify({'success': removed, 'subscriptions': load_subscriptions()})
+
+
+@app.route('/api/capacity/<date>', methods=['GET'])
+def get_capacity(date):
+    """Última capacidad estimada por producto para una fecha (DD-MM-YYYY)."""
+    date = date.replace('-', '/')
+    return jsonify({'date': date, 'capacity': CapacityProber.read_cached(date)})
+
+
+@app.route('/api/capacity/<date>', methods=['POST'])
+def probe_capacity(date):
+    """Encola un sondeo de capacidad (búsqueda binaria sobre visitorNum)."""
+    date = date.replace('-', '/')
+    if not parse_date(date):
+        return jsonify({'success': False, 'error': 'Formato invalido. Use DD-MM-YYYY'}), 400
+    if MONITOR_MODE == 'worker':
+        return jsonify({'success': False, 'error': 'Sondeo no disponible en modo worker'}), 501
+    job = monitor.enqueue_capacity_probe(date)
+    return jsonify({'success': True, 'job_id': job['id'], 'job': job}), 202
 
 
 @app.route('/api/calendar')
@@ -526,11 +192,43 @@ def get_calendar():
     return jsonify(calendar)
 
 
+@app.route('/api/timeslots/<date>')
+def get_timeslots(date):
+    """Horarios de una fecha (DD-MM-YYYY); ?product=<id> para un producto concreto."""
+    date = date.replace('-', '/')
+    if not parse_date(date):
+        return jsonify({'timetable': [], 'error': 'Formato invalido. Use DD-MM-YYYY'}), 400
+
+    product_id = request.args.get('product', type=int)
+    if product_id is None:
+        # Preferir el producto ya detectado por el monitor (snapshot cacheado del
+        # stream) para no reconstruir el estado ni consultar la API
+        known = (stream.current()[1].get('last_results') or {}).get(date, [])
+        product_id = known[0].get('id') if known else timeslots.default_product(date, PRODUCT_FILTER)
+    if product_id is None:
+        return jsonify({'date': date, 'product_id': None, 'timetable': []})
+
+    data = timeslots.get(date, product_id)
+    if data is None:
+        return jsonify({'date': date, 'product_id': product_id, 'timetable': [],
+                        'error': 'Error obteniendo horarios'}), 502
+    return jsonify({'date': date, 'product_id': product_id, **data})
+
+
 @app.route('/api/check-now', methods=['POST'])
 def check_now():
-    """Ejecuta una verificación manual."""
-    monitor.check_and_alert()
-    return jsonify({'success': True, 'status': monitor.get_status()})
+    """Encola una verificación manual y devuelve el id del trabajo."""
+    job = monitor.enqueue_check()
+    return jsonify({'success': True, 'job_id': job['id'], 'job': job}), 202
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Obtiene el estado y progreso por fecha de un trabajo."""
+    job = monitor.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return jsonify({'success': True, 'job': job})
 
 
 @app.route('/api/clear-alerts', methods=['POST'])
@@ -540,6 +238,13 @@ def clear_alerts():
     return jsonify({'success': True})
 
 
+@app.route('/api/history')
+def get_history():
+    """Últimas verificaciones y cambios de disponibilidad (?limit=, máximo 500)."""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    return jsonify({'history': storage.get_history(limit), 'transitions': storage.get_transitions(limit)})
+
+
 @app.route('/api/export-excel', methods=['POST'])
 def export_excel():
     """Exporta disponibilidad a Excel."""
@@ -554,7 +259,7 @@ def export_excel():
 @app.route('/api/start', methods=['POST'])
 def start_monitor():
     """Inicia el monitor."""
-    if not monitor.scheduler.running:
+    if not monitor.is_running():
         monitor.start()
     return jsonify({'success': True, 'running': True})
 
@@ -562,20 +267,23 @@ def start_monitor():
 @app.route('/api/stop', methods=['POST'])
 def stop_monitor():
     """Detiene el monitor."""
-    if monitor.scheduler.running:
+    if monitor.is_running():
         monitor.stop()
     return jsonify({'success': True, 'running': False})
 
 
-if __name__ == '__main__':
-    # Cargar fechas desde archivo
-    dates = load_target_dates()
+def start_background():
+    """Arranca lo que debe existir una vez por despliegue (llamar desde un solo proceso)."""
+    dates = storage.get_dates()
     if dates:
-        update_monitor_dates(dates)
         print(f"Fechas cargadas: {dates}")
 
-    # Iniciar monitor automáticamente
-    monitor.start()
+    # Iniciar monitor automáticamente (en modo worker lo inicia worker.py)
+    if MONITOR_MODE != 'worker' and not monitor.is_running():
+        monitor.start()
+
 
-    # Iniciar servidor Flask
-    app.run(host='0.0.0.0', port=5001, debug=False, use_reloader=False)
+if __name__ == '__main__':
+    # Servidor de desarrollo; en producción usar `python serve.py`
+    start_background()
+    app.run(host='0.0.0.0', port=5001, debug=False, use_reloader=False, threaded=True)
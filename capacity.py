@@ -0,0 +1,195 @@
+"""
+Sondeo de capacidad por número de visitantes (búsqueda binaria)
+
+resultPerTag solo responde si un producto admite un `visitorNum` concreto.
+Para estimar el grupo más grande que aún cabe en un producto se hace una
+búsqueda binaria sobre visitorNum. Los límites conocidos de cada
+(fecha, producto) se guardan entre ciclos:
+  - lower: mayor visitorNum confirmado como disponible
+  - upper: menor visitorNum confirmado como no disponible
+y un nuevo sondeo arranca desde ese intervalo (ampliándolo si ya no es válido),
+de modo que cada estimación cuesta O(log n) peticiones.
+
+Los sondeos comparten el presupuesto de peticiones con las verificaciones: si
+se agota a mitad de la búsqueda se guardan los límites confirmados hasta ese
+momento (marcados como parciales) y el siguiente sondeo continúa desde ahí.
+Una respuesta con error aborta el sondeo sin tocar los límites guardados.
+"""
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List
+from vatican_client import filter_products
+from config import CAPACITY_FILE, CAPACITY_MAX_VISITORS, DEFAULT_VISIT_TAG, DEFAULT_WHO_ID
+
+
+class _BudgetExhausted(Exception):
+    """El presupuesto del ciclo no admite más peticiones de sondeo."""
+
+
+class CapacityProber:
+    """Estima la capacidad máxima de cada producto para una fecha."""
+
+    def __init__(self, client, path: str = CAPACITY_FILE, max_visitors: int = CAPACITY_MAX_VISITORS,
+                 budget=None):
+        self.client = client
+        self.budget = budget or client.budget
+        self.path = path
+        self.max_visitors = max_visitors
+        self._lock = threading.Lock()
+        self.bounds: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f).get('bounds', {})
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'bounds': self.bounds}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(date: str, tag: str, product_id) -> str:
+        return f"{tag}|{date}|{product_id}"
+
+    def _available_ids(self, date: str, visitor_num: int, tag: str, who_id: str) -> Dict[int, dict]:
+        """
+        Productos disponibles para un número de visitantes (una petición).
+
+        Raises:
+            RuntimeError: La consulta falló (una lista vacía no prueba que no haya sitio)
+        """
+        data = self.client.search_availability(date, visitor_num, tag, who_id)
+        if data.get('error'):
+            raise RuntimeError(f"Sondeo de {date} con {visitor_num} visitantes fallido: {data['error']}")
+        return {p.get('id'): p for p in filter_products(data.get('visits', []))}
+
+    def probe(self, date: str, tag: str = DEFAULT_VISIT_TAG, who_id: str = DEFAULT_WHO_ID,
+              product_ids: List[int] = None) -> Dict[str, dict]:
+        """
+        Estima la capacidad de los productos de una fecha.
+
+        Todos los productos se sondean a la vez: cada petición a resultPerTag
+        responde para todos los productos de la fecha, así que el intervalo de
+        cada producto se reduce con las mismas consultas.
+
+        Args:
+            date: Fecha DD/MM/YYYY
+            tag: Tag del tipo de visita
+            who_id: ID del tipo de visitante
+            product_ids: Productos a sondear (por defecto, los disponibles para 1 visitante)
+
+        Returns:
+            {product_id: {'name', 'lower', 'upper', 'capacity', 'partial', 'requests', 'probed_at'}}
+            capacity = lower (mayor grupo confirmado); upper = None si no se encontró límite;
+            partial = True si el presupuesto se agotó antes de cerrar el intervalo
+
+        Raises:
+            RuntimeError: Una consulta falló (no se guarda nada) o no hay presupuesto
+                ni para la primera petición
+        """
+        requests_made = 0
+        cache: Dict[int, Dict[int, dict]] = {}
+        allowance = self.budget.cycle_allowance()
+
+        def available_at(visitor_num: int) -> Dict[int, dict]:
+            nonlocal requests_made
+            if visitor_num not in cache:
+                if 0 <= allowance <= requests_made:
+                    raise _BudgetExhausted()
+                cache[visitor_num] = self._available_ids(date, visitor_num, tag, who_id)
+                requests_made += 1
+            return cache[visitor_num]
+
+        if product_ids is None:
+            try:
+                product_ids = list(available_at(1))
+            except _BudgetExhausted:
+                raise RuntimeError('Presupuesto de peticiones agotado: sondeo de capacidad aplazado')
+
+        with self._lock:
+            state = {}
+            for pid in product_ids:
+                known = self.bounds.get(self._key(date, tag, pid), {})
+                name = known.get('name') or cache.get(1, {}).get(pid, {}).get('name', '')
+                state[pid] = {'lower': known.get('lower', 0), 'upper': known.get('upper'), 'name': name}
+
+        try:
+            self._narrow(state, available_at)
+            partial = False
+        except _BudgetExhausted:
+            # Los límites ya confirmados siguen siendo válidos: se guardan
+            print(f"Presupuesto agotado sondeando {date} tras {requests_made} peticiones")
+            partial = True
+
+        now = datetime.now().isoformat()
+        results = {}
+        with self._lock:
+            for pid, s in state.items():
+                entry = {
+                    'name': s['name'],
+                    'lower': s['lower'],
+                    'upper': s['upper'],
+                    'capacity': s['lower'],
+                    'partial': partial,
+                    'probed_at': now
+                }
+                self.bounds[self._key(date, tag, pid)] = entry
+                results[str(pid)] = {**entry, 'requests': requests_made}
+            self._save()
+
+        return results
+
+    def _narrow(self, state: Dict[int, dict], available_at):
+        """Reduce el intervalo (lower, upper) de cada producto con consultas compartidas."""
+        # Revalidar el intervalo guardado: la capacidad puede haber cambiado
+        for pid, s in state.items():
+            if s['lower'] > 0 and pid not in available_at(s['lower']):
+                s['upper'], s['lower'] = s['lower'], 0
+            elif s['upper'] is not None and pid in available_at(s['upper']):
+                s['lower'], s['upper'] = s['upper'], None
+
+        # Sin límite superior conocido: duplicar hasta encontrarlo (o llegar al máximo)
+        for pid, s in state.items():
+            while s['upper'] is None:
+                candidate = min(max(1, s['lower'] * 2), self.max_visitors)
+                if candidate <= s['lower']:
+                    break
+                products = available_at(candidate)
+                if pid in products:
+                    s['lower'] = candidate
+                    s['name'] = products[pid].get('name', s['name'])
+                else:
+                    s['upper'] = candidate
+
+        # Búsqueda binaria dentro de (lower, upper)
+        for pid, s in state.items():
+            while s['upper'] is not None and s['upper'] - s['lower'] > 1:
+                middle = (s['lower'] + s['upper']) // 2
+                products = available_at(middle)
+                if pid in products:
+                    s['lower'] = middle
+                    s['name'] = products[pid].get('name', s['name'])
+                else:
+                    s['upper'] = middle
+
+    @staticmethod
+    def read_cached(date: str, tag: str = DEFAULT_VISIT_TAG, path: str = CAPACITY_FILE) -> Dict[str, dict]:
+        """Últimas estimaciones guardadas para una fecha (sin peticiones ni cliente)."""
+        bounds = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    bounds = json.load(f).get('bounds', {})
+            except (OSError, ValueError):
+                pass
+
+        prefix = f"{tag}|{date}|"
+        return {key[len(prefix):]: entry for key, entry in bounds.items() if key.startswith(prefix)}
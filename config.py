@@ -33,6 +33,29 @@ DEFAULT_VISITOR_NUM = int(os.getenv('VISITOR_NUM', 1))
 # Ejemplo: 'Biglietti d'ingresso' para solo entradas básicas
 PRODUCT_FILTER = os.getenv('PRODUCT_FILTER', "Biglietti d'ingresso")
 
+# Fechas objetivo (se mantienen en memoria; el archivo se vuelve a leer solo
+# si cambia, comprobándolo como mucho cada FILE_CHECK_SECONDS)
+DATES_FILE = os.getenv('DATES_FILE', 'target_dates.json')
+FILE_CHECK_SECONDS = float(os.getenv('FILE_CHECK_SECONDS', 1.0))
+# Máximo de fechas por petición en bloque a /api/dates (listas, rangos, meses)
+MAX_BULK_DATES = int(os.getenv('MAX_BULK_DATES', 366))
+
+# Almacenamiento del estado (fechas, contadores, alertas enviadas, historial)
+# - json: target_dates.json + STATE_FILE
+# - sqlite: STORAGE_DB_FILE en modo WAL (recomendado en local)
+# - supabase: tablas de Supabase (lo usan siempre las funciones de Vercel)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').lower()
+STATE_FILE = os.getenv('STATE_FILE', 'monitor_state.json')
+STORAGE_DB_FILE = os.getenv('STORAGE_DB_FILE', 'monitor_state.db')
+# Segundos que se sirven de memoria las lecturas (las escrituras son inmediatas)
+STORAGE_CACHE_SECONDS = float(os.getenv('STORAGE_CACHE_SECONDS', 2.0))
+# Verificaciones que se conservan en el historial
+HISTORY_LIMIT = int(os.getenv('HISTORY_LIMIT', 500))
+
+# Suscripciones multi-cliente (chat, fechas, tag, visitantes, filtro)
+# Si el archivo no existe o está vacío se usa TELEGRAM_CHAT_ID + target_dates.json
+SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', 'subscriptions.json')
+
 # Monitor Config
 CHECK_INTERVAL_SECONDS = int(os.getenv('CHECK_INTERVAL_SECONDS', 1800))  # Default: cada 30 min
 
@@ -41,8 +64,77 @@ CHECK_INTERVAL_SECONDS = int(os.getenv('CHECK_INTERVAL_SECONDS', 1800))  # Defau
 TARGET_DATES = os.getenv('TARGET_DATES', '').split(',') if os.getenv('TARGET_DATES') else []
 
 # Máximo de fechas a consultar por verificación (para evitar detección)
+# Las fechas se rotan entre ciclos priorizando las más cercanas; 0 = todas
 MAX_DATES_PER_CHECK = int(os.getenv('MAX_DATES_PER_CHECK', 5))
 
+# Presupuesto de peticiones a la API del Vaticano (0 = sin límite)
+MAX_REQUESTS_PER_HOUR = int(os.getenv('MAX_REQUESTS_PER_HOUR', 60))
+MAX_REQUESTS_PER_DAY = int(os.getenv('MAX_REQUESTS_PER_DAY', 500))
+BUDGET_FILE = os.getenv('BUDGET_FILE', 'request_budget.json')
+
+# Sondeo de capacidad (grupo más grande que admite cada producto)
+CAPACITY_FILE = os.getenv('CAPACITY_FILE', 'capacity_bounds.json')
+CAPACITY_MAX_VISITORS = int(os.getenv('CAPACITY_MAX_VISITORS', 30))
+
+# Caché de horarios del dashboard (segundos): fresca durante TTL,
+# se sirve vencida y se refresca en segundo plano hasta MAX_STALE
+TIMESLOT_CACHE_TTL = int(os.getenv('TIMESLOT_CACHE_TTL', 60))
+TIMESLOT_MAX_STALE = int(os.getenv('TIMESLOT_MAX_STALE', 600))
+
+# Cola persistente de notificaciones (límites de Telegram: ~1 msg/s por chat, ~30 msg/s global)
+NOTIFY_QUEUE_FILE = os.getenv('NOTIFY_QUEUE_FILE', 'notification_queue.db')
+NOTIFY_PER_CHAT_INTERVAL = float(os.getenv('NOTIFY_PER_CHAT_INTERVAL', 1.0))
+NOTIFY_GLOBAL_PER_SECOND = int(os.getenv('NOTIFY_GLOBAL_PER_SECOND', 30))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', 8))
+
+# Canales adicionales de notificación (vacío = desactivado); se envían en
+# paralelo con Telegram, cada uno con su propio timeout en segundos
+NOTIFY_CHANNEL_TIMEOUT = float(os.getenv('NOTIFY_CHANNEL_TIMEOUT', 10))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL', '')
+SMTP_HOST = os.getenv('SMTP_HOST', '')
+SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+SMTP_USER = os.getenv('SMTP_USER', '')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+SMTP_FROM = os.getenv('SMTP_FROM', '')
+SMTP_TO = [a.strip() for a in os.getenv('SMTP_TO', '').split(',') if a.strip()]
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+
+# Servidor web de producción (serve.py / gunicorn.conf.py): un proceso con
+# WEB_THREADS hilos, para que el monitor se ejecute una sola vez
+WEB_HOST = os.getenv('WEB_HOST', '0.0.0.0')
+WEB_PORT = int(os.getenv('PORT', 5001))
+WEB_THREADS = int(os.getenv('WEB_THREADS', 32))
+
+# Stream SSE del dashboard (/api/stream): latido para mantener la conexión y
+# lectura de respaldo del estado cuando el monitor no avisa (modo worker)
+STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+STREAM_POLL_SECONDS = float(os.getenv('STREAM_POLL_SECONDS', 5))
+# Cada stream abierto ocupa un hilo del servidor; por encima de este límite
+# se responde 503 y el dashboard pasa a consultar /api/status
+# (al menos 1, incluso con WEB_THREADS=1; 0 explícito desactiva el stream)
+STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', max(1, WEB_THREADS // 2)))
+
+# Modo del monitor en app.py:
+# - embedded: el monitor corre en el mismo proceso que Flask
+# - worker: el monitor corre en `python worker.py` y app.py se comunica por IPC
+MONITOR_MODE = os.getenv('MONITOR_MODE', 'embedded')
+IPC_DB_FILE = os.getenv('IPC_DB_FILE', 'monitor_ipc.db')
+WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', 0.5))
+
+# Elección de líder entre réplicas (vacío = desactivada, 'sqlite' o 'supabase')
+# Solo el proceso líder ejecuta verificaciones y envía alertas
+LEADER_ELECTION = os.getenv('LEADER_ELECTION', '')
+LEASE_DB_FILE = os.getenv('LEASE_DB_FILE', IPC_DB_FILE)
+LEASE_TTL_SECONDS = float(os.getenv('LEASE_TTL_SECONDS', 15))
+LEASE_HEARTBEAT_SECONDS = float(os.getenv('LEASE_HEARTBEAT_SECONDS', 5))
+
+# Sharding de fechas entre varios workers (vacío = desactivado, 'sqlite' o 'supabase')
+# Cada worker consulta solo sus fechas; sustituye a la elección de líder
+SHARDING = os.getenv('SHARDING', '')
+SHARD_WORKER_ID = os.getenv('SHARD_WORKER_ID', '')
+SHARD_VNODES = int(os.getenv('SHARD_VNODES', 64))
+
 # ===== Variables legacy (para compatibilidad) =====
 # Estas ya no se usan pero se mantienen para no romper imports
 VATICAN_CALENDAR_URL = f'{VATICAN_API_BASE}/search/calendar'
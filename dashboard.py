@@ -0,0 +1,72 @@
+"""
+Dashboard web compilado una sola vez
+
+static/dashboard.html es el único dashboard, compartido por Flask (app.py)
+y Vercel (api/index.py). Al primer uso se le inyectan las funciones de la
+plataforma y se guardan en memoria sus bytes comprimidos (gzip y, si está
+instalado, brotli) y su ETag; cada petición solo elige la variante.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from http_cache import brotli, precompressed_response
+
+DASHBOARD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dashboard.html')
+
+# El HTML se revalida siempre con el ETag (304 sin cuerpo si no cambió), así
+# que tras un despliegue el navegador recibe la versión nueva de inmediato
+CACHE_CONTROL = 'no-cache'
+
+# Funciones disponibles en cada plataforma
+PLATFORMS = {
+    'flask': {
+        'checkUrl': '/api/check-now',
+        'exportExcel': True,
+        'controls': True,
+        'calendar': True
+    },
+    'vercel': {
+        'checkUrl': '/api/check',
+        'exportExcel': False,
+        'controls': False,
+        'calendar': False
+    }
+}
+
+_compiled: Dict[str, Tuple[str, Dict[Optional[str], bytes]]] = {}
+_lock = threading.Lock()
+
+
+def _compile(platform: str) -> Tuple[str, Dict[Optional[str], bytes]]:
+    with open(DASHBOARD_FILE, 'r', encoding='utf-8') as f:
+        html = f.read()
+    html = html.replace('__DASHBOARD_CONFIG__', json.dumps(PLATFORMS[platform]))
+    body = html.encode('utf-8')
+
+    variants = {None: body, 'gzip': gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    etag = f'"{hashlib.sha256(body).hexdigest()[:20]}"'
+    return etag, variants
+
+
+def compile_dashboard(platform: str) -> Tuple[str, Dict[Optional[str], bytes]]:
+    """Compila el dashboard de una plataforma (solo la primera vez)."""
+    with _lock:
+        if platform not in _compiled:
+            _compiled[platform] = _compile(platform)
+        return _compiled[platform]
+
+
+def dashboard_response(platform: str, accept_encoding: str = '',
+                       if_none_match: str = '') -> Tuple[int, Dict[str, str], bytes]:
+    """(código, cabeceras, cuerpo) del dashboard para una plataforma."""
+    etag, variants = compile_dashboard(platform)
+
+    return precompressed_response(
+        variants, etag, 'text/html; charset=utf-8',
+        accept_encoding, if_none_match, CACHE_CONTROL
+    )
@@ -0,0 +1,161 @@
+"""
+Expansión de peticiones de fechas en bloque (/api/dates)
+
+Un mismo cuerpo puede combinar:
+    {"date": "15/03/2027"}                                  una fecha
+    {"dates": ["15/03/2027", "16/03/2027"]}                 lista
+    {"from": "01/03/2027", "to": "15/03/2027"}              rango (incluido)
+    {"month": "03/2027", "weekdays": ["mar"]}               todos los martes de marzo
+    {"ranges": [{"from": ..., "to": ..., "weekdays": [1, 3]}, {"month": ...}]}
+
+Un 'weekdays' en el nivel superior filtra también las fechas sueltas de
+'date'/'dates'. Los días de la semana se aceptan como número (0 = lunes) o
+por nombre (español, inglés o italiano, completo o abreviado). El resultado sale
+validado, normalizado a DD/MM/YYYY, sin duplicados y ordenado en una sola
+pasada, listo para escribirse en una única operación.
+"""
+import calendar
+import unicodedata
+from datetime import timedelta, date as date_cls
+from typing import List, Optional, Set, Tuple
+from date_scheduler import parse_date
+from config import MAX_BULK_DATES
+
+_WEEKDAY_NAMES = {
+    0: ('lunes', 'lun', 'monday', 'mon', 'lunedi'),
+    1: ('martes', 'mar', 'tuesday', 'tue', 'martedi'),
+    2: ('miercoles', 'mie', 'wednesday', 'wed', 'mercoledi', 'mer'),
+    3: ('jueves', 'jue', 'thursday', 'thu', 'giovedi', 'gio'),
+    4: ('viernes', 'vie', 'friday', 'fri', 'venerdi', 'ven'),
+    5: ('sabado', 'sab', 'saturday', 'sat', 'sabato'),
+    6: ('domingo', 'dom', 'sunday', 'sun', 'domenica')
+}
+WEEKDAYS = {name: day for day, names in _WEEKDAY_NAMES.items() for name in names}
+
+
+def format_date(value: date_cls) -> str:
+    return value.strftime('%d/%m/%Y')
+
+
+def _strip_accents(text: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
+
+
+def parse_weekdays(values) -> Optional[Set[int]]:
+    """Días de la semana (0 = lunes); None si no se indican."""
+    if values is None:
+        return None
+    if not isinstance(values, list):
+        values = [values]
+
+    days = set()
+    for value in values:
+        if isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 6:
+            days.add(value)
+            continue
+        name = _strip_accents(str(value).strip().lower())
+        if name not in WEEKDAYS:
+            raise ValueError(f'Día de la semana inválido: {value}')
+        days.add(WEEKDAYS[name])
+    return days
+
+
+def _required_date(value, field: str) -> date_cls:
+    parsed = parse_date(str(value or '').strip())
+    if parsed is None:
+        raise ValueError(f'Fecha inválida en "{field}": {value}. Use DD/MM/YYYY')
+    return parsed
+
+
+def expand_range(spec: dict) -> List[date_cls]:
+    """Fechas de un rango {'from', 'to'} o mes {'month': 'MM/YYYY'}, filtradas por 'weekdays'."""
+    if spec.get('month'):
+        try:
+            month, year = (int(part) for part in str(spec['month']).split('/'))
+            last_day = calendar.monthrange(year, month)[1]
+        except (ValueError, calendar.IllegalMonthError):
+            raise ValueError(f'Mes inválido: {spec["month"]}. Use MM/YYYY')
+        start, end = date_cls(year, month, 1), date_cls(year, month, last_day)
+    else:
+        start = _required_date(spec.get('from'), 'from')
+        end = _required_date(spec.get('to') or spec.get('from'), 'to')
+        if end < start:
+            raise ValueError(f'Rango inválido: {format_date(start)} es posterior a {format_date(end)}')
+
+    days = (end - start).days + 1
+    if days > MAX_BULK_DATES:
+        raise ValueError(f'Rango demasiado largo ({days} días, máximo {MAX_BULK_DATES})')
+
+    weekdays = parse_weekdays(spec.get('weekdays'))
+    dates = (start + timedelta(days=i) for i in range(days))
+    return [d for d in dates if weekdays is None or d.weekday() in weekdays]
+
+
+def _single_values(data: dict) -> list:
+    """Valores de 'date' y 'dates' ('dates' debe ser una lista)."""
+    values = data.get('dates') or []
+    if not isinstance(values, list):
+        raise ValueError('"dates" debe ser una lista de fechas DD/MM/YYYY')
+    values = list(values)
+    if data.get('date'):
+        values.append(data['date'])
+    return values
+
+
+def _matches_weekdays(value, weekdays: Optional[Set[int]]) -> bool:
+    """Fechas sueltas que pasan el filtro 'weekdays' (las no reconocidas pasan)."""
+    parsed = parse_date(str(value).strip())
+    return weekdays is None or parsed is None or parsed.weekday() in weekdays
+
+
+def literal_dates(data: dict) -> List[str]:
+    """Valores de 'date'/'dates' tal cual llegaron (para borrar fechas guardadas sin normalizar)."""
+    if not isinstance(data, dict):
+        return []
+    weekdays = parse_weekdays(data.get('weekdays'))
+    values = [v for v in _single_values(data) if _matches_weekdays(v, weekdays)]
+    return [str(v).strip() for v in values if str(v).strip()]
+
+
+def expand_date_request(data: dict) -> Tuple[List[str], List[str]]:
+    """
+    Expande un cuerpo de /api/dates a una lista de fechas.
+
+    Returns:
+        (fechas válidas ordenadas y sin duplicados, valores inválidos de la lista)
+
+    Raises:
+        ValueError: Rango, mes o día de la semana mal formados, o demasiadas fechas
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Cuerpo JSON inválido')
+
+    singles = _single_values(data)
+    ranges = list(data.get('ranges') or [])
+    if data.get('month') or data.get('from'):
+        ranges.append(data)
+
+    if len(singles) > MAX_BULK_DATES:
+        raise ValueError(f'Demasiadas fechas ({len(singles)}, máximo {MAX_BULK_DATES})')
+
+    weekdays = parse_weekdays(data.get('weekdays'))
+    found: Set[date_cls] = set()
+    invalid = []
+    for value in singles:
+        parsed = parse_date(str(value).strip())
+        if parsed is None:
+            invalid.append(value)
+        elif weekdays is None or parsed.weekday() in weekdays:
+            found.add(parsed)
+
+    for spec in ranges:
+        if not isinstance(spec, dict):
+            raise ValueError(f'Rango inválido: {spec}')
+        found.update(expand_range(spec))
+        if len(found) > MAX_BULK_DATES:
+            break
+
+    if len(found) > MAX_BULK_DATES:
+        raise ValueError(f'Demasiadas fechas ({len(found)}, máximo {MAX_BULK_DATES})')
+
+    return [format_date(d) for d in sorted(found)], invalid
@@ -0,0 +1,168 @@
+"""
+Planificador de fechas por ciclo (round-robin con prioridad por cercanía)
+
+Cada verificación consulta como máximo MAX_DATES_PER_CHECK fechas. Los huecos
+de cada ciclo se reparten en dos grupos:
+  - Rotación: las fechas más antiguas (sin consultar desde hace más tiempo).
+    Garantiza que ninguna fecha quede sin consultar más de
+    ceil(n / huecos_rotacion) ciclos.
+  - Prioridad: fechas cercanas y resultados viejos, ponderados por urgencia.
+"""
+import math
+import threading
+from datetime import datetime, date as date_cls
+from typing import Callable, Dict, List, Optional
+from config import MAX_DATES_PER_CHECK, CHECK_INTERVAL_SECONDS
+
+# Segundos máximos que puede tardar una consulta (delay aleatorio + timeout + reintento)
+MAX_SECONDS_PER_QUERY = 3 + 30 + 4 + 30
+
+
+def parse_date(date_str: str) -> Optional[date_cls]:
+    """Convierte 'DD/MM/YYYY' a date (None si el formato es inválido)."""
+    try:
+        day, month, year = date_str.split('/')
+        return date_cls(int(year), int(month), int(day))
+    except (ValueError, AttributeError):
+        return None
+
+
+def urgency_weight(date_str: str, today: date_cls = None) -> float:
+    """Peso de urgencia: las fechas más cercanas pesan más."""
+    target = parse_date(date_str)
+    if target is None:
+        return 1.0
+
+    days_until = (target - (today or datetime.now().date())).days
+    if days_until < 0:
+        return 1.0
+    if days_until <= 7:
+        return 3.0
+    if days_until <= 30:
+        return 2.0
+    return 1.0
+
+
+class SupabaseCheckStore:
+    """Última consulta de cada fecha en Supabase (tabla date_checks), para
+    rotar entre invocaciones serverless que no guardan estado."""
+
+    def load(self, dates: List[str]) -> Dict[str, datetime]:
+        from api.db import get_date_checks
+        return get_date_checks(dates)
+
+    def save(self, dates: List[str], checked_at: datetime = None):
+        from api.db import mark_dates_checked
+        mark_dates_checked(dates, checked_at or datetime.now())
+
+
+class DateScheduler:
+    """Selecciona qué fechas consultar en cada ciclo."""
+
+    def __init__(self, max_per_cycle: int = None, interval_seconds: int = None,
+                 date_of: Callable[[str], str] = None):
+        """
+        Args:
+            max_per_cycle: Máximo de fechas por ciclo (0 = todas)
+            interval_seconds: Intervalo entre ciclos
+            date_of: Extrae la fecha DD/MM/YYYY de cada clave (por defecto, la clave es la fecha)
+        """
+        self.max_per_cycle = MAX_DATES_PER_CHECK if max_per_cycle is None else max_per_cycle
+        self.interval_seconds = interval_seconds or CHECK_INTERVAL_SECONDS
+        self.date_of = date_of or (lambda key: key)
+        self.cycle = 0
+        self.last_checked_cycle: Dict[str, int] = {}
+        self.last_checked_at: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def _slots(self, num_dates: int, limit: int = None) -> int:
+        """Número de fechas a consultar este ciclo."""
+        slots = self.max_per_cycle if limit is None else limit
+        if slots <= 0:
+            return num_dates
+        return min(slots, num_dates)
+
+    def _age(self, date: str) -> float:
+        """Ciclos desde la última consulta (infinito si nunca se consultó)."""
+        last = self.last_checked_cycle.get(date)
+        if last is None:
+            return math.inf
+        return self.cycle - last
+
+    def select(self, dates: List[str], limit: int = None) -> List[str]:
+        """
+        Devuelve las fechas a consultar en este ciclo, en orden de consulta.
+
+        Args:
+            dates: Fechas objetivo (DD/MM/YYYY)
+            limit: Límite opcional para este ciclo (ej: presupuesto de peticiones)
+        """
+        with self._lock:
+            self.cycle += 1
+            dates = [d for d in dict.fromkeys(d.strip() for d in dates) if d]
+
+            # Olvidar fechas que ya no se monitorean
+            for stale in set(self.last_checked_cycle) - set(dates):
+                self.last_checked_cycle.pop(stale, None)
+                self.last_checked_at.pop(stale, None)
+
+            slots = self._slots(len(dates), limit)
+            if slots >= len(dates):
+                return sorted(dates, key=lambda d: -self._age(d))
+
+            # Rotación estricta por antigüedad (garantiza la cota de staleness)
+            rotation_slots = slots - slots // 2
+            by_age = sorted(dates, key=lambda d: -self._age(d))
+            selected = by_age[:rotation_slots]
+
+            # Prioridad: antigüedad ponderada por cercanía de la fecha
+            today = datetime.now().date()
+            remaining = [d for d in dates if d not in selected]
+            remaining.sort(key=lambda d: -(self._age(d) * urgency_weight(self.date_of(d), today)))
+            selected.extend(remaining[:slots - rotation_slots])
+
+            return selected
+
+    def restore(self, last_checked_at: Dict[str, datetime], now: datetime = None):
+        """
+        Carga consultas previas guardadas fuera del proceso (ej: invocaciones serverless).
+
+        La antigüedad en ciclos se deduce del tiempo transcurrido y el intervalo.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            for date, checked_at in last_checked_at.items():
+                elapsed = max(0.0, (now - checked_at).total_seconds())
+                self.last_checked_cycle[date] = self.cycle - int(elapsed // self.interval_seconds)
+                self.last_checked_at[date] = checked_at
+
+    def mark_checked(self, date: str):
+        """Registra que una fecha fue consultada en el ciclo actual."""
+        with self._lock:
+            self.last_checked_cycle[date] = self.cycle
+            self.last_checked_at[date] = datetime.now()
+
+    def max_staleness_cycles(self, num_dates: int) -> int:
+        """Peor caso de ciclos entre dos consultas de una misma fecha."""
+        slots = self._slots(num_dates)
+        if num_dates == 0 or slots >= num_dates:
+            return 1
+        rotation_slots = slots - slots // 2
+        return math.ceil(num_dates / rotation_slots)
+
+    def get_status(self, dates: List[str]) -> dict:
+        """Información del planificador para la interfaz web."""
+        num_dates = len([d for d in dates if d.strip()])
+        slots = self._slots(num_dates)
+        staleness = self.max_staleness_cycles(num_dates)
+        with self._lock:
+            last_checked = {
+                self.date_of(d): t.isoformat() for d, t in self.last_checked_at.items()
+            }
+        return {
+            'dates_per_check': slots,
+            'max_staleness_cycles': staleness,
+            'max_staleness_seconds': staleness * self.interval_seconds,
+            'max_cycle_seconds': slots * MAX_SECONDS_PER_QUERY,
+            'last_checked': last_checked
+        }
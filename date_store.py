@@ -0,0 +1,163 @@
+"""
+Almacén en memoria de las fechas objetivo (target_dates.json)
+
+Las fechas se guardan ordenadas en memoria y solo se releen del disco cuando
+cambia el archivo (mtime/tamaño, comprobado como mucho una vez cada
+FILE_CHECK_SECONDS), así que las consultas de estado no abren el archivo.
+Las escrituras se hacen con un lock y escritura atómica (archivo temporal +
+rename): dos altas/bajas simultáneas no pueden corromper el archivo ni
+perderse dentro del proceso.
+
+CachedJsonFile es la base genérica; la usan también las suscripciones y el
+backend JSON de storage.py.
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+from date_scheduler import parse_date
+from config import DATES_FILE, FILE_CHECK_SECONDS
+
+
+# Un lock por archivo, compartido por todas las instancias del proceso
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.RLock:
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.RLock())
+
+
+class CachedJsonFile:
+    """Contenido de un archivo JSON en memoria, invalidado por cambios en disco."""
+
+    def __init__(self, path: str, default: Callable[[], object] = dict,
+                 check_seconds: float = FILE_CHECK_SECONDS):
+        self.path = path
+        self.default = default
+        self.check_seconds = check_seconds
+        self.lock = _lock_for(path)
+        self._data = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def read(self, force: bool = False):
+        """
+        Contenido actual (releído solo si el archivo cambió). No modificar el resultado.
+
+        Con force se relee siempre, sin fiarse de mtime/tamaño (antes de escribir).
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not force and self._data is not None and now - self._checked_at < self.check_seconds:
+                return self._data
+            self._checked_at = now
+
+            signature = self._stat()
+            if not force and self._data is not None and signature == self._signature:
+                return self._data
+
+            data = self.default()
+            if signature is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Error leyendo {self.path}: {e}")
+                    if self._data is not None:
+                        return self._data
+            self._data = data
+            self._signature = signature
+            return data
+
+    def write(self, data):
+        """Escritura atómica (temporal + rename) y actualización de la copia en memoria."""
+        with self.lock:
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._data = data
+            self._signature = self._stat()
+            self._checked_at = time.monotonic()
+
+    def update(self, func: Callable[[object], object]):
+        """Lee-modifica-escribe bajo el lock; `func` recibe el contenido y devuelve el nuevo."""
+        with self.lock:
+            data = func(self.read(force=True))
+            self.write(data)
+            return data
+
+
+def _date_sort_key(date: str):
+    parsed = parse_date(date)
+    # Fechas con formato inválido al final, en orden alfabético
+    return (parsed is None, parsed or date, date)
+
+
+def sort_dates(dates: Iterable[str]) -> List[str]:
+    """Fechas sin duplicados ni vacías, en orden cronológico."""
+    cleaned = [d.strip() for d in dates if d and d.strip()]
+    return sorted(dict.fromkeys(cleaned), key=_date_sort_key)
+
+
+class DateStore:
+    """Fechas objetivo ordenadas, en memoria y persistidas en JSON."""
+
+    def __init__(self, path: str = DATES_FILE):
+        self.file = CachedJsonFile(path, default=lambda: {'dates': []})
+        self._cache_key = None
+        self._dates: List[str] = []
+
+    def all(self) -> List[str]:
+        """Fechas ordenadas (copia)."""
+        with self.file.lock:
+            data = self.file.read()
+            if data is not self._cache_key:
+                self._dates = sort_dates(data.get('dates', []))
+                self._cache_key = data
+            return list(self._dates)
+
+    def add(self, date: str) -> bool:
+        """Agrega una fecha; False si ya existía."""
+        return bool(self.add_many([date]))
+
+    def remove(self, date: str) -> bool:
+        """Elimina una fecha; False si no existía."""
+        return bool(self.remove_many([date]))
+
+    def add_many(self, dates: Iterable[str]) -> List[str]:
+        """Agrega varias fechas con una sola escritura; devuelve las que no existían."""
+        with self.file.lock:
+            current = self.file.read(force=True).get('dates', [])
+            existing = set(current)
+            added = [d for d in sort_dates(dates) if d not in existing]
+            if added:
+                self.file.write({'dates': sort_dates(current + added)})
+            return added
+
+    def remove_many(self, dates: Iterable[str]) -> List[str]:
+        """Elimina varias fechas con una sola escritura; devuelve las que existían."""
+        with self.file.lock:
+            current = self.file.read(force=True).get('dates', [])
+            targets = {d.strip() for d in dates if d}
+            removed = [d for d in current if d in targets]
+            if removed:
+                self.file.write({'dates': [d for d in current if d not in targets]})
+            return removed
+
+    def replace(self, dates: List[str]):
+        """Sustituye todas las fechas."""
+        self.file.write({'dates': sort_dates(dates)})
+
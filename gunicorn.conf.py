@@ -0,0 +1,23 @@
+"""
+Configuración de gunicorn para app.py
+
+Un solo worker con hilos (gthread): el monitor se arranca una vez, en el
+worker, tras el fork. Para más workers usa MONITOR_MODE=worker con
+`python worker.py`, o LEADER_ELECTION para que solo uno verifique.
+
+Uso:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+from config import WEB_HOST, WEB_PORT, WEB_THREADS
+
+bind = f"{WEB_HOST}:{WEB_PORT}"
+workers = 1
+worker_class = 'gthread'
+threads = WEB_THREADS
+# Latido del worker; con gthread las peticiones largas (streams SSE) no lo agotan
+timeout = 120
+
+
+def post_worker_init(worker):
+    from app import start_background
+    start_background()
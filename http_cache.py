@@ -0,0 +1,137 @@
+"""
+Respuestas HTTP cacheables: ETag, 304 y compresión
+
+Compartido por Flask (app.py) y las funciones de Vercel (api/*.py), que
+construyen las respuestas a mano: se devuelve (código, cabeceras, cuerpo)
+y cada servidor lo escribe a su manera.
+
+brotli es opcional: si el paquete no está instalado solo se usa gzip.
+"""
+import gzip
+import json
+from typing import Callable, Dict, Optional, Tuple, Union
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Por debajo de este tamaño comprimir no compensa
+MIN_COMPRESS_BYTES = 512
+
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """Mejor codificación aceptada por el cliente ('br', 'gzip' o None)."""
+    offered = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+
+    if brotli is not None and offered.get('br', 0) > 0:
+        return 'br'
+    if offered.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110) contra un ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def cached_response(body: Union[bytes, Callable[[], bytes]], etag: str, content_type: str,
+                    accept_encoding: str = '', if_none_match: str = '',
+                    cache_control: str = 'no-cache') -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Respuesta con ETag: 304 sin cuerpo si el cliente ya la tiene, si no
+    el cuerpo comprimido según Accept-Encoding.
+
+    Args:
+        body: Cuerpo, o función que lo genera (no se llama si la respuesta es 304)
+        etag: ETag de la representación sin comprimir (entre comillas);
+            las versiones comprimidas llevan un sufijo para seguir siendo fuertes
+    """
+    encoding = accepted_encoding(accept_encoding)
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding'
+    }
+    if etag_matches(if_none_match, etag):
+        return 304, headers, b''
+
+    if callable(body):
+        body = body()
+    headers['Content-Type'] = content_type
+    if encoding and len(body) >= MIN_COMPRESS_BYTES:
+        headers['Content-Encoding'] = encoding
+        body = compress(body, encoding)
+    return 200, headers, body
+
+
+def precompressed_response(variants: Dict[Optional[str], bytes], etag: str, content_type: str,
+                           accept_encoding: str = '', if_none_match: str = '',
+                           cache_control: str = 'no-cache') -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Como cached_response, pero con el cuerpo ya comprimido de antemano.
+
+    Args:
+        variants: {None: original, 'gzip': ..., 'br': ...} (br solo si hay brotli)
+    """
+    encoding = accepted_encoding(accept_encoding)
+    if encoding not in variants:
+        encoding = 'gzip' if encoding and 'gzip' in variants else None
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding'
+    }
+    if etag_matches(if_none_match, etag):
+        return 304, headers, b''
+
+    headers['Content-Type'] = content_type
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return 200, headers, variants[encoding]
+
+
+def json_response(data, etag: str, accept_encoding: str = '', if_none_match: str = '',
+                  cache_control: str = 'no-cache') -> Tuple[int, Dict[str, str], bytes]:
+    """
+    cached_response para un cuerpo JSON.
+
+    `data` puede ser una función: solo se llama (y se serializa) si no es un 304.
+    """
+    body = lambda: json.dumps(data() if callable(data) else data, separators=(',', ':')).encode()
+    return cached_response(body, etag, 'application/json', accept_encoding, if_none_match, cache_control)
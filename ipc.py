@@ -0,0 +1,185 @@
+"""
+Canal IPC entre la app web y el proceso worker del monitor
+
+Usa una base SQLite compartida (modo WAL):
+  - worker_status: último estado publicado por el worker
+  - worker_jobs: trabajos recientes del worker (para /api/jobs/<id>)
+  - commands: órdenes de la app web (start, stop, check_now, clear_alerts)
+
+La app web solo lee estado y escribe órdenes; nunca ejecuta verificaciones.
+"""
+import json
+import sqlite3
+import time
+from datetime import datetime
+from typing import List, Optional
+from config import IPC_DB_FILE
+
+# Segundos sin publicar estado tras los que se considera caído el worker
+WORKER_STALE_SECONDS = 15
+
+# Segundos tras los que una orden no procesada se descarta
+COMMAND_TTL_SECONDS = 30
+
+COMMANDS = ('start', 'stop', 'check_now', 'clear_alerts')
+
+
+class MonitorIPC:
+    """Acceso a la base SQLite compartida por la app web y el worker."""
+
+    def __init__(self, path: str = IPC_DB_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS worker_status (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    status TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS worker_jobs (
+                    id TEXT PRIMARY KEY,
+                    job TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS commands (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    command TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    processed_at REAL
+                );
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    # ============ LADO WEB ============
+
+    def read_status(self) -> Optional[dict]:
+        """Último estado publicado por el worker (None si nunca publicó)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT status, updated_at FROM worker_status WHERE id = 1'
+            ).fetchone()
+        if row is None:
+            return None
+
+        status = json.loads(row[0])
+        status['worker_alive'] = time.time() - row[1] < WORKER_STALE_SECONDS
+        status['worker_updated_at'] = datetime.fromtimestamp(row[1]).isoformat()
+        return status
+
+    def read_job(self, job_id: str) -> Optional[dict]:
+        """Estado de un trabajo del worker."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT job FROM worker_jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def send_command(self, command: str, wait_seconds: float = 5.0) -> Optional[dict]:
+        """
+        Envía una orden al worker y espera su resultado.
+
+        Returns:
+            Resultado de la orden, o None si el worker no respondió a tiempo
+        """
+        if command not in COMMANDS:
+            raise ValueError(f"Orden desconocida: {command}")
+
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO commands (command, created_at) VALUES (?, ?)',
+                (command, time.time())
+            )
+            command_id = cursor.lastrowid
+
+        deadline = time.time() + wait_seconds
+        while time.time() < deadline:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT status, result FROM commands WHERE id = ?', (command_id,)
+                ).fetchone()
+            if row and row[0] == 'done':
+                return json.loads(row[1]) if row[1] else {}
+            time.sleep(0.05)
+        return None
+
+    # ============ LADO WORKER ============
+
+    def publish_status(self, status: dict, jobs: List[dict] = None):
+        """Publica el estado actual del monitor y sus trabajos recientes."""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO worker_status (id, status, updated_at) VALUES (1, ?, ?)',
+                (json.dumps(status, default=str), time.time())
+            )
+            if jobs is not None:
+                conn.execute('DELETE FROM worker_jobs')
+                conn.executemany(
+                    'INSERT INTO worker_jobs (id, job) VALUES (?, ?)',
+                    [(job['id'], json.dumps(job)) for job in jobs]
+                )
+
+    def pending_commands(self) -> List[dict]:
+        """Órdenes pendientes, descartando las que caducaron."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE commands SET status = 'expired', processed_at = ? "
+                "WHERE status = 'pending' AND created_at < ?",
+                (now, now - COMMAND_TTL_SECONDS)
+            )
+            conn.execute(
+                "DELETE FROM commands WHERE status != 'pending' AND processed_at < ?",
+                (now - 3600,)
+            )
+            rows = conn.execute(
+                "SELECT id, command FROM commands WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+        return [{'id': row[0], 'command': row[1]} for row in rows]
+
+    def complete_command(self, command_id: int, result: dict):
+        """Marca una orden como procesada con su resultado."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE commands SET status = 'done', result = ?, processed_at = ? WHERE id = ?",
+                (json.dumps(result, default=str), time.time(), command_id)
+            )
+
+
+class RemoteMonitor:
+    """Fachada con la interfaz de VaticanMonitor que delega en el worker via IPC."""
+
+    def __init__(self, ipc: MonitorIPC = None):
+        self.ipc = ipc or MonitorIPC()
+
+    def _command(self, command: str) -> dict:
+        result = self.ipc.send_command(command)
+        if result is None:
+            raise TimeoutError('El worker del monitor no responde')
+        return result
+
+    def get_status(self) -> dict:
+        status = self.ipc.read_status()
+        if status is None:
+            return {'running': False, 'worker_alive': False, 'check_count': 0,
+                    'alerts_sent': 0, 'last_check': None, 'last_results': {}}
+        return status
+
+    def is_running(self) -> bool:
+        return bool(self.get_status().get('running'))
+
+    def enqueue_check(self) -> dict:
+        return self._command('check_now')['job']
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        return self.ipc.read_job(job_id)
+
+    def clear_alerted_slots(self):
+        self._command('clear_alerts')
+
+    def start(self):
+        self._command('start')
+
+    def stop(self):
+        self._command('stop')
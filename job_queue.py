@@ -0,0 +1,134 @@
+"""
+Cola de trabajos en segundo plano para las verificaciones
+
+Un único hilo ejecuta los trabajos de uno en uno, de modo que las
+verificaciones programadas y las manuales nunca se solapan. Si ya hay un
+trabajo del mismo tipo en espera, el nuevo se fusiona con él y se devuelve
+el mismo id.
+"""
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, List, Optional
+
+# Trabajos terminados que se conservan para consulta desde /api/jobs/<id>
+MAX_FINISHED_JOBS = 50
+
+
+class JobQueue:
+    """Cola FIFO con un único worker y fusión de duplicados."""
+
+    def __init__(self, on_change: Callable[[], None] = None):
+        """
+        Args:
+            on_change: Se llama al empezar y al terminar cada trabajo
+        """
+        self.on_change = on_change
+        self.jobs: 'OrderedDict[str, dict]' = OrderedDict()
+        self._queue = queue.Queue()
+        self._funcs = {}
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='job-queue', daemon=True)
+            self._worker.start()
+
+    def submit(self, kind: str, func: Callable[[Callable[[str, str], None]], object]) -> dict:
+        """
+        Encola un trabajo y devuelve su estado inmediatamente.
+
+        Args:
+            kind: Tipo de trabajo (ej: 'check'); se fusionan los pendientes del mismo tipo
+            func: Función a ejecutar; recibe un callback progress(clave, estado)
+        """
+        with self._lock:
+            for job in self.jobs.values():
+                if job['kind'] == kind and job['status'] == 'queued':
+                    job['coalesced'] += 1
+                    return {**job, 'progress': dict(job['progress'])}
+
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                'id': job_id,
+                'kind': kind,
+                'status': 'queued',
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'progress': {},
+                'coalesced': 0,
+                'error': None
+            }
+            self.jobs[job_id] = job
+            self._funcs[job_id] = func
+            self._prune()
+
+            snapshot = {**job, 'progress': {}}
+            self._queue.put(job_id)
+            self._ensure_worker()
+
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Devuelve una copia del estado de un trabajo."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, 'progress': dict(job['progress'])}
+
+    def snapshot(self) -> List[dict]:
+        """Copia del estado de todos los trabajos conservados."""
+        with self._lock:
+            return [{**job, 'progress': dict(job['progress'])} for job in self.jobs.values()]
+
+    def is_busy(self) -> bool:
+        """Indica si hay trabajos en espera o en ejecución."""
+        with self._lock:
+            return any(j['status'] in ('queued', 'running') for j in self.jobs.values())
+
+    def _prune(self):
+        """Descarta los trabajos terminados más antiguos."""
+        finished = [jid for jid, j in self.jobs.items() if j['status'] in ('done', 'failed')]
+        for job_id in finished[:-MAX_FINISHED_JOBS]:
+            del self.jobs[job_id]
+
+    def _changed(self):
+        if self.on_change:
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"Error notificando cambio de trabajo: {e}")
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self.jobs.get(job_id)
+                func = self._funcs.pop(job_id, None)
+                if job is None or func is None:
+                    continue
+                job['status'] = 'running'
+                job['started_at'] = datetime.now().isoformat()
+            self._changed()
+
+            def progress(key: str, state: str, _job=job):
+                with self._lock:
+                    _job['progress'][key] = state
+
+            try:
+                func(progress)
+                status, error = 'done', None
+            except Exception as e:
+                print(f"Error en trabajo {job_id}: {e}")
+                status, error = 'failed', str(e)
+
+            with self._lock:
+                job['status'] = status
+                job['error'] = error
+                job['finished_at'] = datetime.now().isoformat()
+            self._changed()
@@ -0,0 +1,179 @@
+"""
+Elección de líder por lease para ejecutar un único monitor activo
+
+Cada proceso intenta adquirir (o renovar) un lease con TTL en un almacén
+compartido. Solo el titular del lease ejecuta verificaciones y envía alertas;
+el resto queda en espera y toma el relevo cuando el lease expira.
+
+Almacenes disponibles (LEADER_ELECTION):
+  - sqlite: archivo local (varios procesos en la misma máquina/volumen)
+  - supabase: tabla monitor_leases vía RPC (réplicas en distintas máquinas)
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+from config import (
+    LEADER_ELECTION,
+    LEASE_DB_FILE,
+    LEASE_TTL_SECONDS,
+    LEASE_HEARTBEAT_SECONDS
+)
+
+
+class SQLiteLeaseStore:
+    """Leases en una base SQLite compartida."""
+
+    def __init__(self, path: str = LEASE_DB_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def acquire(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Adquiere o renueva el lease; True si `holder` es el titular."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE
+                    SET holder = excluded.holder, expires_at = excluded.expires_at
+                    WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            ''', (name, holder, now + ttl_seconds, now))
+            row = conn.execute('SELECT holder FROM leases WHERE name = ?', (name,)).fetchone()
+        return row is not None and row[0] == holder
+
+    def acquire_many(self, names: List[str], holder: str, ttl_seconds: float) -> List[str]:
+        """Adquiere o renueva varios leases en una transacción; devuelve los obtenidos."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE
+                    SET holder = excluded.holder, expires_at = excluded.expires_at
+                    WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            ''', [(name, holder, now + ttl_seconds, now) for name in names])
+            rows = conn.execute('SELECT name FROM leases WHERE holder = ?', (holder,)).fetchall()
+        held = {row[0] for row in rows}
+        return [name for name in names if name in held]
+
+    def release(self, name: str, holder: str):
+        """Libera el lease si `holder` es el titular."""
+        self.release_many([name], holder)
+
+    def release_many(self, names: List[str], holder: str):
+        """Libera los leases indicados que pertenezcan a `holder`."""
+        with self._connect() as conn:
+            conn.executemany(
+                'DELETE FROM leases WHERE name = ? AND holder = ?',
+                [(name, holder) for name in names]
+            )
+
+
+class SupabaseLeaseStore:
+    """Leases en Supabase (tabla monitor_leases)."""
+
+    def acquire(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        from api.db import acquire_lease
+        return acquire_lease(name, holder, ttl_seconds)
+
+    def acquire_many(self, names: List[str], holder: str, ttl_seconds: float) -> List[str]:
+        from api.db import acquire_leases
+        return acquire_leases(names, holder, ttl_seconds)
+
+    def release(self, name: str, holder: str):
+        self.release_many([name], holder)
+
+    def release_many(self, names: List[str], holder: str):
+        from api.db import release_leases
+        release_leases(names, holder)
+
+
+class LeaderElector:
+    """Mantiene el lease con un latido periódico en segundo plano."""
+
+    def __init__(self, store, name: str = 'monitor', ttl_seconds: float = LEASE_TTL_SECONDS,
+                 heartbeat_seconds: float = LEASE_HEARTBEAT_SECONDS,
+                 on_elected: Callable[[], None] = None):
+        self.store = store
+        self.name = name
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.ttl_seconds = ttl_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.on_elected = on_elected
+        self.is_leader = False
+        self.leader_since = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def heartbeat(self) -> bool:
+        """Intenta adquirir o renovar el lease y actualiza el rol."""
+        try:
+            acquired = self.store.acquire(self.name, self.holder, self.ttl_seconds)
+        except Exception as e:
+            print(f"Error renovando lease de líder: {e}")
+            acquired = False
+
+        if acquired and not self.is_leader:
+            self.leader_since = time.time()
+            print(f"👑 Proceso {self.holder} elegido líder")
+            self.is_leader = True
+            if self.on_elected:
+                self.on_elected()
+        elif not acquired and self.is_leader:
+            print(f"⏸️ Proceso {self.holder} perdió el liderazgo")
+            self.is_leader = False
+            self.leader_since = None
+
+        return self.is_leader
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            self.heartbeat()
+
+    def start(self):
+        """Primer intento síncrono y latido periódico en segundo plano."""
+        self._stop.clear()
+        self.heartbeat()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='leader-lease', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Detiene el latido y libera el lease para acelerar el relevo."""
+        self._stop.set()
+        if self.is_leader:
+            try:
+                self.store.release(self.name, self.holder)
+            except Exception as e:
+                print(f"Error liberando lease de líder: {e}")
+        self.is_leader = False
+        self.leader_since = None
+
+    def get_status(self) -> dict:
+        return {
+            'holder': self.holder,
+            'is_leader': self.is_leader,
+            'leader_since': self.leader_since,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+
+def create_elector(on_elected: Callable[[], None] = None) -> Optional[LeaderElector]:
+    """Crea el elector según LEADER_ELECTION (None si está desactivado)."""
+    if LEADER_ELECTION == 'sqlite':
+        return LeaderElector(SQLiteLeaseStore(), on_elected=on_elected)
+    if LEADER_ELECTION == 'supabase':
+        return LeaderElector(SupabaseLeaseStore(), on_elected=on_elected)
+    return None
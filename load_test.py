@@ -0,0 +1,81 @@
+"""
+Prueba de carga del servidor web
+
+Lanza peticiones concurrentes contra unas rutas durante un tiempo fijo e
+imprime el throughput y la latencia. Sirve para comparar el servidor de
+desarrollo (python app.py) con el de producción (python serve.py).
+
+Uso:
+    python load_test.py --url http://localhost:5001 --concurrency 32 --seconds 15
+    python load_test.py --paths /api/status /api/dates
+"""
+import argparse
+import statistics
+import threading
+import time
+import requests
+
+
+def worker(base_url: str, paths: list, deadline: float, latencies: list, errors: list, lock: threading.Lock):
+    session = requests.Session()
+    i = 0
+    while time.time() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = session.get(base_url + path, timeout=30)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            (latencies if ok else errors).append(elapsed)
+
+
+def run(base_url: str, paths: list, concurrency: int, seconds: float) -> dict:
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+    threads = [
+        threading.Thread(target=worker, args=(base_url, paths, deadline, latencies, errors, lock))
+        for _ in range(concurrency)
+    ]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duration = time.time() - started
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del dashboard')
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--paths', nargs='+', default=['/api/status', '/api/dates', '/'])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=15)
+    args = parser.parse_args()
+
+    print(f"🚀 {args.concurrency} clientes durante {args.seconds}s contra {args.url} {args.paths}")
+    result = run(args.url.rstrip('/'), args.paths, args.concurrency, args.seconds)
+    print(f"  Peticiones: {result['requests']} ({result['errors']} errores)")
+    print(f"  Throughput: {result['rps']:.1f} req/s")
+    print(f"  Latencia: p50 {result['p50_ms']:.1f} ms · p95 {result['p95_ms']:.1f} ms · "
+          f"p99 {result['p99_ms']:.1f} ms · media {result['mean_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,28 @@ Versión actualizada con los nuevos endpoints (Diciembre 2025)
 """
 import sys
 import io
-import os
-import json
 import time
 import random
 from datetime import datetime
-from typing import Set, List
 from apscheduler.schedulers.background import BackgroundScheduler
-from vatican_client import VaticanClient
+from vatican_client import VaticanClient, filter_products
 from telegram_notifier import TelegramNotifier
+from notification_queue import NotificationQueue
+from notification_channels import create_notifier
+from date_scheduler import DateScheduler, parse_date
+from subscriptions import (
+    SubscriptionIndex,
+    load_subscriptions,
+    default_subscription,
+    parse_query_key,
+    date_of
+)
+from request_budget import request_budget
+from storage import get_storage
+from job_queue import JobQueue
+from capacity import CapacityProber
+from leader import create_elector
+from sharding import create_shard_coordinator
 from config import (
     CHECK_INTERVAL_SECONDS,
     DEFAULT_VISIT_TAG,
@@ -22,21 +35,6 @@ from config import (
     MAX_DATES_PER_CHECK
 )
 
-# Archivo para las fechas configuradas desde el frontend
-DATES_FILE = 'target_dates.json'
-
-
-def load_target_dates() -> List[str]:
-    """Carga las fechas desde el archivo JSON."""
-    if os.path.exists(DATES_FILE):
-        try:
-            with open(DATES_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('dates', [])
-        except:
-            pass
-    return []
-
 # Fix encoding for Windows console (emojis)
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
@@ -46,96 +44,264 @@ if sys.platform == 'win32':
 class VaticanMonitor:
     def __init__(self):
         self.client = VaticanClient()
-        self.notifier = TelegramNotifier()
+        self.notifications = NotificationQueue()
+        # Canal principal: Telegram + webhook/Slack/email si están configurados
+        self.notifier = create_notifier(TelegramNotifier(queue=self.notifications))
         self.scheduler = BackgroundScheduler()
-
-        # Estado para evitar alertas duplicadas
-        self.alerted_products: Set[str] = set()  # formato: "DD/MM/YYYY_productId"
+        self.date_schedulers = {}  # especificación de búsqueda -> DateScheduler
+        self.notifiers = {}  # chat_id -> TelegramNotifier
+        self.budget = request_budget
+        self.listeners = []  # callbacks sin argumentos al cambiar el estado
+        self.jobs = JobQueue(on_change=self._notify_listeners)
+        self.capacity = CapacityProber(self.client)
+        # Con sharding cada worker es activo en sus fechas; si no, un único líder
+        self.shard = create_shard_coordinator(proxy_manager=self.client.proxy_manager)
+        self.leader = None if self.shard else create_elector(on_elected=self._on_elected)
+
+        # Fechas, contadores, productos alertados e historial persisten entre
+        # reinicios (formato de las claves alertadas: "DD/MM/YYYY_productId")
+        self.storage = get_storage()
+        saved = self.storage.get_status()
 
         # Último resultado para la interfaz web
-        self.last_check_time = None
-        self.last_results = {}
-        self.check_count = 0
-        self.alerts_sent = 0
-
-    def _product_key(self, date: str, product_id: int) -> str:
-        """Genera clave única para un producto en una fecha."""
-        return f"{date}_{product_id}"
-
-    def check_and_alert(self):
-        """Ejecuta verificación y envía alertas si hay disponibilidad."""
-        self.check_count += 1
+        self.last_check_time = self._parse_time(saved.get('last_check'))
+        self.last_results = saved.get('last_results') or {}
+        self.query_results = {}  # query_key -> productos disponibles (sin filtrar)
+        self.check_count = saved.get('check_count', 0)
+        self.alerts_sent = saved.get('alerts_sent', 0)
+
+    @staticmethod
+    def _parse_time(value):
+        try:
+            return datetime.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+
+    def _product_key(self, date: str, product_id: int, subscription_id: str = 'default') -> str:
+        """Genera clave única para un producto en una fecha (y suscripción)."""
+        if subscription_id == 'default':
+            return f"{date}_{product_id}"
+        return f"{subscription_id}:{date}_{product_id}"
+
+    def _subscription_index(self) -> SubscriptionIndex:
+        """Índice de suscripciones; sin suscripciones, la implícita de target_dates.json."""
+        subscriptions = load_subscriptions()
+        if not subscriptions:
+            dates = self.storage.get_dates()
+            subscriptions = [default_subscription(dates)] if dates else []
+        return SubscriptionIndex(subscriptions)
+
+    def _date_scheduler(self, spec: str) -> DateScheduler:
+        """Planificador de fechas de una especificación de búsqueda."""
+        if spec not in self.date_schedulers:
+            self.date_schedulers[spec] = DateScheduler(
+                MAX_DATES_PER_CHECK, CHECK_INTERVAL_SECONDS, date_of=date_of
+            )
+        return self.date_schedulers[spec]
+
+    def _notifier_for(self, chat_id: str):
+        """Notificador para un chat (reutiliza el principal si coincide)."""
+        if not chat_id or chat_id == self.notifier.chat_id:
+            return self.notifier
+        if chat_id not in self.notifiers:
+            self.notifiers[chat_id] = TelegramNotifier(chat_id=chat_id, queue=self.notifications)
+        return self.notifiers[chat_id]
+
+    def _merge_by_date(self, per_subscription: dict) -> dict:
+        """Une los resultados de todas las suscripciones por fecha (para la interfaz web)."""
+        merged = {}
+        for availability in per_subscription.values():
+            for date, products in availability.items():
+                seen = {p.get('id') for p in merged.get(date, [])}
+                merged.setdefault(date, []).extend(p for p in products if p.get('id') not in seen)
+        return dict(sorted(merged.items(), key=lambda item: parse_date(item[0]) or datetime.max.date()))
+
+    def add_listener(self, callback):
+        """Registra un callback que se llama cuando cambia el estado (ej: stream SSE)."""
+        self.listeners.append(callback)
+
+    def _notify_listeners(self):
+        for callback in list(self.listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error notificando cambio de estado: {e}")
+
+    def enqueue_check(self) -> dict:
+        """Encola una verificación en el worker de fondo y devuelve el trabajo."""
+        return self.jobs.submit('check', lambda progress: self.check_and_alert(progress))
+
+    def enqueue_capacity_probe(self, date: str) -> dict:
+        """Encola un sondeo de capacidad para una fecha (comparte worker con las verificaciones)."""
+        def run(progress):
+            progress(date, 'probing')
+            results = self.capacity.probe(date)
+            progress(date, f"{len(results)} productos")
+        return self.jobs.submit(f'capacity:{date}', run)
+
+    def get_job(self, job_id: str):
+        """Estado de un trabajo de la cola (None si no existe)."""
+        return self.jobs.get(job_id)
+
+    def is_running(self) -> bool:
+        """Indica si el scheduler está activo."""
+        return self.scheduler.running
+
+    def is_leader(self) -> bool:
+        """Indica si este proceso debe verificar y alertar (siempre, sin elección de líder)."""
+        return self.leader is None or self.leader.is_leader
+
+    def _on_elected(self):
+        """Al tomar el relevo, verificar de inmediato en lugar de esperar al intervalo."""
+        if self.scheduler.running:
+            self.enqueue_check()
+
+    def check_and_alert(self, progress=None):
+        """
+        Ejecuta verificación y envía alertas si hay disponibilidad.
+
+        Args:
+            progress: Callback opcional progress(fecha, estado) para informar del avance
+        """
+        progress = progress or (lambda date, state: None)
+
+        if not self.is_leader():
+            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⏸️ En espera: otro proceso es el líder")
+            return
+
         self.last_check_time = datetime.now()
 
         print(f"\n[{self.last_check_time.strftime('%H:%M:%S')}] Verificando disponibilidad...")
 
+        checked = {}
+        alerts = 0
+        tracked = []
         try:
-            # Cargar fechas desde el archivo JSON (actualizado desde el frontend)
-            target_dates = load_target_dates()
+            index = self._subscription_index()
+            queries = index.queries()
+            tracked = list(dict.fromkeys(date_of(key) for key in queries))
 
-            if not target_dates:
+            if not queries:
                 print("  ⚠️ No hay fechas configuradas")
                 print("  Agrega fechas desde el frontend: http://localhost:5001")
                 return
 
-            dates_to_check = [d.strip() for d in target_dates if d.strip()]
-            print(f"  Consultando {len(dates_to_check)} fechas: {', '.join(dates_to_check)}")
+            # Con sharding, solo las consultas asignadas a este worker
+            if self.shard:
+                all_queries = queries
+                queries = self.shard.owned_dates(all_queries)
+                print(f"  Shard {self.shard.worker_id}: {len(queries)}/{len(all_queries)} consultas")
+                if not queries:
+                    return
+
+            # Consultas del ciclo: límite por ciclo y presupuesto global, repartidos
+            # entre especificaciones según el número de suscriptores de cada una
+            by_spec = {}
+            for key in queries:
+                by_spec.setdefault(key.rsplit('|', 1)[0], []).append(key)
+            priorities = index.spec_priorities()
+
+            allowance = self.budget.cycle_allowance()
+            limits = [allowance] if allowance >= 0 else []
+            if MAX_DATES_PER_CHECK > 0:
+                limits.append(MAX_DATES_PER_CHECK)
+            total = min(limits) if limits else -1
+            if total == 0:
+                print("  ⏸️ Presupuesto de peticiones agotado, se omite este ciclo")
+                return
+            allocation = self.budget.allocate({spec: priorities[spec] for spec in by_spec}, total)
 
-            # Obtener disponibilidad para esas fechas
-            availability = {}
-            for date in dates_to_check:
-                if not date:
+            # Solo se consulta un subconjunto rotativo de fechas por ciclo
+            to_check = []
+            for spec, keys in by_spec.items():
+                if allocation[spec] == 0:
                     continue
-
-                products = self.client.get_available_products(
-                    visit_date=date,
-                    visitor_num=DEFAULT_VISITOR_NUM,
-                    tag=DEFAULT_VISIT_TAG,
-                    who_id=DEFAULT_WHO_ID,
-                    product_filter=PRODUCT_FILTER
-                )
-
-                if products:
-                    availability[date] = products
-
-            self.last_results = availability
-
-            if not availability:
+                scheduler = self._date_scheduler(spec)
+                limit = None if allocation[spec] < 0 else allocation[spec]
+                to_check.extend(scheduler.select(keys, limit))
+
+            label = date_of if len(by_spec) == 1 else (lambda key: key)
+            print(f"  Consultando {len(to_check)}/{len(queries)} fechas: {', '.join(label(k) for k in to_check)}")
+            if len(index.subscriptions) > 1:
+                print(f"  {len(index.subscriptions)} suscripciones, {len(queries)} consultas distintas")
+
+            for key in to_check:
+                progress(label(key), 'pending')
+
+            # Cada consulta distinta se ejecuta una sola vez por ciclo
+            for key in to_check:
+                tag, who_id, visitor_num, date = parse_query_key(key)
+                progress(label(key), 'checking')
+                data = self.client.search_availability(date, visitor_num, tag, who_id)
+                if data.get('error'):
+                    # Sin respuesta válida: la fecha sigue pendiente para el próximo ciclo
+                    progress(label(key), 'error')
+                    continue
+                products = filter_products(data.get('visits', []))
+                self._date_scheduler(key.rsplit('|', 1)[0]).mark_checked(key)
+                progress(label(key), 'available' if products else 'no_availability')
+                checked[key] = products
+
+            # Combinar con los resultados de consultas no ejecutadas en este ciclo
+            self.query_results = {
+                key: products for key, products in self.query_results.items()
+                if key in index.by_query
+            }
+            self.query_results.update(checked)
+            self.last_results = self._merge_by_date(index.fan_out(self.query_results))
+
+            # Repartir los resultados de este ciclo entre los suscriptores
+            per_subscription = index.fan_out({k: p for k, p in checked.items() if p})
+            if not per_subscription:
                 print("  No hay disponibilidad")
                 return
 
-            # Filtrar productos que no se han alertado aún
-            new_availability = {}
-            for date, products in availability.items():
-                new_products = []
-                for product in products:
-                    key = self._product_key(date, product.get('id', 0))
-                    if key not in self.alerted_products:
-                        new_products.append(product)
-                        self.alerted_products.add(key)
-
-                if new_products:
-                    new_availability[date] = new_products
+            any_new = False
+            for sub in index.subscriptions:
+                # Filtrar productos que no se han alertado aún a este suscriptor:
+                # solo se consultan (y marcan) las claves de este ciclo
+                availability = per_subscription.get(sub['id'], {})
+                keys = {
+                    self._product_key(date, product.get('id', 0), sub['id']): (date, product)
+                    for date, products in availability.items()
+                    for product in products
+                }
+                claimed = set(self.storage.claim_alerted(list(keys)))
+                new_availability = {}
+                for key, (date, product) in keys.items():
+                    if key in claimed:
+                        new_availability.setdefault(date, []).append(product)
+
+                if not new_availability:
+                    continue
+                any_new = True
 
-            if new_availability:
                 # Mostrar en consola
-                print("  🎫 ¡NUEVA DISPONIBILIDAD!")
+                print(f"  🎫 ¡NUEVA DISPONIBILIDAD! ({sub['subscriber']})")
                 for date, products in new_availability.items():
                     print(f"    📅 {date}:")
                     for product in products:
                         print(f"      ✅ {product.get('name', 'N/A')[:50]} - {product.get('availability', 'N/A')}")
 
-                # Enviar alerta por Telegram
-                if self.notifier.is_configured():
-                    success = self.notifier.send_availability_alert(new_availability)
+                # Enviar alerta por Telegram; si no sale, se desmarcan las claves
+                # para que la próxima verificación (o el nuevo líder) la reintente
+                notifier = self._notifier_for(sub.get('chat_id'))
+                success = False
+                if not self.is_leader():
+                    print("  ⏸️ Liderazgo perdido durante la verificación, alerta omitida")
+                elif notifier.is_configured():
+                    success = notifier.send_availability_alert(new_availability)
                     if success:
-                        self.alerts_sent += 1
-                        print("  📱 Alerta enviada por Telegram")
+                        alerts += 1
+                        print("  📱 Alerta encolada para Telegram")
                     else:
                         print("  ⚠️ Error enviando alerta")
                 else:
                     print("  ⚠️ Telegram no configurado")
-            else:
+                if not success:
+                    self.storage.release_alerted(claimed)
+
+            if not any_new:
                 print("  (disponibilidad ya alertada anteriormente)")
 
         except Exception as e:
@@ -144,15 +310,53 @@ class VaticanMonitor:
             traceback.print_exc()
             if self.notifier.is_configured():
                 self.notifier.send_error_alert(str(e))
+        finally:
+            # Ciclos sin consultas (sin fechas, sin shard o sin presupuesto) no cuentan
+            if checked:
+                self._record_check(checked, alerts, tracked)
+
+    def _record_check(self, checked: dict, alerts: int, tracked: list):
+        """Persiste contadores, últimos resultados e historial de la verificación."""
+        status = None
+        try:
+            # Snapshot normalizado: solo se escriben los productos que cambiaron
+            dates = list(dict.fromkeys(date_of(key) for key in checked))
+            changes = self.storage.record_availability(
+                dates,
+                {date: self.last_results[date] for date in dates if date in self.last_results},
+                observed_at=self.last_check_time.isoformat(),
+                tracked_dates=tracked
+            )
+            # El backend recalcula last_results desde el snapshot; solo sin
+            # snapshot (json o error) se escriben los resultados completos
+            status = self.storage.update_status_with_results(
+                last_check=self.last_check_time.isoformat(),
+                last_results=self.last_results if changes < 0 else None,
+                increment_check=True,
+                increment_alert=alerts
+            )
+            self.check_count = status.get('check_count', self.check_count + 1)
+            self.alerts_sent = status.get('alerts_sent', self.alerts_sent + alerts)
+            self.storage.append_history({
+                'checked_at': self.last_check_time.isoformat(),
+                'queries': len(checked),
+                'available': {key: len(products) for key, products in checked.items() if products},
+                'alerts': alerts
+            })
+        except Exception as e:
+            if status is None:
+                self.check_count += 1
+                self.alerts_sent += alerts
+            print(f"  ⚠️ Error guardando el estado: {e}")
 
     def clear_alerted_slots(self):
         """Limpia los productos alertados (para re-alertar)."""
-        self.alerted_products.clear()
+        self.storage.clear_alerted()
         print("Historial de alertas limpiado")
 
     def send_periodic_summary(self):
         """Envía resumen periódico por Telegram cada 3 horas."""
-        if self.notifier.is_configured():
+        if self.is_leader() and self.notifier.is_configured():
             status = self.get_status()
             success = self.notifier.send_periodic_summary(status)
             if success:
@@ -173,32 +377,50 @@ class VaticanMonitor:
         if PRODUCT_FILTER:
             print(f"🔍 Filtro de producto: {PRODUCT_FILTER}")
 
-        target_dates = load_target_dates()
+        target_dates = self.storage.get_dates()
         if target_dates:
             print(f"📅 Fechas a monitorear: {', '.join(target_dates)}")
         else:
             print("⚠️  No hay fechas configuradas aún")
             print("   Agrega fechas desde: http://localhost:5001")
 
+        if self.shard:
+            self.shard.start()
+            print(f"🔀 Sharding: worker {self.shard.worker_id} de {len(self.shard.ring.nodes)}")
+
+        if self.leader:
+            self.leader.start()
+            role = 'líder' if self.leader.is_leader else 'en espera'
+            print(f"👑 Elección de líder: {self.leader.holder} ({role})")
+
+        # Envío en segundo plano (también entrega lo pendiente de ejecuciones anteriores)
+        self.notifications.start()
+
         if self.notifier.is_configured():
-            print("📱 Notificaciones Telegram: ✅ Activas")
-            self.notifier.send_status_update(
-                f"Monitor iniciado. Verificando cada {interval}s"
-            )
+            channels = ', '.join(c.name for c in self.notifier.channels)
+            print(f"📱 Notificaciones ({channels}): ✅ Activas")
+            if self.is_leader():
+                self.notifier.send_status_update(
+                    f"Monitor iniciado. Verificando cada {interval}s"
+                )
         else:
-            print("📱 Notificaciones Telegram: ❌ No configurado")
+            print("📱 Notificaciones: ❌ No configurado")
 
         print("-" * 50)
 
-        # Ejecutar primera verificación inmediatamente
-        self.check_and_alert()
+        # Ejecutar primera verificación inmediatamente (en el worker de fondo)
+        self.enqueue_check()
 
-        # Programar verificaciones periódicas
+        # Programar verificaciones periódicas; se encolan en el mismo worker
+        # que las manuales para que nunca se ejecuten dos a la vez
         self.scheduler.add_job(
-            self.check_and_alert,
+            self.enqueue_check,
             'interval',
             seconds=interval,
-            id='vatican_check'
+            id='vatican_check',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
         )
 
         # Programar resumen periódico cada 3 horas
@@ -206,31 +428,51 @@ class VaticanMonitor:
             self.send_periodic_summary,
             'interval',
             hours=3,
-            id='periodic_summary'
+            id='periodic_summary',
+            replace_existing=True
         )
         print("📊 Resumen automático: cada 3 horas")
 
         self.scheduler.start()
+        self._notify_listeners()
 
     def stop(self):
         """Detiene el monitor."""
         self.scheduler.shutdown()
+        if self.leader:
+            self.leader.stop()
+        if self.shard:
+            self.shard.stop()
         print("Monitor detenido")
+        self._notify_listeners()
 
     def get_status(self) -> dict:
         """Obtiene el estado actual para la interfaz web."""
+        target_dates = self.storage.get_dates()
+        index = self._subscription_index()
         return {
             'running': self.scheduler.running,
+            'check_in_progress': self.jobs.is_busy(),
+            'leader': self.leader.get_status() if self.leader else None,
+            'shard': self.shard.get_status() if self.shard else None,
             'last_check': self.last_check_time.isoformat() if self.last_check_time else None,
             'check_count': self.check_count,
             'alerts_sent': self.alerts_sent,
+            'notifications': {**self.notifications.get_status(), **self.notifier.get_status()},
             'last_results': self.last_results,
-            'alerted_products_count': len(self.alerted_products),
-            'target_dates': load_target_dates(),
+            'alerted_products_count': self.storage.count_alerted(),
+            'target_dates': target_dates,
             'visit_tag': DEFAULT_VISIT_TAG,
             'visitor_num': DEFAULT_VISITOR_NUM,
             'product_filter': PRODUCT_FILTER,
-            'interval_seconds': CHECK_INTERVAL_SECONDS
+            'interval_seconds': CHECK_INTERVAL_SECONDS,
+            'subscriptions': len(index.subscriptions),
+            'distinct_queries': len(index.by_query),
+            'scheduling': {
+                spec: self._date_scheduler(spec).get_status(keys)
+                for spec, keys in index.queries_by_spec().items()
+            },
+            'budget': self.budget.get_status()
         }
 
 
@@ -0,0 +1,260 @@
+"""
+Notificaciones multi-canal (Telegram, webhook, Slack, email)
+
+Cada alerta se envía a todos los canales configurados en paralelo. Cada canal
+tiene su propio timeout y sus errores no afectan a los demás: un webhook
+lento o un servidor SMTP caído no retrasan el aviso por Telegram ni el ciclo
+del monitor.
+
+Los canales reciben el mensaje en el HTML de Telegram; los que no lo
+entienden lo convierten a texto plano.
+"""
+import html
+import re
+import smtplib
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from email.message import EmailMessage
+from typing import Dict, List
+import requests
+from telegram_notifier import (
+    TelegramNotifier,
+    render_availability_alert,
+    render_periodic_summary
+)
+from config import (
+    WEBHOOK_URL,
+    SLACK_WEBHOOK_URL,
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_USER,
+    SMTP_PASSWORD,
+    SMTP_FROM,
+    SMTP_TO,
+    SMTP_STARTTLS,
+    NOTIFY_CHANNEL_TIMEOUT
+)
+
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# Hilos por canal: uno para el envío en curso y margen para uno colgado
+CHANNEL_WORKERS = 2
+
+
+def html_to_text(message: str) -> str:
+    """Convierte el HTML de Telegram a texto plano."""
+    return html.unescape(_TAG_RE.sub('', message))
+
+
+class Channel(ABC):
+    """Canal de notificación; las subclases implementan send()."""
+
+    name = 'channel'
+
+    def __init__(self, timeout: float = NOTIFY_CHANNEL_TIMEOUT):
+        self.timeout = timeout
+
+    def is_configured(self) -> bool:
+        return True
+
+    @abstractmethod
+    def send(self, message: str, availability_data: dict = None) -> bool:
+        """
+        Envía un mensaje.
+
+        Args:
+            message: Texto en HTML de Telegram
+            availability_data: Datos de disponibilidad si es una alerta
+        """
+
+
+class TelegramChannel(Channel):
+    """Telegram (usa la cola de notificaciones si el notificador la tiene)."""
+
+    name = 'telegram'
+
+    def __init__(self, notifier: TelegramNotifier, timeout: float = NOTIFY_CHANNEL_TIMEOUT):
+        super().__init__(timeout)
+        self.notifier = notifier
+
+    def is_configured(self) -> bool:
+        return self.notifier.is_configured()
+
+    def send(self, message: str, availability_data: dict = None) -> bool:
+        if availability_data:
+            # Partido en mensajes por debajo del límite de Telegram
+            return self.notifier.send_availability_alert(availability_data)
+        return self.notifier.send_message(message)
+
+
+class WebhookChannel(Channel):
+    """POST JSON genérico: {'event', 'text', 'html', 'data'}."""
+
+    name = 'webhook'
+
+    def __init__(self, url: str = WEBHOOK_URL, timeout: float = NOTIFY_CHANNEL_TIMEOUT):
+        super().__init__(timeout)
+        self.url = url
+
+    def is_configured(self) -> bool:
+        return bool(self.url)
+
+    def send(self, message: str, availability_data: dict = None) -> bool:
+        payload = {
+            'event': 'availability' if availability_data else 'message',
+            'text': html_to_text(message),
+            'html': message,
+            'data': availability_data
+        }
+        response = requests.post(self.url, json=payload, timeout=self.timeout)
+        return response.ok
+
+
+class SlackChannel(Channel):
+    """Webhook compatible con Slack (Slack, Mattermost, Discord /slack)."""
+
+    name = 'slack'
+
+    def __init__(self, url: str = SLACK_WEBHOOK_URL, timeout: float = NOTIFY_CHANNEL_TIMEOUT):
+        super().__init__(timeout)
+        self.url = url
+
+    def is_configured(self) -> bool:
+        return bool(self.url)
+
+    def send(self, message: str, availability_data: dict = None) -> bool:
+        # <b>..</b> -> *..* (negrita en mrkdwn), enlaces -> <url|texto>
+        text = re.sub(r'<b>(.*?)</b>', r'*\1*', message)
+        text = re.sub(r"<a href='([^']+)'>(.*?)</a>", r'<\1|\2>', text)
+        text = html.unescape(re.sub(r'<(?![^>]*\|)[^>]+>', '', text))
+        response = requests.post(self.url, json={'text': text}, timeout=self.timeout)
+        return response.ok
+
+
+class SMTPChannel(Channel):
+    """Email por SMTP (texto plano + alternativa HTML)."""
+
+    name = 'email'
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, user: str = SMTP_USER,
+                 password: str = SMTP_PASSWORD, sender: str = SMTP_FROM, recipients: List[str] = None,
+                 starttls: bool = SMTP_STARTTLS, timeout: float = NOTIFY_CHANNEL_TIMEOUT):
+        super().__init__(timeout)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender or user
+        self.recipients = recipients if recipients is not None else SMTP_TO
+        self.starttls = starttls
+
+    def is_configured(self) -> bool:
+        return bool(self.host and self.sender and self.recipients)
+
+    def send(self, message: str, availability_data: dict = None) -> bool:
+        text = html_to_text(message)
+        email = EmailMessage()
+        email['Subject'] = text.strip().split('\n', 1)[0][:120]
+        email['From'] = self.sender
+        email['To'] = ', '.join(self.recipients)
+        email.set_content(text)
+        email.add_alternative(message.replace('\n', '<br>\n'), subtype='html')
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password)
+            smtp.send_message(email)
+        return True
+
+
+class MultiChannelNotifier:
+    """
+    Envía cada notificación a todos los canales configurados a la vez.
+
+    Expone la misma interfaz que TelegramNotifier, así que el monitor la usa
+    sin cambios.
+    """
+
+    def __init__(self, channels: List[Channel], telegram: TelegramNotifier = None):
+        self.channels = [c for c in channels if c.is_configured()]
+        self.telegram = telegram
+        self.chat_id = telegram.chat_id if telegram else None
+        self.last_results: Dict[str, bool] = {}
+        # Un pool por canal (con margen para un envío colgado): un canal que
+        # agota su timeout nunca retiene los hilos de los demás
+        self._executors = {
+            c.name: ThreadPoolExecutor(max_workers=CHANNEL_WORKERS, thread_name_prefix=f'notify-{c.name}')
+            for c in self.channels
+        }
+        self._lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        return bool(self.channels)
+
+    def dispatch(self, message: str, availability_data: dict = None) -> Dict[str, bool]:
+        """
+        Envía a todos los canales en paralelo.
+
+        Cada canal se espera como mucho su propio timeout desde el envío; un
+        canal que no responde a tiempo cuenta como fallido sin bloquear a los demás.
+
+        Returns:
+            {canal: enviado}
+        """
+        started = time.monotonic()
+        futures = {
+            c.name: (c, self._executors[c.name].submit(c.send, message, availability_data))
+            for c in self.channels
+        }
+
+        results = {}
+        for name, (channel, future) in futures.items():
+            remaining = max(0.0, started + channel.timeout - time.monotonic())
+            try:
+                results[name] = bool(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                print(f"⚠️ Canal {name} falló: timeout")
+                results[name] = False
+            except Exception as e:
+                print(f"⚠️ Canal {name} falló: {e}")
+                results[name] = False
+
+        with self._lock:
+            self.last_results = results
+        return results
+
+    def send_message(self, message: str, parse_mode: str = 'HTML') -> bool:
+        """True si al menos un canal entregó el mensaje."""
+        return any(self.dispatch(message).values())
+
+    def send_availability_alert(self, availability_data: dict) -> bool:
+        if not availability_data:
+            return False
+        return any(self.dispatch(render_availability_alert(availability_data), availability_data).values())
+
+    def send_status_update(self, message: str) -> bool:
+        return self.send_message(f"ℹ️ {message}")
+
+    def send_error_alert(self, error: str) -> bool:
+        return self.send_message(f"❌ <b>Error:</b> {html.escape(error)}")
+
+    def send_periodic_summary(self, status: dict) -> bool:
+        return self.send_message(render_periodic_summary(status))
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                'channels': [c.name for c in self.channels],
+                'last_results': dict(self.last_results)
+            }
+
+
+def create_notifier(telegram: TelegramNotifier = None) -> MultiChannelNotifier:
+    """Notificador con Telegram más los canales configurados en el entorno."""
+    telegram = telegram or TelegramNotifier()
+    channels = [TelegramChannel(telegram), WebhookChannel(), SlackChannel(), SMTPChannel()]
+    return MultiChannelNotifier(channels, telegram=telegram)
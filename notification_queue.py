@@ -0,0 +1,285 @@
+"""
+Cola persistente de notificaciones de Telegram
+
+Las alertas se guardan en SQLite (sobreviven a reinicios) y un hilo en
+segundo plano las envía respetando los límites de Telegram:
+  - por chat: un mensaje cada NOTIFY_PER_CHAT_INTERVAL segundos
+  - global: como máximo NOTIFY_GLOBAL_PER_SECOND mensajes por segundo
+Si Telegram responde RetryAfter se espera lo indicado; otros errores de red
+se reintentan con backoff exponencial. Varias alertas pendientes para el
+mismo chat se agrupan en un único mensaje resumen.
+
+Varios procesos pueden compartir el archivo (réplicas con elección de líder
+o sharding): antes de enviar, cada grupo se reclama en una transacción
+(BEGIN IMMEDIATE) aplazando su próximo intento CLAIM_SECONDS, así que ningún
+mensaje lo envían dos procesos. Si el proceso muere a mitad, el mensaje
+vuelve a estar disponible cuando vence la reclamación.
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram_notifier import MAX_MESSAGE_LENGTH, _get_runner
+from config import (
+    TELEGRAM_BOT_TOKEN,
+    NOTIFY_QUEUE_FILE,
+    NOTIFY_PER_CHAT_INTERVAL,
+    NOTIFY_GLOBAL_PER_SECOND,
+    NOTIFY_MAX_ATTEMPTS
+)
+
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+# Cabecera del resumen ("🔔 <b>N alertas pendientes</b>") + separador
+DIGEST_HEADER_RESERVE = 40 + len(DIGEST_SEPARATOR)
+# Segundos que un envío reclamado queda reservado (más que el timeout de envío)
+SEND_TIMEOUT = 60
+CLAIM_SECONDS = SEND_TIMEOUT + 30
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    """retry_after puede ser int o timedelta según la versión de python-telegram-bot."""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class NotificationQueue:
+    """Cola de salida con envío en segundo plano, límites y reintentos."""
+
+    def __init__(self, path: str = NOTIFY_QUEUE_FILE, bot_token: str = None,
+                 per_chat_interval: float = NOTIFY_PER_CHAT_INTERVAL,
+                 global_per_second: int = NOTIFY_GLOBAL_PER_SECOND,
+                 max_attempts: int = NOTIFY_MAX_ATTEMPTS):
+        self.path = path
+        self.bot_token = bot_token or TELEGRAM_BOT_TOKEN
+        self.per_chat_interval = per_chat_interval
+        self.global_per_second = global_per_second
+        self.max_attempts = max_attempts
+        self.sent_count = 0
+        self.failed_count = 0
+        self._last_sent: Dict[str, float] = {}
+        self._recent = deque()
+        self._wakeup = threading.Event()
+        self._send_lock = threading.Lock()
+        self._thread = None
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS notifications (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    parse_mode TEXT NOT NULL DEFAULT 'HTML',
+                    kind TEXT NOT NULL DEFAULT 'message',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def enqueue(self, chat_id: str, text: str, parse_mode: str = 'HTML', kind: str = 'message') -> int:
+        """
+        Encola un mensaje y despierta al hilo de envío.
+
+        Args:
+            kind: 'alert' se agrupa con otras alertas pendientes del mismo chat
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO notifications (chat_id, text, parse_mode, kind, next_attempt_at, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (str(chat_id), text, parse_mode, kind, now, now)
+            )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM notifications').fetchone()[0]
+
+    def _due_groups(self) -> List[List[tuple]]:
+        """Mensajes vencidos agrupados: alertas del mismo chat juntas, el resto sueltos."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, chat_id, text, parse_mode, kind, attempts FROM notifications '
+                'WHERE next_attempt_at <= ? ORDER BY id',
+                (time.time(),)
+            ).fetchall()
+
+        groups, alert_groups = [], {}
+        for row in rows:
+            chat_id, parse_mode, kind = row[1], row[3], row[4]
+            if kind != 'alert':
+                groups.append([row])
+                continue
+            key = (chat_id, parse_mode)
+            group = alert_groups.get(key)
+            length = DIGEST_HEADER_RESERVE + sum(len(r[2]) + len(DIGEST_SEPARATOR) for r in group) if group else 0
+            if group is None or length + len(row[2]) > MAX_MESSAGE_LENGTH:
+                group = alert_groups[key] = []
+                groups.append(group)
+            group.append(row)
+        return groups
+
+    def _claim(self, ids: List[int]) -> set:
+        """Reserva atómicamente los mensajes aún vencidos; devuelve los ids obtenidos."""
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            placeholders = ','.join('?' * len(ids))
+            claimed = {row[0] for row in conn.execute(
+                f'SELECT id FROM notifications WHERE id IN ({placeholders}) AND next_attempt_at <= ?',
+                (*ids, now)
+            )}
+            conn.executemany(
+                'UPDATE notifications SET next_attempt_at = ? WHERE id = ?',
+                [(now + CLAIM_SECONDS, i) for i in claimed]
+            )
+            conn.execute('COMMIT')
+            return claimed
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _wait_for_slot(self, chat_id: str):
+        """Bloquea hasta poder enviar respetando los límites por chat y global."""
+        while True:
+            now = time.time()
+            while self._recent and now - self._recent[0] >= 1:
+                self._recent.popleft()
+
+            wait = 0.0
+            if len(self._recent) >= self.global_per_second:
+                wait = 1 - (now - self._recent[0])
+            last = self._last_sent.get(chat_id)
+            if last is not None:
+                wait = max(wait, self.per_chat_interval - (now - last))
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _send_group(self, group: List[tuple]):
+        """Envía un grupo (mensaje simple o resumen de alertas) y actualiza la cola."""
+        chat_id, parse_mode = group[0][1], group[0][3]
+        self._wait_for_slot(chat_id)
+
+        # Solo lo que este proceso consigue reclamar (otro puede estar enviándolo)
+        claimed = self._claim([row[0] for row in group])
+        group = [row for row in group if row[0] in claimed]
+        if not group:
+            return
+        ids = [row[0] for row in group]
+        attempts = max(row[5] for row in group) + 1
+
+        if len(group) == 1:
+            text = group[0][2]
+        else:
+            header = f"🔔 <b>{len(group)} alertas pendientes</b>" if parse_mode == 'HTML' \
+                else f"🔔 {len(group)} alertas pendientes"
+            text = header + DIGEST_SEPARATOR + DIGEST_SEPARATOR.join(row[2] for row in group)
+
+        retry_in = None
+        try:
+            _get_runner(self.bot_token).submit(chat_id, text, parse_mode, raise_errors=True).result(
+                timeout=SEND_TIMEOUT
+            )
+            self.sent_count += 1
+            self._delete(ids)
+        except RetryAfter as e:
+            # Espera impuesta por Telegram: no cuenta como intento fallido
+            retry_in = _retry_seconds(e)
+            attempts -= 1
+            print(f"Telegram pide esperar {retry_in:.0f}s (chat {chat_id})")
+        except (BadRequest, Forbidden) as e:
+            print(f"Notificación descartada para chat {chat_id}: {e}")
+            self.failed_count += 1
+            self._delete(ids)
+        except Exception as e:
+            if attempts >= self.max_attempts:
+                print(f"Notificación descartada tras {attempts} intentos: {e}")
+                self.failed_count += 1
+                self._delete(ids)
+            else:
+                retry_in = min(300, 5 * 2 ** (attempts - 1))
+                print(f"Error enviando notificación ({e}), reintento en {retry_in}s")
+        finally:
+            now = time.time()
+            self._last_sent[chat_id] = now
+            self._recent.append(now)
+
+        if retry_in is not None:
+            with self._connect() as conn:
+                conn.executemany(
+                    'UPDATE notifications SET attempts = ?, next_attempt_at = ? WHERE id = ?',
+                    [(attempts, now + retry_in, i) for i in ids]
+                )
+
+    def _delete(self, ids: List[int]):
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM notifications WHERE id = ?', [(i,) for i in ids])
+
+    def process_due(self) -> int:
+        """Envía todo lo vencido; devuelve el número de grupos procesados."""
+        with self._send_lock:
+            groups = self._due_groups()
+            for group in groups:
+                self._send_group(group)
+            return len(groups)
+
+    def _next_due_in(self) -> float:
+        with self._connect() as conn:
+            row = conn.execute('SELECT MIN(next_attempt_at) FROM notifications').fetchone()
+        if row[0] is None:
+            return 60.0
+        return max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while True:
+            try:
+                self.process_due()
+                timeout = self._next_due_in()
+            except Exception as e:
+                print(f"Error en la cola de notificaciones: {e}")
+                timeout = 5.0
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def start(self):
+        """Arranca el hilo de envío (también entrega lo pendiente de ejecuciones anteriores)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='notification-queue', daemon=True)
+            self._thread.start()
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """
+        Envía lo pendiente en el hilo actual (uso serverless, sin hilo de fondo).
+
+        Returns:
+            True si la cola quedó vacía antes del timeout
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.process_due()
+            if self.pending_count() == 0:
+                return True
+            time.sleep(min(1.0, max(0.0, min(self._next_due_in(), deadline - time.time()))))
+        return self.pending_count() == 0
+
+    def get_status(self) -> dict:
+        return {
+            'pending': self.pending_count(),
+            'sent': self.sent_count,
+            'failed': self.failed_count
+        }
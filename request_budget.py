@@ -0,0 +1,230 @@
+"""
+Presupuesto global de peticiones a la API del Vaticano
+
+Cuenta las peticiones por ventana (hora y día) y las persiste para que
+reinicios del proceso e invocaciones serverless compartan el mismo contador.
+El monitor consulta `cycle_allowance()` antes de cada ciclo para saber cuántas
+consultas puede emitir sin superar los límites.
+"""
+import os
+import json
+import math
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from config import MAX_REQUESTS_PER_HOUR, MAX_REQUESTS_PER_DAY, BUDGET_FILE, CHECK_INTERVAL_SECONDS
+
+
+def _hour_key(now: datetime) -> str:
+    return f"h:{now.strftime('%Y%m%d%H')}"
+
+
+def _day_key(now: datetime) -> str:
+    return f"d:{now.strftime('%Y%m%d')}"
+
+
+class FileBudgetStore:
+    """
+    Persiste los contadores en un archivo JSON (escritura atómica).
+
+    Las sumas se hacen bajo un lock de archivo (`<archivo>.lock`), así que la
+    app web y el worker no pierden incrementos aunque escriban a la vez.
+    """
+
+    def __init__(self, path: str = BUDGET_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        """Lock exclusivo entre procesos (y entre hilos del mismo proceso)."""
+        with self._lock, open(f"{self.path}.lock", 'a+') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _read(self) -> Dict[str, int]:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f).get('counts', {})
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def load(self, keys: List[str]) -> Dict[str, int]:
+        """Devuelve los contadores de las ventanas indicadas."""
+        # Sin lock: el archivo se reemplaza atómicamente, nunca se lee a medias
+        counts = self._read()
+        return {key: counts.get(key, 0) for key in keys}
+
+    def add(self, keys: List[str], amount: int) -> Dict[str, int]:
+        """Suma `amount` a cada ventana y descarta ventanas antiguas."""
+        with self._file_lock():
+            counts = self._read()
+            counts = {k: v for k, v in counts.items() if k in keys}
+            for key in keys:
+                counts[key] = counts.get(key, 0) + amount
+
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'counts': counts}, f)
+            os.replace(tmp_path, self.path)
+            return counts
+
+
+class SupabaseBudgetStore:
+    """Persiste los contadores en Supabase (compartidos entre invocaciones de Vercel)."""
+
+    def load(self, keys: List[str]) -> Dict[str, int]:
+        from api.db import get_request_budget
+        return get_request_budget(keys)
+
+    def add(self, keys: List[str], amount: int) -> Dict[str, int]:
+        from api.db import increment_request_budget
+        return increment_request_budget(keys, amount)
+
+
+class RequestBudget:
+    """Gestor del presupuesto de peticiones por hora y por día."""
+
+    def __init__(self, store=None, per_hour: int = MAX_REQUESTS_PER_HOUR,
+                 per_day: int = MAX_REQUESTS_PER_DAY,
+                 interval_seconds: int = CHECK_INTERVAL_SECONDS):
+        self.store = store or FileBudgetStore()
+        self.per_hour = per_hour
+        self.per_day = per_day
+        self.interval_seconds = interval_seconds
+        self._credit: Dict[str, float] = {}  # fracción pendiente de cada especificación
+        self._allocation_lock = threading.Lock()
+
+    def _keys(self, now: datetime = None) -> List[str]:
+        now = now or datetime.now()
+        return [_hour_key(now), _day_key(now)]
+
+    def record(self, amount: int = 1):
+        """Registra peticiones emitidas."""
+        try:
+            self.store.add(self._keys(), amount)
+        except Exception as e:
+            print(f"Error registrando presupuesto de peticiones: {e}")
+
+    def usage(self) -> Dict[str, int]:
+        """Peticiones usadas en la hora y el día actuales."""
+        hour_key, day_key = self._keys()
+        try:
+            counts = self.store.load([hour_key, day_key])
+        except Exception as e:
+            print(f"Error leyendo presupuesto de peticiones: {e}")
+            counts = {}
+        return {'hour': counts.get(hour_key, 0), 'day': counts.get(day_key, 0)}
+
+    def cycle_allowance(self, usage: Dict[str, int] = None) -> int:
+        """
+        Consultas permitidas en este ciclo.
+
+        El restante diario se reparte entre los ciclos que quedan hasta
+        medianoche, y nunca se supera el restante de la hora actual.
+        Devuelve -1 si no hay límites configurados.
+        """
+        usage = usage or self.usage()
+        limits = []
+
+        if self.per_hour > 0:
+            limits.append(max(0, self.per_hour - usage['hour']))
+
+        if self.per_day > 0:
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            cycles_left = max(1, math.ceil((midnight - now).total_seconds() / self.interval_seconds))
+            day_left = max(0, self.per_day - usage['day'])
+            limits.append(math.ceil(day_left / cycles_left))
+
+        return min(limits) if limits else -1
+
+    def allocate(self, priorities: Dict[str, float], total: int = None) -> Dict[str, int]:
+        """
+        Reparte el presupuesto del ciclo entre especificaciones de búsqueda.
+
+        La parte fraccionaria que no cabe en un ciclo se acumula como crédito
+        para los siguientes: aunque haya menos consultas que especificaciones,
+        todas reciben turno y, a la larga, cada una recibe su proporción.
+
+        Args:
+            priorities: {clave: prioridad} (mayor prioridad = más consultas)
+            total: Consultas a repartir (por defecto, cycle_allowance())
+
+        Returns:
+            {clave: consultas permitidas} (-1 = sin límite)
+        """
+        total = self.cycle_allowance() if total is None else total
+        if total < 0:
+            return {key: -1 for key in priorities}
+
+        with self._allocation_lock:
+            # Crédito de las especificaciones vigentes, centrado para que sume 0
+            credit = {key: self._credit.get(key, 0.0) for key in priorities}
+            drift = sum(credit.values()) / len(credit) if credit else 0.0
+            self._credit = {key: c - drift for key, c in credit.items()}
+            if total == 0:
+                return {key: 0 for key in priorities}
+
+            weight_sum = sum(priorities.values()) or 1
+            shares = {
+                key: total * p / weight_sum + self._credit.get(key, 0.0)
+                for key, p in priorities.items()
+            }
+            allocation = {key: max(0, math.floor(share)) for key, share in shares.items()}
+
+            # Repartir el resto por mayor fracción (incluido el crédito acumulado),
+            # desempatando por prioridad
+            leftover = total - sum(allocation.values())
+            by_remainder = sorted(
+                priorities,
+                key=lambda k: (shares[k] - allocation[k], priorities[k]),
+                reverse=True
+            )
+            for key in by_remainder[:max(0, leftover)]:
+                allocation[key] += 1
+            # Crédito negativo redondeado a 0: quitar el exceso a las de menor fracción
+            for key in reversed(by_remainder):
+                if leftover >= 0:
+                    break
+                if allocation[key] > 0:
+                    allocation[key] -= 1
+                    leftover += 1
+
+            self._credit = {key: shares[key] - allocation[key] for key in priorities}
+            return allocation
+
+    def get_status(self) -> dict:
+        """Consumo del presupuesto para la interfaz web."""
+        usage = self.usage()
+        return {
+            'hour_used': usage['hour'],
+            'hour_limit': self.per_hour,
+            'day_used': usage['day'],
+            'day_limit': self.per_day,
+            'cycle_allowance': self.cycle_allowance(usage)
+        }
+
+
+# Instancia global compartida por todos los clientes del proceso
+request_budget = RequestBudget()
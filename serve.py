@@ -0,0 +1,27 @@
+"""
+Servidor de producción para app.py (waitress, multihilo)
+
+Un único proceso atiende las peticiones con WEB_THREADS hilos, así el
+monitor (singleton de monitor.py) se arranca una sola vez y las rutas
+lentas (exportar Excel) o los streams SSE no bloquean al resto.
+
+Uso:
+    python serve.py
+    gunicorn -c gunicorn.conf.py app:app     # alternativa en Linux
+
+Para varios procesos web usa MONITOR_MODE=worker y `python worker.py`:
+el monitor queda en su propio proceso y cada proceso web solo lee su estado.
+"""
+from waitress import serve
+from app import app, start_background
+from config import WEB_HOST, WEB_PORT, WEB_THREADS
+
+
+def main():
+    start_background()
+    print(f"🌐 Servidor de producción en http://{WEB_HOST}:{WEB_PORT} ({WEB_THREADS} hilos)")
+    serve(app, host=WEB_HOST, port=WEB_PORT, threads=WEB_THREADS, ident='vatican-monitor')
+
+
+if __name__ == '__main__':
+    main()
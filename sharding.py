@@ -0,0 +1,224 @@
+"""
+Reparto de fechas entre varios workers del monitor (sharding)
+
+Cada worker se registra con un latido en un almacén compartido. Las fechas
+se asignan con hashing consistente sobre los workers vivos, de modo que al
+entrar o salir un worker solo se mueve la fracción de fechas que le
+corresponde. Antes de consultar una fecha, su dueño adquiere un lease sobre
+ella, y al perder una fecha en un rebalanceo la libera: durante el relevo
+nunca la consultan dos workers a la vez. Los leases de fechas tienen el mismo
+TTL que la membresía y se renuevan con cada latido, así que las fechas de un
+worker caído quedan libres en cuanto el resto deja de verlo.
+
+Cada worker usa además su propio subconjunto de proxies de Webshare.
+"""
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from leader import SQLiteLeaseStore, SupabaseLeaseStore
+from config import (
+    SHARDING,
+    SHARD_WORKER_ID,
+    SHARD_VNODES,
+    LEASE_DB_FILE,
+    LEASE_TTL_SECONDS,
+    LEASE_HEARTBEAT_SECONDS
+)
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """Anillo de hashing consistente con nodos virtuales."""
+
+    def __init__(self, nodes: List[str], vnodes: int = SHARD_VNODES):
+        self.nodes = sorted(set(nodes))
+        self._ring = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes)
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Nodo dueño de una clave (None si el anillo está vacío)."""
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class SQLiteMembershipStore:
+    """Registro de workers vivos en SQLite."""
+
+    def __init__(self, path: str = LEASE_DB_FILE):
+        self.path = path
+        with sqlite3.connect(self.path, timeout=5) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS shard_workers (
+                    worker_id TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+
+    def heartbeat(self, worker_id: str, ttl_seconds: float) -> List[str]:
+        """Renueva el registro del worker y devuelve los workers vivos."""
+        now = time.time()
+        with sqlite3.connect(self.path, timeout=5) as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO shard_workers (worker_id, expires_at) VALUES (?, ?)',
+                (worker_id, now + ttl_seconds)
+            )
+            conn.execute('DELETE FROM shard_workers WHERE expires_at < ?', (now,))
+            rows = conn.execute('SELECT worker_id FROM shard_workers').fetchall()
+        return [row[0] for row in rows]
+
+    def leave(self, worker_id: str):
+        with sqlite3.connect(self.path, timeout=5) as conn:
+            conn.execute('DELETE FROM shard_workers WHERE worker_id = ?', (worker_id,))
+
+
+class SupabaseMembershipStore:
+    """Registro de workers vivos en Supabase (tabla shard_workers)."""
+
+    def heartbeat(self, worker_id: str, ttl_seconds: float) -> List[str]:
+        from api.db import shard_heartbeat
+        return shard_heartbeat(worker_id, ttl_seconds)
+
+    def leave(self, worker_id: str):
+        from api.db import shard_leave
+        shard_leave(worker_id)
+
+
+class ShardCoordinator:
+    """Membresía, asignación de fechas y leases de un worker."""
+
+    def __init__(self, membership, leases, worker_id: str = None,
+                 ttl_seconds: float = LEASE_TTL_SECONDS,
+                 heartbeat_seconds: float = LEASE_HEARTBEAT_SECONDS,
+                 date_lease_seconds: float = None,
+                 proxy_manager=None):
+        self.membership = membership
+        self.leases = leases
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl_seconds = ttl_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.date_lease_seconds = date_lease_seconds or ttl_seconds
+        self.proxy_manager = proxy_manager
+        self.ring = HashRing([self.worker_id])
+        self.owned: List[str] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def heartbeat(self):
+        """Renueva la membresía y rebalancea si cambió el conjunto de workers."""
+        try:
+            workers = self.membership.heartbeat(self.worker_id, self.ttl_seconds)
+        except Exception as e:
+            print(f"Error en latido de shard: {e}")
+            return
+
+        workers = sorted(set(workers) | {self.worker_id})
+        if workers == self.ring.nodes:
+            self._renew_dates()
+            return
+
+        print(f"🔀 Rebalanceo de shards: {len(workers)} worker(s) {workers}")
+        with self._lock:
+            self.ring = HashRing(workers)
+            lost = [d for d in self.owned if self.ring.owner(d) != self.worker_id]
+            self.owned = [d for d in self.owned if d not in lost]
+
+        if lost:
+            try:
+                self.leases.release_many([f"date:{d}" for d in lost], self.worker_id)
+            except Exception as e:
+                print(f"Error liberando fechas rebalanceadas: {e}")
+
+        self._renew_dates()
+        if self.proxy_manager:
+            self.proxy_manager.set_partition(workers.index(self.worker_id), len(workers))
+
+    def _renew_dates(self):
+        """Renueva los leases de las fechas propias (caducan si el worker muere)."""
+        with self._lock:
+            owned = list(self.owned)
+        if not owned:
+            return
+        try:
+            held = set(self.leases.acquire_many(
+                [f"date:{d}" for d in owned], self.worker_id, self.date_lease_seconds
+            ))
+        except Exception as e:
+            print(f"Error renovando fechas del shard: {e}")
+            return
+        with self._lock:
+            self.owned = [d for d in self.owned if d not in owned or f"date:{d}" in held]
+
+    def owned_dates(self, dates: List[str]) -> List[str]:
+        """
+        Fechas que este worker debe consultar en este ciclo.
+
+        Solo devuelve las fechas que le asigna el anillo y cuyo lease consigue;
+        una fecha recién movida queda en pausa hasta que su antiguo dueño la libera.
+        """
+        with self._lock:
+            candidates = [d for d in dates if self.ring.owner(d) == self.worker_id]
+
+        names = [f"date:{d}" for d in candidates]
+        try:
+            acquired = set(self.leases.acquire_many(names, self.worker_id, self.date_lease_seconds))
+        except Exception as e:
+            print(f"Error adquiriendo fechas del shard: {e}")
+            acquired = set()
+
+        owned = [d for d in candidates if f"date:{d}" in acquired]
+        with self._lock:
+            self.owned = owned
+        return owned
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            self.heartbeat()
+
+    def start(self):
+        self._stop.clear()
+        self.heartbeat()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='shard-heartbeat', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Sale del anillo y libera sus fechas para que otro worker las tome ya."""
+        self._stop.set()
+        try:
+            self.leases.release_many([f"date:{d}" for d in self.owned], self.worker_id)
+            self.membership.leave(self.worker_id)
+        except Exception as e:
+            print(f"Error saliendo del shard: {e}")
+        self.owned = []
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            return {
+                'worker_id': self.worker_id,
+                'workers': list(self.ring.nodes),
+                'owned_dates': list(self.owned)
+            }
+
+
+def create_shard_coordinator(proxy_manager=None) -> Optional[ShardCoordinator]:
+    """Crea el coordinador según SHARDING (None si está desactivado)."""
+    if SHARDING == 'sqlite':
+        return ShardCoordinator(SQLiteMembershipStore(), SQLiteLeaseStore(),
+                                SHARD_WORKER_ID or None, proxy_manager=proxy_manager)
+    if SHARDING == 'supabase':
+        return ShardCoordinator(SupabaseMembershipStore(), SupabaseLeaseStore(),
+                                SHARD_WORKER_ID or None, proxy_manager=proxy_manager)
+    return None
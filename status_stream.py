@@ -0,0 +1,197 @@
+"""
+Stream de estado por Server-Sent Events (/api/stream)
+
+Un único hilo publicador calcula el estado del monitor cuando cambia algo
+(fin de una verificación, inicio/parada) y envía a cada dashboard conectado
+solo las diferencias. Con muchos dashboards abiertos el coste entre eventos
+es cero: nadie consulta /api/status periódicamente.
+
+Formato de los eventos:
+  - snapshot: estado completo (al conectar)
+  - delta: claves cambiadas; en last_results solo las fechas cambiadas
+    (null = la fecha ya no tiene disponibilidad)
+
+Cada cambio incrementa una versión; /api/status la usa como ETag y para
+devolver solo lo cambiado desde una versión (?since=). /api/status sirve
+siempre la copia en memoria: el estado solo se relee con notify() o, sin
+avisos (modo worker), cada poll_seconds mientras alguien lo consulte. La versión arranca
+en la hora de inicio en milisegundos, así sigue siendo creciente entre
+reinicios y una versión de un proceso anterior se detecta (es menor que la
+versión base) y recibe el estado completo.
+"""
+import json
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+from config import STREAM_POLL_SECONDS, STREAM_HEARTBEAT_SECONDS
+
+# Eventos pendientes por cliente antes de considerarlo desconectado
+MAX_PENDING_EVENTS = 100
+
+
+def diff_status(old: dict, new: dict) -> dict:
+    """Claves de `new` que difieren de `old`; last_results se compara por fecha."""
+    delta = {}
+    for key, value in new.items():
+        if key == 'last_results':
+            old_results = old.get('last_results') or {}
+            new_results = value or {}
+            changed = {d: p for d, p in new_results.items() if old_results.get(d) != p}
+            changed.update({d: None for d in old_results if d not in new_results})
+            if changed:
+                delta['last_results'] = changed
+        elif old.get(key) != value:
+            delta[key] = value
+    return delta
+
+
+def format_event(event: str, data: dict, event_id: int = None, retry_ms: int = None) -> str:
+    """Serializa un evento SSE."""
+    lines = []
+    if retry_ms is not None:
+        lines.append(f"retry: {retry_ms}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class StatusStream:
+    """Publica las diferencias del estado del monitor a los clientes SSE."""
+
+    def __init__(self, source: Callable[[], dict], poll_seconds: float = STREAM_POLL_SECONDS,
+                 heartbeat_seconds: float = STREAM_HEARTBEAT_SECONDS):
+        """
+        Args:
+            source: Devuelve el estado completo (monitor.get_status)
+            poll_seconds: Respaldo si el monitor no avisa de los cambios
+                (modo worker); una lectura por proceso, no por cliente
+        """
+        self.source = source
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.base_version = int(time.time() * 1000)
+        self.version = self.base_version
+        self.snapshot: dict = {}
+        # Versión en la que cambió por última vez cada clave / cada fecha
+        self.key_versions: Dict[str, int] = {}
+        self.date_versions: Dict[str, int] = {}
+        self._clients: Dict[int, queue.Queue] = {}
+        self._next_client = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_read = 0.0  # última consulta de /api/status (monotonic)
+
+    def notify(self):
+        """Avisa de un posible cambio (lo llama el monitor)."""
+        self._wakeup.set()
+
+    def refresh(self) -> Optional[dict]:
+        """Relee el estado y publica la diferencia; devuelve el delta (o None)."""
+        try:
+            status = self.source()
+        except Exception as e:
+            print(f"Error leyendo estado para el stream: {e}")
+            return None
+
+        with self._lock:
+            delta = diff_status(self.snapshot, status)
+            if not delta:
+                return None
+            self.version += 1
+            self.snapshot = status
+            for key in delta:
+                if key != 'last_results':
+                    self.key_versions[key] = self.version
+            for date in delta.get('last_results', {}):
+                self.date_versions[date] = self.version
+            frame = format_event('delta', delta, self.version)
+            for client_id, q in list(self._clients.items()):
+                try:
+                    q.put_nowait(frame)
+                except queue.Full:
+                    # Cliente que no lee: se desconecta para no acumular memoria
+                    self._clients.pop(client_id, None)
+        return delta
+
+    def current(self) -> tuple:
+        """(versión, estado) en memoria; solo se lee el estado la primera vez."""
+        with self._lock:
+            self._last_read = time.monotonic()
+            loaded = bool(self.snapshot)
+            self._ensure_publisher()
+        if not loaded:
+            self.refresh()
+        with self._lock:
+            return self.version, self.snapshot
+
+    def changes_since(self, since: int) -> dict:
+        """
+        Lo que cambió después de la versión `since` (sin releer el estado).
+
+        Returns:
+            {'version', 'since', 'delta': True, claves cambiadas...}, o el estado
+            completo con 'delta': False si `since` no es de este proceso
+        """
+        with self._lock:
+            if since < self.base_version or since > self.version:
+                return {**self.snapshot, 'version': self.version, 'delta': False}
+
+            changes = {k: self.snapshot.get(k) for k, v in self.key_versions.items() if v > since}
+            results = self.snapshot.get('last_results') or {}
+            changed_dates = {d: results.get(d) for d, v in self.date_versions.items() if v > since}
+            if changed_dates:
+                changes['last_results'] = changed_dates
+            return {**changes, 'version': self.version, 'since': since, 'delta': True}
+
+    def _run(self):
+        while True:
+            notified = self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+            if not notified:
+                # Respaldo periódico solo si hay streams o consultas recientes
+                with self._lock:
+                    idle = not self._clients and time.monotonic() - self._last_read > self.poll_seconds * 2
+                if idle:
+                    continue
+            self.refresh()
+
+    def _ensure_publisher(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='status-stream', daemon=True)
+            self._thread.start()
+
+    def events(self) -> Iterator[str]:
+        """Generador SSE para un cliente: snapshot inicial, deltas y latidos."""
+        # Estado al día para el snapshot inicial (una lectura por conexión)
+        self.refresh()
+
+        q = queue.Queue(maxsize=MAX_PENDING_EVENTS)
+        with self._lock:
+            client_id = self._next_client
+            self._next_client += 1
+            self._clients[client_id] = q
+            first = format_event('snapshot', self.snapshot, self.version)
+            self._ensure_publisher()
+
+        try:
+            yield first
+            while True:
+                with self._lock:
+                    if client_id not in self._clients:
+                        return
+                try:
+                    yield q.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexión tras proxies
+                    yield ': ping\n\n'
+        finally:
+            with self._lock:
+                self._clients.pop(client_id, None)
+
+    def client_count(self) -> int:
+        with self._lock:
+            return len(self._clients)
@@ -0,0 +1,812 @@
+"""
+Almacenamiento del estado del monitor con backends intercambiables
+
+Una sola interfaz para todo el estado persistente:
+  - fechas objetivo
+  - estado (contadores, última verificación, últimos resultados)
+  - productos ya alertados (para no repetir alertas)
+  - historial de verificaciones
+
+Backends (STORAGE_BACKEND):
+  - json: target_dates.json + monitor_state.json (por defecto, sin dependencias;
+    las escrituras son atómicas dentro de un proceso, no entre varios)
+  - sqlite: un archivo SQLite en modo WAL (lecturas concurrentes sin bloquear
+    al monitor; recomendado en despliegues locales)
+  - supabase: tablas de Supabase vía api/db.py (despliegue en Vercel)
+
+create_storage() pone delante una caché en memoria con escritura directa
+(write-through): las escrituras van al backend y actualizan la caché, y las
+lecturas se sirven de memoria durante STORAGE_CACHE_SECONDS. Así el monitor,
+app.py y las funciones de Vercel comparten la misma lógica.
+"""
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, Iterable, List
+from date_store import CachedJsonFile, DateStore, sort_dates
+from config import (
+    STORAGE_BACKEND,
+    STORAGE_DB_FILE,
+    STORAGE_CACHE_SECONDS,
+    STATE_FILE,
+    DATES_FILE,
+    HISTORY_LIMIT
+)
+
+
+def default_status() -> dict:
+    return {
+        'check_count': 0,
+        'alerts_sent': 0,
+        'last_check': None,
+        'last_results': {}
+    }
+
+
+UNAVAILABLE = 'UNAVAILABLE'
+
+
+def availability_rows(availability: Dict[str, list]) -> List[dict]:
+    """{fecha: [productos]} -> filas normalizadas (fecha, producto, estado)."""
+    return [
+        {
+            'date': date,
+            'product_id': int(product.get('id') or 0),
+            'name': product.get('name'),
+            'state': product.get('availability') or 'AVAILABLE',
+            'product': product
+        }
+        for date, products in availability.items()
+        for product in products
+    ]
+
+
+class Storage(ABC):
+    """Interfaz común; las subclases implementan cada operación abstracta."""
+
+    name = 'storage'
+
+    # Fechas
+    @abstractmethod
+    def get_dates(self) -> List[str]:
+        """Fechas objetivo ordenadas."""
+
+    @abstractmethod
+    def add_dates(self, dates: Iterable[str]) -> List[str]:
+        """Agrega varias fechas en una sola operación; devuelve las que no existían."""
+
+    @abstractmethod
+    def remove_dates(self, dates: Iterable[str]) -> List[str]:
+        """Elimina varias fechas en una sola operación; devuelve las que existían."""
+
+    def add_date(self, date: str) -> bool:
+        """Agrega una fecha; False si ya existía."""
+        return bool(self.add_dates([date]))
+
+    def remove_date(self, date: str) -> bool:
+        """Elimina una fecha; False si no existía."""
+        return bool(self.remove_dates([date]))
+
+    # Estado
+    @abstractmethod
+    def get_status(self) -> dict:
+        """check_count, alerts_sent, last_check, last_results (y lo que añada el backend)."""
+
+    @abstractmethod
+    def update_status(self, **fields) -> dict:
+        """Sobrescribe los campos indicados y devuelve el estado resultante."""
+
+    def get_status_with_dates(self) -> dict:
+        """Estado más 'target_dates' (Supabase lo resuelve en una sola petición)."""
+        return {**self.get_status(), 'target_dates': self.get_dates()}
+
+    def update_status_with_results(self, last_check: str, last_results: dict,
+                                   increment_check: bool = True,
+                                   increment_alert: int = 0) -> dict:
+        """
+        Guarda el resultado de una verificación e incrementa los contadores.
+
+        last_results=None conserva los resultados guardados.
+        """
+        status = self.get_status()
+        fields = {
+            'last_check': last_check,
+            'check_count': status.get('check_count', 0) + int(increment_check),
+            'alerts_sent': status.get('alerts_sent', 0) + int(increment_alert)
+        }
+        if last_results is not None:
+            fields['last_results'] = last_results
+        return self.update_status(**fields)
+
+    # Alertas
+    @abstractmethod
+    def get_alerted(self) -> FrozenSet[str]:
+        """Claves de productos ya alertados ("DD/MM/YYYY_productId")."""
+
+    def count_alerted(self) -> int:
+        """Número de claves alertadas (sin transferir las claves si el backend puede contarlas)."""
+        return len(self.get_alerted())
+
+    @abstractmethod
+    def add_alerted(self, keys: Iterable[str]) -> bool:
+        """Marca claves como alertadas."""
+
+    def claim_alerted(self, keys: Iterable[str]) -> List[str]:
+        """
+        Marca las claves como alertadas y devuelve las que no lo estaban.
+
+        Solo se envían las candidatas del ciclo (no todo el historial) y, en
+        los backends que lo soportan, es atómico entre procesos.
+        """
+        alerted = self.get_alerted()
+        claimed = [k for k in dict.fromkeys(keys) if k not in alerted]
+        self.add_alerted(claimed)
+        return claimed
+
+    @abstractmethod
+    def release_alerted(self, keys: Iterable[str]) -> bool:
+        """Desmarca claves reclamadas para una alerta que no se pudo enviar."""
+
+    @abstractmethod
+    def clear_alerted(self) -> bool:
+        """Olvida todas las claves alertadas (para volver a alertar)."""
+
+    # Disponibilidad normalizada
+    def record_availability(self, dates: List[str], availability: Dict[str, list],
+                            observed_at: str = None, tracked_dates: Iterable[str] = None) -> int:
+        """
+        Guarda el resultado de las fechas consultadas por fecha/producto,
+        escribiendo solo las filas cuyo estado cambió (los productos que
+        desaparecen pasan a UNAVAILABLE) y registrando cada transición.
+        Si algo cambió, last_results se recalcula desde el snapshot en la
+        misma operación, así que no hace falta volver a enviarlo.
+
+        Args:
+            dates: Fechas consultadas en esta verificación
+            availability: {fecha: [productos disponibles]}
+            tracked_dates: Fechas vigiladas; las demás salen del snapshot (None = no podar)
+
+        Returns:
+            Número de filas del snapshot que cambiaron; -1 si el backend no
+            guarda el snapshot (json) o falló, y entonces hay que guardar
+            last_results completo
+        """
+        return -1
+
+    def get_transitions(self, limit: int = 50) -> List[dict]:
+        """Últimos cambios de disponibilidad, del más reciente al más antiguo."""
+        return []
+
+    # Historial
+    @abstractmethod
+    def append_history(self, entry: dict) -> bool:
+        """Añade una verificación al historial (se conservan las últimas HISTORY_LIMIT)."""
+
+    @abstractmethod
+    def get_history(self, limit: int = 50) -> List[dict]:
+        """Últimas verificaciones, de la más reciente a la más antigua."""
+
+
+class JsonStorage(Storage):
+    """Fechas en target_dates.json y el resto del estado en monitor_state.json."""
+
+    name = 'json'
+
+    def __init__(self, dates_path: str = DATES_FILE, state_path: str = STATE_FILE,
+                 history_limit: int = HISTORY_LIMIT):
+        self.dates = DateStore(dates_path)
+        self.state = CachedJsonFile(state_path, default=lambda: {
+            'status': default_status(), 'alerted': [], 'history': []
+        })
+        self.history_limit = history_limit
+
+    def get_dates(self) -> List[str]:
+        return self.dates.all()
+
+    def add_dates(self, dates: Iterable[str]) -> List[str]:
+        return self.dates.add_many(dates)
+
+    def remove_dates(self, dates: Iterable[str]) -> List[str]:
+        return self.dates.remove_many(dates)
+
+    def get_status(self) -> dict:
+        return {**default_status(), **self.state.read().get('status', {})}
+
+    def update_status(self, **fields) -> dict:
+        def apply(state):
+            status = {**default_status(), **state.get('status', {}), **fields}
+            status['updated_at'] = datetime.now().isoformat()
+            return {**state, 'status': status}
+        return dict(self.state.update(apply)['status'])
+
+    def update_status_with_results(self, last_check: str, last_results: dict,
+                                   increment_check: bool = True,
+                                   increment_alert: int = 0) -> dict:
+        def apply(state):
+            status = {**default_status(), **state.get('status', {})}
+            if last_results is not None:
+                status['last_results'] = last_results
+            status.update(
+                last_check=last_check,
+                check_count=status['check_count'] + int(increment_check),
+                alerts_sent=status['alerts_sent'] + int(increment_alert),
+                updated_at=datetime.now().isoformat()
+            )
+            return {**state, 'status': status}
+        return dict(self.state.update(apply)['status'])
+
+    def get_alerted(self) -> FrozenSet[str]:
+        return frozenset(self.state.read().get('alerted', []))
+
+    def add_alerted(self, keys: Iterable[str]) -> bool:
+        keys = list(keys)
+        if not keys:
+            return True
+
+        def apply(state):
+            alerted = list(dict.fromkeys(state.get('alerted', []) + keys))
+            return {**state, 'alerted': alerted}
+        self.state.update(apply)
+        return True
+
+    def claim_alerted(self, keys: Iterable[str]) -> List[str]:
+        claimed = []
+
+        def apply(state):
+            alerted = state.get('alerted', [])
+            seen = set(alerted)
+            claimed.extend(k for k in dict.fromkeys(keys) if k not in seen)
+            return {**state, 'alerted': alerted + claimed}
+        self.state.update(apply)
+        return claimed
+
+    def release_alerted(self, keys: Iterable[str]) -> bool:
+        released = set(keys)
+        self.state.update(lambda state: {
+            **state, 'alerted': [k for k in state.get('alerted', []) if k not in released]
+        })
+        return True
+
+    def clear_alerted(self) -> bool:
+        self.state.update(lambda state: {**state, 'alerted': []})
+        return True
+
+    def append_history(self, entry: dict) -> bool:
+        def apply(state):
+            history = (state.get('history', []) + [entry])[-self.history_limit:]
+            return {**state, 'history': history}
+        self.state.update(apply)
+        return True
+
+    def get_history(self, limit: int = 50) -> List[dict]:
+        return list(reversed(self.state.read().get('history', [])[-limit:]))
+
+
+class SQLiteStorage(Storage):
+    """Todo el estado en un archivo SQLite en modo WAL."""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = STORAGE_DB_FILE, history_limit: int = HISTORY_LIMIT):
+        self.path = path
+        self.history_limit = history_limit
+        with self._connect() as conn:
+            # WAL queda grabado en el archivo: lectores y escritor no se bloquean
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS target_dates (
+                    date TEXT PRIMARY KEY,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS monitor_status (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    check_count INTEGER NOT NULL DEFAULT 0,
+                    alerts_sent INTEGER NOT NULL DEFAULT 0,
+                    last_check TEXT,
+                    last_results TEXT NOT NULL DEFAULT '{}',
+                    updated_at TEXT
+                );
+                INSERT OR IGNORE INTO monitor_status (id) VALUES (1);
+                CREATE TABLE IF NOT EXISTS alerted_products (
+                    product_key TEXT PRIMARY KEY,
+                    alerted_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS check_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    checked_at TEXT NOT NULL,
+                    entry TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS availability_snapshot (
+                    date TEXT NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    name TEXT,
+                    state TEXT NOT NULL,
+                    observed_at TEXT NOT NULL,
+                    product TEXT NOT NULL DEFAULT '{}',
+                    PRIMARY KEY (date, product_id)
+                );
+                CREATE TABLE IF NOT EXISTS availability_transitions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    from_state TEXT,
+                    to_state TEXT NOT NULL,
+                    observed_at TEXT NOT NULL
+                );
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def get_dates(self) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT date FROM target_dates').fetchall()
+        return sort_dates(row[0] for row in rows)
+
+    def add_dates(self, dates: Iterable[str]) -> List[str]:
+        dates = sort_dates(dates)
+        now = datetime.now().isoformat()
+        # Una transacción para todo el lote
+        with self._connect() as conn:
+            added = [
+                date for date in dates
+                if conn.execute(
+                    'INSERT OR IGNORE INTO target_dates (date, created_at) VALUES (?, ?)',
+                    (date, now)
+                ).rowcount > 0
+            ]
+        return added
+
+    def remove_dates(self, dates: Iterable[str]) -> List[str]:
+        dates = sort_dates(dates)
+        with self._connect() as conn:
+            removed = [
+                date for date in dates
+                if conn.execute('DELETE FROM target_dates WHERE date = ?', (date,)).rowcount > 0
+            ]
+        return removed
+
+    def _read_status(self, conn: sqlite3.Connection) -> dict:
+        row = conn.execute(
+            'SELECT check_count, alerts_sent, last_check, last_results, updated_at '
+            'FROM monitor_status WHERE id = 1'
+        ).fetchone()
+        return {
+            'check_count': row[0],
+            'alerts_sent': row[1],
+            'last_check': row[2],
+            'last_results': json.loads(row[3] or '{}'),
+            'updated_at': row[4]
+        }
+
+    def get_status(self) -> dict:
+        with self._connect() as conn:
+            return self._read_status(conn)
+
+    def update_status(self, **fields) -> dict:
+        columns = {k: v for k, v in fields.items()
+                   if k in ('check_count', 'alerts_sent', 'last_check', 'last_results')}
+        if 'last_results' in columns:
+            columns['last_results'] = json.dumps(columns['last_results'], ensure_ascii=False)
+        columns['updated_at'] = datetime.now().isoformat()
+        assignments = ', '.join(f'{name} = ?' for name in columns)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE monitor_status SET {assignments} WHERE id = 1', list(columns.values()))
+            return self._read_status(conn)
+
+    def update_status_with_results(self, last_check: str, last_results: dict,
+                                   increment_check: bool = True,
+                                   increment_alert: int = 0) -> dict:
+        # Incremento atómico en SQL: sin carreras entre procesos
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE monitor_status
+                SET last_check = ?, last_results = COALESCE(?, last_results), updated_at = ?,
+                    check_count = check_count + ?, alerts_sent = alerts_sent + ?
+                WHERE id = 1
+            ''', (last_check, None if last_results is None else json.dumps(last_results, ensure_ascii=False),
+                  datetime.now().isoformat(), int(increment_check), int(increment_alert)))
+            return self._read_status(conn)
+
+    def get_alerted(self) -> FrozenSet[str]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT product_key FROM alerted_products').fetchall()
+        return frozenset(row[0] for row in rows)
+
+    def count_alerted(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM alerted_products').fetchone()[0]
+
+    def add_alerted(self, keys: Iterable[str]) -> bool:
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO alerted_products (product_key, alerted_at) VALUES (?, ?)',
+                [(key, now) for key in keys]
+            )
+        return True
+
+    def claim_alerted(self, keys: Iterable[str]) -> List[str]:
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            claimed = [
+                key for key in dict.fromkeys(keys)
+                if conn.execute(
+                    'INSERT OR IGNORE INTO alerted_products (product_key, alerted_at) VALUES (?, ?)',
+                    (key, now)
+                ).rowcount > 0
+            ]
+        return claimed
+
+    def release_alerted(self, keys: Iterable[str]) -> bool:
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM alerted_products WHERE product_key = ?', [(k,) for k in keys])
+        return True
+
+    def clear_alerted(self) -> bool:
+        with self._connect() as conn:
+            conn.execute('DELETE FROM alerted_products')
+        return True
+
+    def record_availability(self, dates: List[str], availability: Dict[str, list],
+                            observed_at: str = None, tracked_dates: Iterable[str] = None) -> int:
+        observed_at = observed_at or datetime.now().isoformat()
+        checked = list(dict.fromkeys(dates))
+        incoming = {
+            (row['date'], row['product_id']): row
+            for row in availability_rows(availability) if row['date'] in checked
+        }
+        with self._connect() as conn:
+            current = {}
+            if checked:
+                placeholders = ','.join('?' * len(checked))
+                for row in conn.execute(
+                    'SELECT date, product_id, state, name, product FROM availability_snapshot '
+                    f'WHERE date IN ({placeholders})', checked
+                ):
+                    current[(row[0], row[1])] = row[2:]
+
+            # (clave, estado anterior, estado nuevo, nombre, producto) de lo que cambió
+            changes = []
+            for key, row in incoming.items():
+                from_state = current[key][0] if key in current else None
+                if from_state != row['state']:
+                    changes.append((key, from_state, row['state'], row['name'],
+                                    json.dumps(row['product'], ensure_ascii=False)))
+            for key, (state, name, product) in current.items():
+                if key not in incoming and state != UNAVAILABLE:
+                    changes.append((key, state, UNAVAILABLE, name, product))
+
+            conn.executemany('''
+                INSERT INTO availability_snapshot (date, product_id, name, state, observed_at, product)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(date, product_id) DO UPDATE
+                    SET name = excluded.name, state = excluded.state,
+                        observed_at = excluded.observed_at, product = excluded.product
+            ''', [(k[0], k[1], name, to_state, observed_at, product)
+                  for k, _, to_state, name, product in changes])
+            conn.executemany(
+                'INSERT INTO availability_transitions (date, product_id, from_state, to_state, observed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(k[0], k[1], from_state, to_state, observed_at) for k, from_state, to_state, _, _ in changes]
+            )
+            pruned = 0
+            if tracked_dates is not None:
+                tracked = set(tracked_dates)
+                untracked = [
+                    (row[0],) for row in conn.execute('SELECT DISTINCT date FROM availability_snapshot')
+                    if row[0] not in tracked
+                ]
+                pruned = conn.executemany('DELETE FROM availability_snapshot WHERE date = ?', untracked).rowcount
+
+            # last_results se recalcula desde el snapshot en la misma transacción
+            if changes or pruned > 0:
+                results = {}
+                for date, product in conn.execute(
+                    "SELECT date, product FROM availability_snapshot WHERE state <> ? ORDER BY product_id",
+                    (UNAVAILABLE,)
+                ):
+                    results.setdefault(date, []).append(json.loads(product))
+                last_results = {date: results[date] for date in sort_dates(results)}
+                conn.execute(
+                    'UPDATE monitor_status SET last_results = ?, updated_at = ? WHERE id = 1',
+                    (json.dumps(last_results, ensure_ascii=False), datetime.now().isoformat())
+                )
+        return len(changes) + max(0, pruned)
+
+    def get_transitions(self, limit: int = 50) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT date, product_id, from_state, to_state, observed_at '
+                'FROM availability_transitions ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [
+            {'date': r[0], 'product_id': r[1], 'from_state': r[2], 'to_state': r[3], 'observed_at': r[4]}
+            for r in rows
+        ]
+
+    def append_history(self, entry: dict) -> bool:
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO check_history (checked_at, entry) VALUES (?, ?)',
+                (entry.get('checked_at') or datetime.now().isoformat(),
+                 json.dumps(entry, ensure_ascii=False))
+            )
+            conn.execute(
+                'DELETE FROM check_history WHERE id <= '
+                '(SELECT MAX(id) FROM check_history) - ?',
+                (self.history_limit,)
+            )
+        return True
+
+    def get_history(self, limit: int = 50) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT entry FROM check_history ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class SupabaseStorage(Storage):
+    """Tablas de Supabase (compartidas entre invocaciones de Vercel)."""
+
+    name = 'supabase'
+
+    def __init__(self, history_limit: int = HISTORY_LIMIT):
+        self.history_limit = history_limit
+
+    def get_dates(self) -> List[str]:
+        from api.db import get_dates
+        return sort_dates(get_dates())
+
+    def add_dates(self, dates: Iterable[str]) -> List[str]:
+        from api.db import add_dates
+        return add_dates(sort_dates(dates))
+
+    def remove_dates(self, dates: Iterable[str]) -> List[str]:
+        from api.db import remove_dates
+        return remove_dates(sort_dates(dates))
+
+    def get_status(self) -> dict:
+        from api.db import get_status
+        return get_status()
+
+    def update_status(self, **fields) -> dict:
+        from api.db import update_status, get_status
+        update_status(**fields)
+        return get_status()
+
+    def get_status_with_dates(self) -> dict:
+        from api.db import get_status_with_dates
+        status = get_status_with_dates()
+        return {**status, 'target_dates': sort_dates(status.get('target_dates') or [])}
+
+    def update_status_with_results(self, last_check: str, last_results: dict,
+                                   increment_check: bool = True,
+                                   increment_alert: int = 0) -> dict:
+        from api.db import update_status_with_results
+        return update_status_with_results(last_check, last_results, increment_check, increment_alert)
+
+    def get_alerted(self) -> FrozenSet[str]:
+        from api.db import get_alerted_products
+        return frozenset(get_alerted_products())
+
+    def count_alerted(self) -> int:
+        from api.db import count_alerted_products
+        return count_alerted_products()
+
+    def add_alerted(self, keys: Iterable[str]) -> bool:
+        from api.db import add_alerted_products_batch
+        return add_alerted_products_batch(list(keys))
+
+    def claim_alerted(self, keys: Iterable[str]) -> List[str]:
+        from api.db import claim_alerted_products
+        return claim_alerted_products(list(dict.fromkeys(keys)))
+
+    def release_alerted(self, keys: Iterable[str]) -> bool:
+        from api.db import release_alerted_products
+        return release_alerted_products(list(keys))
+
+    def clear_alerted(self) -> bool:
+        from api.db import clear_alerted_products
+        return clear_alerted_products()
+
+    def record_availability(self, dates: List[str], availability: Dict[str, list],
+                            observed_at: str = None, tracked_dates: Iterable[str] = None) -> int:
+        from api.db import record_availability
+        tracked = None if tracked_dates is None else list(dict.fromkeys(tracked_dates))
+        return record_availability(list(dates), availability_rows(availability), observed_at, tracked)
+
+    def get_transitions(self, limit: int = 50) -> List[dict]:
+        from api.db import get_availability_transitions
+        return get_availability_transitions(limit)
+
+    def append_history(self, entry: dict) -> bool:
+        from api.db import add_check_history
+        return add_check_history(entry, self.history_limit)
+
+    def get_history(self, limit: int = 50) -> List[dict]:
+        from api.db import get_check_history
+        return get_check_history(limit)
+
+
+class CachedStorage(Storage):
+    """
+    Caché en memoria (write-through) delante de otro backend.
+
+    Las lecturas de fechas, estado y alertas se sirven de memoria durante
+    `ttl` segundos; cada escritura pasa al backend y deja en la caché el
+    valor resultante, así el proceso que escribe nunca lee datos viejos.
+    Otros procesos ven el cambio como mucho `ttl` segundos después.
+    """
+
+    def __init__(self, backend: Storage, ttl: float = STORAGE_CACHE_SECONDS):
+        self.backend = backend
+        self.name = backend.name
+        self.ttl = ttl
+        self._cache: Dict[str, tuple] = {}  # clave -> (expira, valor)
+        self._lock = threading.RLock()
+
+    def _get(self, key: str, loader: Callable):
+        value = self._fresh(key)
+        if value is not None:
+            return value
+        value = loader()
+        self._put(key, value)
+        return value
+
+    def _put(self, key: str, value):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key: str = None):
+        """Descarta una entrada (o toda la caché)."""
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def get_dates(self) -> List[str]:
+        return list(self._get('dates', lambda: tuple(self.backend.get_dates())))
+
+    def _fresh(self, key: str):
+        with self._lock:
+            entry = self._cache.get(key)
+            return entry[1] if entry and entry[0] > time.monotonic() else None
+
+    def add_dates(self, dates: Iterable[str]) -> List[str]:
+        added = self.backend.add_dates(dates)
+        # Con la lista en caché se calcula la nueva sin volver a leer el backend
+        cached = self._fresh('dates')
+        current = cached + tuple(added) if cached is not None else self.backend.get_dates()
+        self._put('dates', tuple(sort_dates(current)))
+        return added
+
+    def remove_dates(self, dates: Iterable[str]) -> List[str]:
+        removed = self.backend.remove_dates(dates)
+        cached = self._fresh('dates')
+        if cached is not None:
+            gone = set(removed)
+            self._put('dates', tuple(d for d in cached if d not in gone))
+        else:
+            self._put('dates', tuple(self.backend.get_dates()))
+        return removed
+
+    def get_status(self) -> dict:
+        return dict(self._get('status', self.backend.get_status))
+
+    def update_status(self, **fields) -> dict:
+        status = self.backend.update_status(**fields)
+        self._put('status', status)
+        return dict(status)
+
+    def get_status_with_dates(self) -> dict:
+        status, dates = self._fresh('status'), self._fresh('dates')
+        if status is None or dates is None:
+            combined = self.backend.get_status_with_dates()
+            dates = tuple(combined.pop('target_dates', ()))
+            status = combined
+            self._put('status', status)
+            self._put('dates', dates)
+        return {**status, 'target_dates': list(dates)}
+
+    def update_status_with_results(self, last_check: str, last_results: dict,
+                                   increment_check: bool = True,
+                                   increment_alert: int = 0) -> dict:
+        status = self.backend.update_status_with_results(
+            last_check, last_results, increment_check, increment_alert
+        )
+        self._put('status', status)
+        return dict(status)
+
+    def get_alerted(self) -> FrozenSet[str]:
+        return self._get('alerted', self.backend.get_alerted)
+
+    def count_alerted(self) -> int:
+        alerted = self._fresh('alerted')
+        if alerted is not None:
+            return len(alerted)
+        return self._get('alerted_count', self.backend.count_alerted)
+
+    def add_alerted(self, keys: Iterable[str]) -> bool:
+        keys = list(keys)
+        if not keys:
+            return True
+        success = self.backend.add_alerted(keys)
+        self._merge_alerted(added=keys)
+        return success
+
+    def claim_alerted(self, keys: Iterable[str]) -> List[str]:
+        # Siempre contra el backend: la caché podría no ver reclamaciones de otros procesos
+        claimed = self.backend.claim_alerted(keys)
+        self._merge_alerted(added=claimed)
+        return claimed
+
+    def release_alerted(self, keys: Iterable[str]) -> bool:
+        keys = list(keys)
+        success = self.backend.release_alerted(keys)
+        self._merge_alerted(removed=keys)
+        return success
+
+    def _merge_alerted(self, added: Iterable[str] = (), removed: Iterable[str] = ()):
+        with self._lock:
+            self._cache.pop('alerted_count', None)
+            entry = self._cache.get('alerted')
+            if entry:
+                self._cache['alerted'] = (entry[0], (entry[1] | frozenset(added)) - frozenset(removed))
+
+    def clear_alerted(self) -> bool:
+        success = self.backend.clear_alerted()
+        self._put('alerted', frozenset())
+        self._put('alerted_count', 0)
+        return success
+
+    def record_availability(self, dates: List[str], availability: Dict[str, list],
+                            observed_at: str = None, tracked_dates: Iterable[str] = None) -> int:
+        changes = self.backend.record_availability(dates, availability, observed_at, tracked_dates)
+        if changes != 0:
+            # last_results se recalcula en el backend (o hay que reescribirlo)
+            self.invalidate('status')
+        return changes
+
+    def get_transitions(self, limit: int = 50) -> List[dict]:
+        return self.backend.get_transitions(limit)
+
+    def append_history(self, entry: dict) -> bool:
+        return self.backend.append_history(entry)
+
+    def get_history(self, limit: int = 50) -> List[dict]:
+        return self.backend.get_history(limit)
+
+
+BACKENDS = {
+    'json': JsonStorage,
+    'sqlite': SQLiteStorage,
+    'supabase': SupabaseStorage
+}
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> CachedStorage:
+    """Backend configurado con la caché write-through delante."""
+    if backend not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
+    return CachedStorage(BACKENDS[backend]())
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> CachedStorage:
+    """Almacenamiento compartido del proceso (monitor y app web usan la misma caché)."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage()
+        return _storage
@@ -0,0 +1,196 @@
+"""
+Suscripciones multi-cliente con consultas deduplicadas
+
+Cada suscripción define qué vigilar y a quién avisar:
+    {
+        'id': 'abc123',
+        'subscriber': 'Cliente',
+        'chat_id': '123456',
+        'dates': ['DD/MM/YYYY', ...],
+        'tag': 'MV-Biglietti',
+        'who_id': '1',
+        'visitor_num': 2,
+        'product_filter': "Biglietti d'ingresso"
+    }
+
+El filtro de producto se aplica localmente, así que dos clientes con la misma
+fecha, tag, tipo y número de visitantes comparten una única consulta a la API.
+El índice query_key -> suscripciones permite repartir cada resultado a todos
+los interesados.
+
+Sin suscripciones configuradas se usa una suscripción 'default' construida
+con target_dates.json, TELEGRAM_CHAT_ID y los valores de config.py.
+"""
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from date_store import CachedJsonFile
+from date_ranges import expand_date_request
+from config import (
+    SUBSCRIPTIONS_FILE,
+    TELEGRAM_CHAT_ID,
+    DEFAULT_VISIT_TAG,
+    DEFAULT_WHO_ID,
+    DEFAULT_VISITOR_NUM,
+    PRODUCT_FILTER
+)
+
+_lock = threading.Lock()
+_file = CachedJsonFile(SUBSCRIPTIONS_FILE, default=lambda: {'subscriptions': []})
+
+
+def spec_key(tag: str, who_id: str, visitor_num: int) -> str:
+    """Clave de la especificación de búsqueda (sin fecha)."""
+    return f"{tag}|{who_id}|{visitor_num}"
+
+
+def query_key(date: str, tag: str, who_id: str, visitor_num: int) -> str:
+    """Clave de una consulta a la API: especificación + fecha."""
+    return f"{spec_key(tag, who_id, visitor_num)}|{date}"
+
+
+def parse_query_key(key: str) -> Tuple[str, str, int, str]:
+    """Devuelve (tag, who_id, visitor_num, fecha) de una query_key."""
+    tag, who_id, visitor_num, date = key.split('|')
+    return tag, who_id, int(visitor_num), date
+
+
+def date_of(key: str) -> str:
+    """Fecha de una query_key."""
+    return key.rsplit('|', 1)[-1]
+
+
+def default_subscription(dates: List[str]) -> dict:
+    """Suscripción implícita del modo de un solo cliente."""
+    return {
+        'id': 'default',
+        'subscriber': 'default',
+        'chat_id': TELEGRAM_CHAT_ID,
+        'dates': dates,
+        'tag': DEFAULT_VISIT_TAG,
+        'who_id': DEFAULT_WHO_ID,
+        'visitor_num': DEFAULT_VISITOR_NUM,
+        'product_filter': PRODUCT_FILTER
+    }
+
+
+def load_subscriptions() -> List[dict]:
+    """Suscripciones del archivo JSON (en memoria hasta que el archivo cambia)."""
+    return list(_file.read().get('subscriptions', []))
+
+
+def save_subscriptions(subscriptions: List[dict]):
+    """Guarda las suscripciones (escritura atómica)."""
+    _file.write({'subscriptions': subscriptions})
+
+
+def add_subscription(data: dict) -> Tuple[dict, list]:
+    """
+    Valida y agrega una suscripción.
+
+    Las fechas se validan y normalizan igual que en /api/dates: una fecha mal
+    formada no se guarda, y ningún campo de query_key puede contener '|'
+    (su separador).
+
+    Returns:
+        (suscripción creada, valores de 'dates' inválidos)
+
+    Raises:
+        ValueError: Falta chat_id, 'dates' no es una lista, no queda ninguna
+            fecha válida o tag/who_id contienen '|'
+    """
+    chat_id = str(data.get('chat_id', '')).strip()
+    if not chat_id:
+        raise ValueError('chat_id requerido')
+    dates, invalid = expand_date_request({'dates': data.get('dates')})
+    if not dates:
+        raise ValueError('Formato inválido. Use DD/MM/YYYY' if invalid else 'Al menos una fecha requerida')
+
+    tag = str(data.get('tag', DEFAULT_VISIT_TAG))
+    who_id = str(data.get('who_id', DEFAULT_WHO_ID))
+    if '|' in tag or '|' in who_id:
+        raise ValueError("tag y who_id no pueden contener '|'")
+
+    subscription = {
+        'id': uuid.uuid4().hex[:8],
+        'subscriber': data.get('subscriber', chat_id),
+        'chat_id': chat_id,
+        'dates': dates,
+        'tag': tag,
+        'who_id': who_id,
+        'visitor_num': int(data.get('visitor_num', DEFAULT_VISITOR_NUM)),
+        'product_filter': data.get('product_filter', '')
+    }
+    with _lock:
+        subscriptions = load_subscriptions()
+        subscriptions.append(subscription)
+        save_subscriptions(subscriptions)
+    return subscription, invalid
+
+
+def remove_subscription(subscription_id: str) -> bool:
+    """Elimina una suscripción por id."""
+    with _lock:
+        subscriptions = load_subscriptions()
+        remaining = [s for s in subscriptions if s.get('id') != subscription_id]
+        if len(remaining) == len(subscriptions):
+            return False
+        save_subscriptions(remaining)
+    return True
+
+
+def matches_filter(product: dict, product_filter: str) -> bool:
+    """Aplica el filtro de nombre de producto de una suscripción."""
+    if not product_filter:
+        return True
+    return product_filter.lower() in product.get('name', '').lower()
+
+
+class SubscriptionIndex:
+    """Índice query_key -> suscripciones para consultar una vez y repartir."""
+
+    def __init__(self, subscriptions: List[dict]):
+        self.subscriptions = subscriptions
+        self.by_query: Dict[str, List[dict]] = defaultdict(list)
+        for sub in subscriptions:
+            for date in sub.get('dates', []):
+                key = query_key(date.strip(), sub['tag'], str(sub['who_id']), int(sub['visitor_num']))
+                self.by_query[key].append(sub)
+
+    def queries(self) -> List[str]:
+        """Consultas distintas a ejecutar."""
+        return list(self.by_query)
+
+    def queries_by_spec(self) -> Dict[str, List[str]]:
+        """Consultas agrupadas por especificación de búsqueda."""
+        grouped = defaultdict(list)
+        for key in self.by_query:
+            grouped[key.rsplit('|', 1)[0]].append(key)
+        return dict(grouped)
+
+    def spec_priorities(self) -> Dict[str, float]:
+        """Prioridad de cada especificación: número de suscriptores que la usan."""
+        priorities = defaultdict(set)
+        for key, subs in self.by_query.items():
+            priorities[key.rsplit('|', 1)[0]].update(s['id'] for s in subs)
+        return {spec: float(len(ids)) for spec, ids in priorities.items()}
+
+    def fan_out(self, results: Dict[str, List[dict]]) -> Dict[str, Dict[str, List[dict]]]:
+        """
+        Reparte los resultados por suscripción aplicando sus filtros.
+
+        Args:
+            results: {query_key: productos disponibles}
+
+        Returns:
+            {subscription_id: {fecha: productos}}
+        """
+        per_subscription = defaultdict(dict)
+        for key, products in results.items():
+            date = date_of(key)
+            for sub in self.by_query.get(key, []):
+                matched = [p for p in products if matches_filter(p, sub.get('product_filter'))]
+                if matched:
+                    per_subscription[sub['id']][date] = matched
+        return dict(per_subscription)
@@ -30,16 +30,361 @@ CREATE TABLE IF NOT EXISTS alerted_products (
     alerted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Claim alert keys atomically: inserts the candidates and returns only the
+-- ones that were not alerted before (concurrent checks never both get a key)
+CREATE OR REPLACE FUNCTION claim_alerted_products(p_product_keys TEXT[])
+RETURNS TABLE (product_key VARCHAR)
+LANGUAGE sql
+AS $$
+    INSERT INTO alerted_products (product_key, alerted_at)
+    SELECT DISTINCT unnest(p_product_keys), NOW()
+    ON CONFLICT (product_key) DO NOTHING
+    RETURNING alerted_products.product_key;
+$$;
+
+-- Table for upstream request budget counters (hourly 'h:YYYYMMDDHH' and daily 'd:YYYYMMDD' windows)
+CREATE TABLE IF NOT EXISTS request_budget (
+    window_key VARCHAR(20) PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Atomically increment budget windows (shared by every serverless invocation)
+CREATE OR REPLACE FUNCTION increment_request_budget(p_window_keys TEXT[], p_amount INTEGER DEFAULT 1)
+RETURNS SETOF request_budget
+LANGUAGE sql
+AS $$
+    WITH bumped AS (
+        INSERT INTO request_budget (window_key, count, updated_at)
+        SELECT unnest(p_window_keys), p_amount, NOW()
+        ON CONFLICT (window_key) DO UPDATE
+            SET count = request_budget.count + EXCLUDED.count,
+                updated_at = NOW()
+        RETURNING *
+    ),
+    pruned AS (
+        DELETE FROM request_budget
+        WHERE updated_at < NOW() - INTERVAL '2 days'
+    )
+    SELECT * FROM bumped;
+$$;
+
+-- Last upstream query per date, so stateless invocations rotate through the
+-- dates instead of always checking the nearest ones
+CREATE TABLE IF NOT EXISTS date_checks (
+    date VARCHAR(10) PRIMARY KEY,
+    checked_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Table for leader election leases (only the holder runs checks and sends alerts)
+CREATE TABLE IF NOT EXISTS monitor_leases (
+    name VARCHAR(50) PRIMARY KEY,
+    holder VARCHAR(100) NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Acquire or renew a lease atomically; returns true if p_holder owns it
+CREATE OR REPLACE FUNCTION acquire_lease(p_name TEXT, p_holder TEXT, p_ttl_seconds DOUBLE PRECISION)
+RETURNS BOOLEAN
+LANGUAGE sql
+AS $$
+    INSERT INTO monitor_leases (name, holder, expires_at)
+    VALUES (p_name, p_holder, NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (name) DO UPDATE
+        SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+        WHERE monitor_leases.holder = EXCLUDED.holder
+           OR monitor_leases.expires_at < NOW()
+    RETURNING holder = p_holder;
+$$;
+
+-- Acquire or renew several leases at once (per-date shard ownership); returns the names owned by p_holder
+CREATE OR REPLACE FUNCTION acquire_leases(p_names TEXT[], p_holder TEXT, p_ttl_seconds DOUBLE PRECISION)
+RETURNS SETOF TEXT
+LANGUAGE sql
+AS $$
+    INSERT INTO monitor_leases (name, holder, expires_at)
+    SELECT unnest(p_names), p_holder, NOW() + make_interval(secs => p_ttl_seconds)
+    ON CONFLICT (name) DO UPDATE
+        SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+        WHERE monitor_leases.holder = EXCLUDED.holder
+           OR monitor_leases.expires_at < NOW()
+    RETURNING name;
+$$;
+
+-- Table for live shard workers (membership heartbeat with TTL)
+CREATE TABLE IF NOT EXISTS shard_workers (
+    worker_id VARCHAR(100) PRIMARY KEY,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Renew a worker's membership, drop expired workers and return the live ones
+CREATE OR REPLACE FUNCTION shard_heartbeat(p_worker_id TEXT, p_ttl_seconds DOUBLE PRECISION)
+RETURNS SETOF TEXT
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO shard_workers (worker_id, expires_at)
+    VALUES (p_worker_id, NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (worker_id) DO UPDATE SET expires_at = EXCLUDED.expires_at;
+
+    DELETE FROM shard_workers WHERE expires_at < NOW();
+
+    RETURN QUERY SELECT worker_id::TEXT FROM shard_workers ORDER BY worker_id;
+END;
+$$;
+
+-- Status versioning: every update of monitor_status bumps status_version and
+-- records, per date, the version at which its last_results entry changed
+-- (removed dates keep their entry as a tombstone) so /api/status can send
+-- ETags and ?since=<version> deltas
+ALTER TABLE monitor_status ADD COLUMN IF NOT EXISTS status_version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE monitor_status ADD COLUMN IF NOT EXISTS result_versions JSONB NOT NULL DEFAULT '{}';
+ALTER TABLE monitor_status ADD COLUMN IF NOT EXISTS dates_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION bump_status_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    d TEXT;
+BEGIN
+    NEW.status_version := OLD.status_version + 1;
+    NEW.result_versions := COALESCE(OLD.result_versions, '{}');
+    FOR d IN
+        SELECT jsonb_object_keys(COALESCE(NEW.last_results, '{}'))
+        UNION
+        SELECT jsonb_object_keys(COALESCE(OLD.last_results, '{}'))
+    LOOP
+        IF (NEW.last_results -> d) IS DISTINCT FROM (OLD.last_results -> d) THEN
+            NEW.result_versions := jsonb_set(NEW.result_versions, ARRAY[d], to_jsonb(NEW.status_version));
+        END IF;
+    END LOOP;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS monitor_status_version ON monitor_status;
+CREATE TRIGGER monitor_status_version
+    BEFORE UPDATE ON monitor_status
+    FOR EACH ROW EXECUTE FUNCTION bump_status_version();
+
+-- Adding or removing target dates is a status change too
+CREATE OR REPLACE FUNCTION bump_dates_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE monitor_status SET dates_version = status_version + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS target_dates_version ON target_dates;
+CREATE TRIGGER target_dates_version
+    AFTER INSERT OR DELETE ON target_dates
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_dates_version();
+
+-- Store check results and increment counters in one atomic statement
+-- (concurrent checks never lose an increment). NULL results/last_check keep
+-- the stored values, so it also serves plain counter increments.
+CREATE OR REPLACE FUNCTION update_status_with_results(
+    p_last_check TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_last_results JSONB DEFAULT NULL,
+    p_increment_check INTEGER DEFAULT 1,
+    p_increment_alert INTEGER DEFAULT 0
+)
+RETURNS SETOF monitor_status
+LANGUAGE sql
+AS $$
+    INSERT INTO monitor_status (id, check_count, alerts_sent, last_check, last_results, updated_at)
+    VALUES (1, p_increment_check, p_increment_alert, p_last_check, COALESCE(p_last_results, '{}'), NOW())
+    ON CONFLICT (id) DO UPDATE
+        SET check_count = monitor_status.check_count + EXCLUDED.check_count,
+            alerts_sent = monitor_status.alerts_sent + EXCLUDED.alerts_sent,
+            last_check = COALESCE(p_last_check, monitor_status.last_check),
+            last_results = COALESCE(p_last_results, monitor_status.last_results),
+            updated_at = NOW()
+    RETURNING *;
+$$;
+
+-- Dashboard status and target dates in one JSON document (one round trip
+-- for /api/status and /api/stream)
+CREATE OR REPLACE FUNCTION get_status_with_dates()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COALESCE((SELECT to_jsonb(s) FROM monitor_status s WHERE s.id = 1), '{}'::jsonb)
+        || jsonb_build_object('target_dates', COALESCE(
+            (SELECT jsonb_agg(d.date ORDER BY to_date(d.date, 'DD/MM/YYYY'), d.date) FROM target_dates d),
+            '[]'::jsonb
+        ));
+$$;
+
+-- Table for check history (one row per check; entry holds dates checked, availability and alerts)
+CREATE TABLE IF NOT EXISTS check_history (
+    id BIGSERIAL PRIMARY KEY,
+    checked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    entry JSONB NOT NULL
+);
+
+-- Append a check and trim the table to the newest p_keep rows (HISTORY_LIMIT),
+-- like the json and sqlite backends do
+CREATE OR REPLACE FUNCTION add_check_history(p_checked_at TIMESTAMP WITH TIME ZONE, p_entry JSONB, p_keep INTEGER DEFAULT 500)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO check_history (checked_at, entry) VALUES (p_checked_at, p_entry);
+
+    DELETE FROM check_history
+    WHERE id < (
+        SELECT id FROM check_history ORDER BY id DESC OFFSET GREATEST(p_keep, 1) - 1 LIMIT 1
+    );
+END;
+$$;
+
+-- Current availability per date and product. A row is only written when its
+-- state changes (AVAILABLE, LOW_AVAILABILITY, UNAVAILABLE); observed_at is
+-- when the current state was first seen
+CREATE TABLE IF NOT EXISTS availability_snapshot (
+    date VARCHAR(10) NOT NULL,
+    product_id BIGINT NOT NULL,
+    name TEXT,
+    state VARCHAR(20) NOT NULL,
+    observed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    product JSONB NOT NULL DEFAULT '{}',
+    PRIMARY KEY (date, product_id)
+);
+
+-- Compact log of state changes (from_state NULL = first time seen)
+CREATE TABLE IF NOT EXISTS availability_transitions (
+    id BIGSERIAL PRIMARY KEY,
+    date VARCHAR(10) NOT NULL,
+    product_id BIGINT NOT NULL,
+    from_state VARCHAR(20),
+    to_state VARCHAR(20) NOT NULL,
+    observed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Record one check: p_products holds the available products of the checked
+-- dates ([{date, product_id, name, state, product}]). Only rows whose state
+-- changed are upserted (products missing from a checked date become
+-- UNAVAILABLE), each change is logged, and monitor_status.last_results is
+-- rebuilt from the snapshot only when something changed. When p_tracked_dates
+-- is given, dates outside it (no longer watched) leave the snapshot. Returns
+-- the number of snapshot rows changed, so write volume follows changes, not
+-- the size of the watch list.
+DROP FUNCTION IF EXISTS record_availability(TEXT[], JSONB, TIMESTAMP WITH TIME ZONE, BOOLEAN);
+CREATE OR REPLACE FUNCTION record_availability(
+    p_dates TEXT[],
+    p_products JSONB,
+    p_observed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    p_tracked_dates TEXT[] DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changed INTEGER;
+    pruned INTEGER := 0;
+BEGIN
+    WITH incoming AS (
+        SELECT DISTINCT ON (x.date, x.product_id) x.date, x.product_id, x.name, x.state, x.product
+        FROM jsonb_to_recordset(COALESCE(p_products, '[]'))
+            AS x(date TEXT, product_id BIGINT, name TEXT, state TEXT, product JSONB)
+        WHERE x.date = ANY(p_dates)
+    ),
+    observed AS (
+        SELECT i.date, i.product_id, i.name, i.state, i.product FROM incoming i
+        UNION ALL
+        SELECT s.date, s.product_id, s.name, 'UNAVAILABLE', s.product
+        FROM availability_snapshot s
+        WHERE s.date = ANY(p_dates)
+          AND s.state <> 'UNAVAILABLE'
+          AND NOT EXISTS (
+              SELECT 1 FROM incoming i WHERE i.date = s.date AND i.product_id = s.product_id
+          )
+    ),
+    changes AS (
+        SELECT o.date, o.product_id, o.name, o.state, o.product, s.state AS from_state
+        FROM observed o
+        LEFT JOIN availability_snapshot s ON s.date = o.date AND s.product_id = o.product_id
+        WHERE s.state IS DISTINCT FROM o.state
+    ),
+    upserted AS (
+        INSERT INTO availability_snapshot (date, product_id, name, state, observed_at, product)
+        SELECT c.date, c.product_id, c.name, c.state, p_observed_at, COALESCE(c.product, '{}')
+        FROM changes c
+        ON CONFLICT (date, product_id) DO UPDATE
+            SET name = EXCLUDED.name,
+                state = EXCLUDED.state,
+                observed_at = EXCLUDED.observed_at,
+                product = EXCLUDED.product
+    )
+    INSERT INTO availability_transitions (date, product_id, from_state, to_state, observed_at)
+    SELECT c.date, c.product_id, c.from_state, c.state, p_observed_at FROM changes c;
+    GET DIAGNOSTICS changed = ROW_COUNT;
+
+    -- Dates no longer watched leave the snapshot
+    IF p_tracked_dates IS NOT NULL THEN
+        DELETE FROM availability_snapshot s
+        WHERE NOT (s.date = ANY(p_tracked_dates));
+        GET DIAGNOSTICS pruned = ROW_COUNT;
+    END IF;
+
+    IF changed + pruned > 0 THEN
+        UPDATE monitor_status
+        SET last_results = COALESCE((
+                SELECT jsonb_object_agg(a.date, a.products)
+                FROM (
+                    SELECT s.date, jsonb_agg(s.product ORDER BY s.product_id) AS products
+                    FROM availability_snapshot s
+                    WHERE s.state <> 'UNAVAILABLE'
+                    GROUP BY s.date
+                ) a
+            ), '{}'),
+            updated_at = NOW()
+        WHERE id = 1;
+    END IF;
+
+    RETURN changed + pruned;
+END;
+$$;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_target_dates_date ON target_dates(date);
 CREATE INDEX IF NOT EXISTS idx_alerted_products_key ON alerted_products(product_key);
+CREATE INDEX IF NOT EXISTS idx_check_history_checked_at ON check_history(checked_at);
+-- Dashboard: what is available now, by date (only rows that are available)
+CREATE INDEX IF NOT EXISTS idx_availability_snapshot_available
+    ON availability_snapshot(date) WHERE state <> 'UNAVAILABLE';
+-- Dashboard: recent changes, and the history of one date/product
+CREATE INDEX IF NOT EXISTS idx_availability_transitions_observed_at
+    ON availability_transitions(observed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_availability_transitions_product
+    ON availability_transitions(date, product_id, observed_at DESC);
 
 -- Enable Row Level Security (optional, for public access)
 -- ALTER TABLE target_dates ENABLE ROW LEVEL SECURITY;
 -- ALTER TABLE monitor_status ENABLE ROW LEVEL SECURITY;
 -- ALTER TABLE alerted_products ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE request_budget ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE date_checks ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE monitor_leases ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE shard_workers ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE check_history ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE availability_snapshot ENABLE ROW LEVEL SECURITY;
+-- ALTER TABLE availability_transitions ENABLE ROW LEVEL SECURITY;
 
 -- If you want public read/write access (for serverless functions):
 -- CREATE POLICY "Allow all" ON target_dates FOR ALL USING (true);
 -- CREATE POLICY "Allow all" ON monitor_status FOR ALL USING (true);
 -- CREATE POLICY "Allow all" ON alerted_products FOR ALL USING (true);
+-- CREATE POLICY "Allow all" ON request_budget FOR ALL USING (true);
+-- CREATE POLICY "Allow all" ON date_checks FOR ALL USING (true);
+-- CREATE POLICY "Allow all" ON monitor_leases FOR ALL USING (true);
+-- CREATE POLICY "Allow all" ON shard_workers FOR ALL USING (true);
+-- CREATE POLICY "Allow all" ON check_history FOR ALL USING (true);
+-- CREATE POLICY "Allow all" ON availability_snapshot FOR ALL USING (true);
+-- CREATE POLICY "Allow all" ON availability_transitions FOR ALL USING (true);
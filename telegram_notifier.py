@@ -2,52 +2,229 @@
 Notificador de Telegram para alertas de disponibilidad
 """
 import asyncio
+import atexit
+import html
+import re
+import threading
+from concurrent.futures import Future
+from typing import Dict, List
 from telegram import Bot
 from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
 from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 
+# Segundos máximos de espera de los envíos síncronos
+SEND_TIMEOUT_SECONDS = 30
+
+# Telegram rechaza mensajes de más de 4096 caracteres
+MAX_MESSAGE_LENGTH = 4096
+
+# Plantillas de la alerta de disponibilidad (se formatean una vez por línea)
+_ALERT_HEADER = "🎫 <b>¡DISPONIBILIDAD DETECTADA!</b>{part}\n🏛️ Museos Vaticanos\n\n"
+_ALERT_DATE = "📅 <b>{date}</b>\n".format
+_ALERT_PRODUCT = "  {icon} {name}\n".format
+_ALERT_FOOTER = "🔗 <a href='https://tickets.museivaticani.va/home/calendar/visit/MV-Biglietti'>Reservar ahora</a>"
+# Espacio reservado para el sufijo " (n/m)" de los mensajes partidos
+_PART_RESERVE = len(" (99/99)")
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def render_date_blocks(availability_data: dict) -> List[str]:
+    """Un bloque HTML por fecha (título + productos), en una sola pasada."""
+    blocks = []
+    for date, products in availability_data.items():
+        lines = [_ALERT_DATE(date=html.escape(str(date)))]
+        lines.extend(
+            _ALERT_PRODUCT(
+                icon="✅" if product.get('availability') == 'AVAILABLE' else "⚠️",
+                name=html.escape(product.get('name', 'N/A')[:50], quote=False)
+            )
+            for product in products
+        )
+        lines.append("\n")
+        blocks.append(''.join(lines))
+    return blocks
+
+
+def _split_line(line: str, limit: int) -> List[str]:
+    """
+    Parte una sola línea más larga que `limit`. Se pasa a texto plano (sin
+    etiquetas) y se vuelve a escapar por trozos, así ningún corte deja una
+    etiqueta abierta ni una entidad HTML a medias.
+    """
+    pieces, current = [], ''
+    for char in html.unescape(_TAG_RE.sub('', line)):
+        escaped = html.escape(char, quote=False)
+        if len(current) + len(escaped) > limit:
+            pieces.append(current)
+            current = ''
+        current += escaped
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_block(block: str, limit: int) -> List[str]:
+    """Parte un bloque demasiado largo por líneas (una fecha con muchísimos productos)."""
+    pieces, current = [], ''
+    for line in block.splitlines(keepends=True):
+        for part in (_split_line(line, limit) if len(line) > limit else [line]):
+            if current and len(current) + len(part) > limit:
+                pieces.append(current)
+                current = ''
+            current += part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_alert(blocks: List[str], limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    Agrupa los bloques por fecha en mensajes de como máximo `limit` caracteres.
+
+    Los cortes se hacen entre fechas; cada mensaje lleva cabecera (numerada si
+    hay más de uno) y el enlace de reserva va en el último.
+    """
+    room = limit - len(_ALERT_HEADER.format(part='')) - _PART_RESERVE
+    bodies, current = [], []
+    current_len = 0
+    for block in blocks:
+        for piece in (_split_block(block, room) if len(block) > room else [block]):
+            if current and current_len + len(piece) > room:
+                bodies.append(current)
+                current, current_len = [], 0
+            current.append(piece)
+            current_len += len(piece)
+    if current:
+        bodies.append(current)
+    if not bodies:
+        return []
+
+    # El pie va en el último mensaje, o en uno propio si no cabe
+    if current_len + len(_ALERT_FOOTER) > room:
+        bodies.append([])
+    bodies[-1].append(_ALERT_FOOTER)
+
+    total = len(bodies)
+    return [
+        _ALERT_HEADER.format(part=f" ({i}/{total})" if total > 1 else '') + ''.join(body)
+        for i, body in enumerate(bodies, 1)
+    ]
+
+
+class _BotRunner:
+    """
+    Bot de Telegram de larga duración sobre un event loop en un hilo dedicado.
+
+    Se inicializa una sola vez y reutiliza su pool de conexiones HTTP, así que
+    cada mensaje cuesta una petición en lugar de abrir y cerrar el cliente.
+    """
+
+    def __init__(self, token: str):
+        self.loop = asyncio.new_event_loop()
+        self.bot = Bot(token=token, request=HTTPXRequest(connection_pool_size=8))
+        self._initialized = False
+        self._thread = threading.Thread(target=self.loop.run_forever, name='telegram-bot', daemon=True)
+        self._thread.start()
+
+    def submit(self, chat_id: str, text: str, parse_mode: str, raise_errors: bool = False) -> Future:
+        """
+        Programa un envío desde cualquier hilo.
+
+        El futuro resuelve a True/False, o propaga el TelegramError si
+        raise_errors=True (para que la cola pueda respetar retry_after).
+        """
+        async def _send():
+            try:
+                if not self._initialized:
+                    await self.bot.initialize()
+                    self._initialized = True
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return True
+            except TelegramError as e:
+                if raise_errors:
+                    raise
+                print(f"Error enviando mensaje Telegram: {e}")
+                return False
+
+        return asyncio.run_coroutine_threadsafe(_send(), self.loop)
+
+    def close(self):
+        """Cierra el cliente HTTP y detiene el loop."""
+        try:
+            asyncio.run_coroutine_threadsafe(self.bot.shutdown(), self.loop).result(timeout=5)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+# Un runner por token, compartido por todos los notificadores (uno por chat)
+_runners: Dict[str, _BotRunner] = {}
+_runners_lock = threading.Lock()
+
+
+def _get_runner(token: str) -> _BotRunner:
+    with _runners_lock:
+        if token not in _runners:
+            _runners[token] = _BotRunner(token)
+        return _runners[token]
+
+
+@atexit.register
+def _close_runners():
+    with _runners_lock:
+        for runner in _runners.values():
+            runner.close()
+        _runners.clear()
+
+
+def render_availability_alert(availability_data: dict) -> str:
+    """Alerta completa en un solo mensaje (canales sin límite de longitud)."""
+    return (_ALERT_HEADER.format(part='') + ''.join(render_date_blocks(availability_data))
+            + _ALERT_FOOTER)
+
 
 class TelegramNotifier:
-    def __init__(self, bot_token: str = None, chat_id: str = None):
+    def __init__(self, bot_token: str = None, chat_id: str = None, queue=None):
+        """
+        Args:
+            queue: NotificationQueue opcional; si se indica, los mensajes se
+                encolan y se envían en segundo plano con límites y reintentos
+        """
         self.bot_token = bot_token or TELEGRAM_BOT_TOKEN
         self.chat_id = chat_id or TELEGRAM_CHAT_ID
+        self.queue = queue
 
     def is_configured(self) -> bool:
         """Verifica si el bot está configurado correctamente."""
         return bool(self.bot_token and self.chat_id)
 
-    def send_message(self, message: str, parse_mode: str = 'HTML') -> bool:
-        """Envía mensaje de forma síncrona."""
+    def submit(self, message: str, parse_mode: str = 'HTML') -> Future:
+        """
+        Envía mensaje de forma asíncrona (seguro desde cualquier hilo).
+
+        Returns:
+            Future que resuelve a True si se envió, False si hubo error
+        """
         if not self.is_configured():
             print("⚠️ Telegram no configurado. Configura TELEGRAM_BOT_TOKEN y TELEGRAM_CHAT_ID")
-            return False
+            future = Future()
+            future.set_result(False)
+            return future
 
-        async def _send():
-            bot = Bot(token=self.bot_token)
-            try:
-                await bot.send_message(
-                    chat_id=self.chat_id,
-                    text=message,
-                    parse_mode=parse_mode
-                )
-                return True
-            except TelegramError as e:
-                print(f"Error enviando mensaje Telegram: {e}")
-                return False
-            finally:
-                await bot.close()
+        return _get_runner(self.bot_token).submit(self.chat_id, message, parse_mode)
+
+    def send_message(self, message: str, parse_mode: str = 'HTML', kind: str = 'message') -> bool:
+        """
+        Envía mensaje de forma síncrona (o lo encola si hay cola).
 
+        Con cola, True significa que el mensaje quedó guardado para su envío.
+        """
+        if self.queue is not None and self.is_configured():
+            self.queue.enqueue(self.chat_id, message, parse_mode, kind)
+            return True
         try:
-            # Crear nuevo event loop si es necesario
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_closed():
-                    raise RuntimeError("Event loop closed")
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-
-            return loop.run_until_complete(_send())
+            return self.submit(message, parse_mode).result(timeout=SEND_TIMEOUT_SECONDS)
         except Exception as e:
             print(f"Error enviando mensaje Telegram: {e}")
             return False
@@ -68,20 +245,9 @@ class TelegramNotifier:
         if not availability_data:
             return False
 
-        message = "🎫 <b>¡DISPONIBILIDAD DETECTADA!</b>\n"
-        message += "🏛️ Museos Vaticanos\n\n"
-
-        for date, products in availability_data.items():
-            message += f"📅 <b>{date}</b>\n"
-            for product in products:
-                status_icon = "✅" if product.get('availability') == 'AVAILABLE' else "⚠️"
-                name = product.get('name', 'N/A')[:50]
-                message += f"  {status_icon} {name}\n"
-            message += "\n"
-
-        message += "🔗 <a href='https://tickets.museivaticani.va/home/calendar/visit/MV-Biglietti'>Reservar ahora</a>"
-
-        return self.send_message(message)
+        # Mensajes partidos entre fechas si superan el límite de Telegram, en orden
+        chunks = chunk_alert(render_date_blocks(availability_data))
+        return all([self.send_message(chunk, kind='alert') for chunk in chunks])
 
     def send_status_update(self, message: str) -> bool:
         """Envía actualización de estado."""
@@ -89,7 +255,7 @@ class TelegramNotifier:
 
     def send_error_alert(self, error: str) -> bool:
         """Envía alerta de error."""
-        return self.send_message(f"❌ <b>Error:</b> {error}")
+        return self.send_message(f"❌ <b>Error:</b> {html.escape(str(error))}")
 
     def send_periodic_summary(self, status: dict) -> bool:
         """
@@ -98,38 +264,43 @@ class TelegramNotifier:
         Args:
             status: dict con el estado actual del monitor
         """
-        from datetime import datetime
-
-        message = "📊 <b>Resumen del Monitor</b>\n"
-        message += f"🕐 {datetime.now().strftime('%d/%m/%Y %H:%M')}\n\n"
-
-        # Estadísticas
-        message += f"🔄 Verificaciones: {status.get('check_count', 0)}\n"
-        message += f"🔔 Alertas enviadas: {status.get('alerts_sent', 0)}\n"
-        message += f"📅 Fechas monitoreando: {len(status.get('target_dates', []))}\n"
-
-        # Fechas configuradas
-        target_dates = status.get('target_dates', [])
-        if target_dates:
-            message += f"\n📌 <b>Fechas objetivo:</b>\n"
-            for date in target_dates[:5]:  # Máximo 5 fechas para no hacer muy largo
-                message += f"  • {date}\n"
-            if len(target_dates) > 5:
-                message += f"  ... y {len(target_dates) - 5} más\n"
-
-        # Última disponibilidad encontrada
-        last_results = status.get('last_results', {})
-        if last_results:
-            message += f"\n✅ <b>Última disponibilidad:</b>\n"
-            for date, products in list(last_results.items())[:3]:
-                message += f"  📅 {date}: {len(products)} producto(s)\n"
-        else:
-            message += f"\n⏳ Sin disponibilidad encontrada aún\n"
-
-        message += f"\n⚙️ Intervalo: cada {status.get('interval_seconds', 1800)//60} min"
-        message += f"\n🟢 Monitor activo"
-
-        return self.send_message(message)
+        return self.send_message(render_periodic_summary(status))
+
+
+def render_periodic_summary(status: dict) -> str:
+    """Resumen periódico del estado del monitor (HTML de Telegram)."""
+    from datetime import datetime
+
+    message = "📊 <b>Resumen del Monitor</b>\n"
+    message += f"🕐 {datetime.now().strftime('%d/%m/%Y %H:%M')}\n\n"
+
+    # Estadísticas
+    message += f"🔄 Verificaciones: {status.get('check_count', 0)}\n"
+    message += f"🔔 Alertas enviadas: {status.get('alerts_sent', 0)}\n"
+    message += f"📅 Fechas monitoreando: {len(status.get('target_dates', []))}\n"
+
+    # Fechas configuradas
+    target_dates = status.get('target_dates', [])
+    if target_dates:
+        message += f"\n📌 <b>Fechas objetivo:</b>\n"
+        for date in target_dates[:5]:  # Máximo 5 fechas para no hacer muy largo
+            message += f"  • {date}\n"
+        if len(target_dates) > 5:
+            message += f"  ... y {len(target_dates) - 5} más\n"
+
+    # Última disponibilidad encontrada
+    last_results = status.get('last_results', {})
+    if last_results:
+        message += f"\n✅ <b>Última disponibilidad:</b>\n"
+        for date, products in list(last_results.items())[:3]:
+            message += f"  📅 {date}: {len(products)} producto(s)\n"
+    else:
+        message += f"\n⏳ Sin disponibilidad encontrada aún\n"
+
+    message += f"\n⚙️ Intervalo: cada {status.get('interval_seconds', 1800)//60} min"
+    message += f"\n🟢 Monitor activo"
+
+    return message
 
 
 # Test
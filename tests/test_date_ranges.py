@@ -0,0 +1,59 @@
+import pytest
+
+from config import MAX_BULK_DATES
+from date_ranges import expand_date_request, literal_dates, parse_weekdays
+
+
+def test_single_and_list_are_normalized_and_deduplicated():
+    dates, invalid = expand_date_request({
+        'date': '2/3/2027',
+        'dates': ['01/03/2027', '02/03/2027', 'mañana', '31/02/2027'],
+    })
+    assert dates == ['01/03/2027', '02/03/2027']
+    assert invalid == ['mañana', '31/02/2027']
+
+
+def test_range_is_inclusive():
+    dates, _ = expand_date_request({'from': '28/02/2027', 'to': '02/03/2027'})
+    assert dates == ['28/02/2027', '01/03/2027', '02/03/2027']
+
+
+def test_month_with_weekdays():
+    # Marzo de 2027 empieza en lunes: sus martes son 2, 9, 16, 23 y 30
+    dates, _ = expand_date_request({'month': '03/2027', 'weekdays': ['martes']})
+    assert dates == ['02/03/2027', '09/03/2027', '16/03/2027', '23/03/2027', '30/03/2027']
+
+
+def test_ranges_are_merged_and_sorted():
+    dates, _ = expand_date_request({
+        'ranges': [
+            {'from': '10/03/2027', 'to': '11/03/2027'},
+            {'from': '01/03/2027', 'to': '01/03/2027'},
+            {'from': '11/03/2027', 'to': '12/03/2027'},
+        ]
+    })
+    assert dates == ['01/03/2027', '10/03/2027', '11/03/2027', '12/03/2027']
+
+
+def test_weekday_names_in_several_languages():
+    assert parse_weekdays(['lunes', 'Tue', 'mercoledì', 6]) == {0, 1, 2, 6}
+    assert parse_weekdays(None) is None
+    with pytest.raises(ValueError):
+        parse_weekdays(['festivo'])
+
+
+@pytest.mark.parametrize('body', [
+    {'dates': '01/03/2027'},
+    {'from': '05/03/2027', 'to': '01/03/2027'},
+    {'month': '13/2027'},
+    {'ranges': ['01/03/2027']},
+    {'from': '01/01/2027', 'to': '01/01/2030'},
+    {'dates': ['01/03/2027'] * (MAX_BULK_DATES + 1)},
+])
+def test_malformed_requests_are_rejected(body):
+    with pytest.raises(ValueError):
+        expand_date_request(body)
+
+
+def test_literal_dates_keep_raw_values():
+    assert literal_dates({'date': ' 1/3/2027 ', 'dates': ['x']}) == ['x', '1/3/2027']
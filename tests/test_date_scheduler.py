@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+from date_scheduler import DateScheduler, urgency_weight
+
+
+def in_days(days):
+    return (datetime.now().date() + timedelta(days=days)).strftime('%d/%m/%Y')
+
+
+def run_cycle(scheduler, dates, limit=None):
+    selected = scheduler.select(dates, limit)
+    for date in selected:
+        scheduler.mark_checked(date)
+    return selected
+
+
+def test_urgency_weight():
+    assert urgency_weight(in_days(3)) == 3.0
+    assert urgency_weight(in_days(20)) == 2.0
+    assert urgency_weight(in_days(90)) == 1.0
+    assert urgency_weight(in_days(-1)) == 1.0
+    assert urgency_weight('no es una fecha') == 1.0
+
+
+def test_select_all_when_no_cap():
+    dates = [in_days(d) for d in (40, 50, 60)]
+    scheduler = DateScheduler(max_per_cycle=0, interval_seconds=60)
+    assert sorted(run_cycle(scheduler, dates)) == sorted(dates)
+
+
+def test_rotation_respects_staleness_bound():
+    dates = [in_days(d) for d in range(1, 11)]
+    scheduler = DateScheduler(max_per_cycle=4, interval_seconds=60)
+    bound = scheduler.max_staleness_cycles(len(dates))
+    last_seen = {}
+
+    for cycle in range(1, 31):
+        selected = run_cycle(scheduler, dates)
+        assert len(selected) == 4
+        for date in selected:
+            last_seen[date] = cycle
+        if cycle >= bound:
+            # Ninguna fecha pasa más de `bound` ciclos sin consultarse
+            assert all(cycle - last_seen.get(d, 0) < bound for d in dates)
+
+
+def test_priority_slots_prefer_near_dates():
+    far_a, far_b, near = in_days(90), in_days(120), in_days(2)
+    dates = [far_a, far_b, near]
+    scheduler = DateScheduler(max_per_cycle=2, interval_seconds=60)
+    checked_at = datetime.now() - timedelta(minutes=5)
+    scheduler.restore({date: checked_at for date in dates})
+
+    # Misma antigüedad: el hueco de rotación va al primero y el de prioridad a la cercana
+    assert scheduler.select(dates) == [far_a, near]
+
+
+def test_limit_overrides_cap():
+    dates = [in_days(d) for d in range(40, 46)]
+    scheduler = DateScheduler(max_per_cycle=4, interval_seconds=60)
+    assert len(scheduler.select(dates, 1)) == 1
+    assert len(scheduler.select(dates)) == 4
+
+
+def test_restore_orders_by_elapsed_time():
+    dates = [in_days(d) for d in (40, 50, 60)]
+    now = datetime.now()
+    scheduler = DateScheduler(max_per_cycle=1, interval_seconds=60)
+    scheduler.restore({
+        dates[0]: now - timedelta(minutes=1),
+        dates[1]: now - timedelta(minutes=10),
+        dates[2]: now - timedelta(minutes=5),
+    }, now)
+
+    # Invocaciones sin estado: cada una restaura y consulta la fecha más antigua
+    assert scheduler.select(dates) == [dates[1]]
+
+
+def test_restore_keeps_rotating_across_invocations():
+    dates = [in_days(d) for d in (40, 50, 60)]
+    checked = {}
+    now = datetime.now()
+    order = []
+    for step in range(6):
+        now += timedelta(minutes=1)
+        scheduler = DateScheduler(max_per_cycle=1, interval_seconds=60)
+        scheduler.restore(checked, now)
+        selected = scheduler.select(dates)
+        order.extend(selected)
+        checked.update({date: now for date in selected})
+
+    assert sorted(order[:3]) == sorted(dates)
+    assert order[3:] == order[:3]
+
+
+def test_forgets_removed_dates():
+    dates = [in_days(d) for d in (40, 50)]
+    scheduler = DateScheduler(max_per_cycle=0, interval_seconds=60)
+    run_cycle(scheduler, dates)
+    scheduler.select(dates[:1])
+    assert set(scheduler.get_status(dates[:1])['last_checked']) == {dates[0]}
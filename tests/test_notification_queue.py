@@ -0,0 +1,140 @@
+import sqlite3
+import time
+from concurrent.futures import Future
+
+import pytest
+from telegram.error import Forbidden, NetworkError, RetryAfter
+
+import notification_queue
+from notification_queue import CLAIM_SECONDS, DIGEST_SEPARATOR, NotificationQueue
+from telegram_notifier import MAX_MESSAGE_LENGTH
+
+
+class FakeRunner:
+    """Sustituye al bot: guarda lo enviado o falla con los errores indicados."""
+
+    def __init__(self):
+        self.sent = []
+        self.errors = []
+
+    def submit(self, chat_id, text, parse_mode, raise_errors=False):
+        future = Future()
+        if self.errors:
+            future.set_exception(self.errors.pop(0))
+        else:
+            self.sent.append((chat_id, text))
+            future.set_result(True)
+        return future
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    fake = FakeRunner()
+    monkeypatch.setattr(notification_queue, '_get_runner', lambda token: fake)
+    return fake
+
+
+def make_queue(tmp_path, **kwargs):
+    options = {'per_chat_interval': 0, 'global_per_second': 1000, 'max_attempts': 3}
+    options.update(kwargs)
+    return NotificationQueue(path=str(tmp_path / 'queue.db'), bot_token='token', **options)
+
+
+def next_attempts(queue):
+    with sqlite3.connect(queue.path) as conn:
+        return conn.execute('SELECT attempts, next_attempt_at FROM notifications').fetchall()
+
+
+def test_alerts_for_one_chat_become_a_digest(tmp_path, runner):
+    queue = make_queue(tmp_path)
+    queue.enqueue('1', 'alerta A', kind='alert')
+    queue.enqueue('1', 'alerta B', kind='alert')
+    queue.enqueue('2', 'alerta C', kind='alert')
+    queue.enqueue('1', 'mensaje', kind='message')
+
+    assert queue.process_due() == 3
+    assert queue.pending_count() == 0
+    texts = {chat_id: [] for chat_id, _ in runner.sent}
+    for chat_id, text in runner.sent:
+        texts[chat_id].append(text)
+    digest = next(t for t in texts['1'] if '2 alertas pendientes' in t)
+    assert digest.endswith('alerta A' + DIGEST_SEPARATOR + 'alerta B')
+    assert 'mensaje' in texts['1']
+    assert texts['2'] == ['alerta C']
+
+
+def test_digest_never_exceeds_message_limit(tmp_path, runner):
+    queue = make_queue(tmp_path)
+    for i in range(5):
+        queue.enqueue('1', str(i) * 1500, kind='alert')
+
+    queue.process_due()
+    assert len(runner.sent) > 1
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for _, text in runner.sent)
+    # Cada alerta sale una sola vez
+    for i in range(5):
+        assert sum(text.count(str(i) * 1500) for _, text in runner.sent) == 1
+
+
+def test_network_error_is_retried_with_backoff(tmp_path, runner):
+    queue = make_queue(tmp_path)
+    queue.enqueue('1', 'hola')
+    runner.errors = [NetworkError('caído')]
+
+    before = time.time()
+    queue.process_due()
+    [(attempts, next_attempt_at)] = next_attempts(queue)
+    assert attempts == 1
+    assert next_attempt_at >= before + 5
+    assert runner.sent == []
+
+
+# python-telegram-bot avisa del futuro cambio de tipo de retry_after (int -> timedelta)
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')
+def test_retry_after_does_not_count_as_attempt(tmp_path, runner):
+    queue = make_queue(tmp_path)
+    queue.enqueue('1', 'hola')
+    runner.errors = [RetryAfter(30)]
+
+    before = time.time()
+    queue.process_due()
+    [(attempts, next_attempt_at)] = next_attempts(queue)
+    assert attempts == 0
+    assert next_attempt_at >= before + 30
+
+
+def test_dropped_after_max_attempts(tmp_path, runner):
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.enqueue('1', 'hola')
+    runner.errors = [NetworkError('caído'), NetworkError('caído')]
+
+    queue.process_due()
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute('UPDATE notifications SET next_attempt_at = 0')
+    queue.process_due()
+    assert queue.pending_count() == 0
+    assert queue.failed_count == 1
+
+
+def test_forbidden_is_dropped_without_retry(tmp_path, runner):
+    queue = make_queue(tmp_path)
+    queue.enqueue('1', 'hola')
+    runner.errors = [Forbidden('bloqueado')]
+
+    queue.process_due()
+    assert queue.pending_count() == 0
+    assert queue.failed_count == 1
+
+
+def test_claim_is_exclusive_between_queues(tmp_path, runner):
+    first, second = make_queue(tmp_path), make_queue(tmp_path)
+    ids = [first.enqueue('1', f'mensaje {i}') for i in range(3)]
+
+    before = time.time()
+    assert first._claim(ids) == set(ids)
+    assert second._claim(ids) == set()
+    assert all(t >= before + CLAIM_SECONDS for _, t in next_attempts(first))
+
+    # Lo ya reclamado por otro proceso no se envía dos veces
+    second.process_due()
+    assert runner.sent == []
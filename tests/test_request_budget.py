@@ -0,0 +1,50 @@
+from request_budget import RequestBudget
+
+
+class MemoryBudgetStore:
+    def load(self, keys):
+        return {}
+
+    def add(self, keys, amount):
+        return {}
+
+
+def make_budget():
+    return RequestBudget(store=MemoryBudgetStore(), per_hour=0, per_day=0)
+
+
+def test_allocate_uses_whole_total():
+    budget = make_budget()
+    priorities = {'a': 3, 'b': 1, 'c': 1}
+    for _ in range(10):
+        assert sum(budget.allocate(priorities, 4).values()) == 4
+
+
+def test_allocate_reaches_every_spec_when_total_is_smaller():
+    budget = make_budget()
+    priorities = {'a': 3, 'b': 1, 'c': 1, 'd': 1, 'e': 1, 'f': 1, 'g': 1}
+    checked = {key: 0 for key in priorities}
+    cycles = 9  # una vuelta completa: 9 unidades de prioridad, 5 consultas por ciclo
+
+    for _ in range(cycles):
+        allocation = budget.allocate(priorities, 5)
+        assert sum(allocation.values()) == 5
+        for key, count in allocation.items():
+            checked[key] += count
+
+    assert all(count > 0 for count in checked.values())
+    # Proporcional a la prioridad a lo largo de la vuelta
+    assert checked['a'] == 15
+    assert all(checked[key] == 5 for key in 'bcdefg')
+
+
+def test_allocate_with_changing_specs_never_exceeds_total():
+    budget = make_budget()
+    budget.allocate({'a': 1, 'b': 1, 'c': 1}, 1)
+    budget.allocate({'a': 1, 'b': 1, 'c': 1}, 1)
+    for _ in range(5):
+        assert sum(budget.allocate({'a': 5, 'c': 1}, 1).values()) == 1
+
+
+def test_allocate_without_limit():
+    assert make_budget().allocate({'a': 1, 'b': 2}, -1) == {'a': -1, 'b': -1}
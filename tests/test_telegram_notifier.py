@@ -0,0 +1,56 @@
+import html
+import re
+
+from telegram_notifier import (
+    MAX_MESSAGE_LENGTH,
+    _split_line,
+    chunk_alert,
+    render_availability_alert,
+    render_date_blocks,
+)
+
+
+def availability(num_dates, products_per_date, name='Biglietti d\'ingresso'):
+    return {
+        f'{day:02d}/03/2027': [
+            {'name': f'{name} {i}', 'availability': 'AVAILABLE'} for i in range(products_per_date)
+        ]
+        for day in range(1, num_dates + 1)
+    }
+
+
+def test_short_alert_is_a_single_message():
+    messages = chunk_alert(render_date_blocks(availability(2, 3)))
+    assert len(messages) == 1
+    assert messages[0] == render_availability_alert(availability(2, 3))
+    assert 'Reservar ahora' in messages[0]
+
+
+def test_long_alert_is_split_between_dates():
+    blocks = render_date_blocks(availability(60, 12))
+    messages = chunk_alert(blocks)
+
+    assert len(messages) > 1
+    assert all(len(m) <= MAX_MESSAGE_LENGTH for m in messages)
+    assert messages[0].splitlines()[0].endswith(f'(1/{len(messages)})')
+    # Ninguna fecha queda partida y el enlace va solo en el último
+    assert all(sum(block in m for m in messages) == 1 for block in blocks)
+    assert ['Reservar ahora' in m for m in messages] == [False] * (len(messages) - 1) + [True]
+
+
+def test_oversized_date_is_split_by_lines():
+    messages = chunk_alert(render_date_blocks(availability(1, 400)))
+    assert len(messages) > 1
+    assert all(len(m) <= MAX_MESSAGE_LENGTH for m in messages)
+    assert sum(m.count('✅') for m in messages) == 400
+
+
+def test_split_line_keeps_entities_whole():
+    line = '<b>' + html.escape('<&>' * 2000, quote=False) + '</b>\n'
+    pieces = _split_line(line, 100)
+
+    assert all(len(p) <= 100 for p in pieces)
+    assert all('<b>' not in p for p in pieces)
+    # Cada trozo termina en una entidad completa o en un carácter normal
+    assert all(not re.search(r'&[a-z]*$', p) for p in pieces)
+    assert html.unescape(''.join(pieces)) == '<&>' * 2000 + '\n'
@@ -0,0 +1,126 @@
+"""
+Caché de horarios por (fecha, producto) con refresco en segundo plano
+
+El desglose por fecha del dashboard pide los horarios en cada clic. Las
+entradas se sirven desde memoria mientras tienen menos de TIMESLOT_CACHE_TTL
+segundos; una entrada vencida pero reciente (menos de TIMESLOT_MAX_STALE) se
+devuelve tal cual y se refresca en segundo plano. Solo una petición por clave
+está en vuelo a la vez. El producto por defecto de cada fecha pasa por la misma
+caché, así que varios clics simultáneos comparten también esa consulta.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from config import TIMESLOT_CACHE_TTL, TIMESLOT_MAX_STALE, DEFAULT_VISITOR_NUM
+
+
+class TimeslotCache:
+    """Caché TTL de horarios con refresco asíncrono."""
+
+    def __init__(self, client, ttl_seconds: float = TIMESLOT_CACHE_TTL,
+                 max_stale_seconds: float = TIMESLOT_MAX_STALE):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._entries: Dict[Tuple, Tuple[float, dict]] = {}
+        self._inflight: Dict[Tuple, threading.Event] = {}
+        self._products: Dict[Tuple, Tuple[float, Optional[int]]] = {}
+        self._lock = threading.Lock()
+
+    def default_product(self, date: str, product_filter: str = None,
+                        visitor_num: int = DEFAULT_VISITOR_NUM) -> Optional[int]:
+        """Primer producto disponible de una fecha (misma caché y petición única que get)."""
+        key = ('product', date, product_filter, visitor_num)
+        entry = self._lookup(self._products, key, self._fetch_product)
+        return entry[1] if entry else None
+
+    def _fetch_timeslots(self, key: Tuple):
+        """Consulta la API y guarda el resultado (los errores no se cachean)."""
+        date, product_id, visitor_num = key
+        data = self.client.get_timeslots(date, product_id, visitor_num)
+        if 'error' not in data:
+            with self._lock:
+                self._entries[key] = (time.time(), data)
+
+    def _fetch_product(self, key: Tuple):
+        """Consulta los productos disponibles y guarda el primero."""
+        _, date, product_filter, visitor_num = key
+        products = self.client.get_available_products(
+            visit_date=date, visitor_num=visitor_num, product_filter=product_filter
+        )
+        with self._lock:
+            self._products[key] = (time.time(), products[0].get('id') if products else None)
+
+    def _fetch(self, key: Tuple, fetch: Callable[[Tuple], None]):
+        """Ejecuta la consulta de una clave y libera a quienes la esperan."""
+        try:
+            fetch(key)
+            self.purge()
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key)
+            event.set()
+
+    def _start_fetch(self, key: Tuple, fetch: Callable[[Tuple], None], background: bool) -> threading.Event:
+        """Lanza (o reutiliza) la petición en vuelo para una clave."""
+        with self._lock:
+            event = self._inflight.get(key)
+            if event is not None:
+                return event
+            event = self._inflight[key] = threading.Event()
+
+        if background:
+            threading.Thread(target=self._fetch, args=(key, fetch), daemon=True).start()
+        else:
+            self._fetch(key, fetch)
+        return event
+
+    def _lookup(self, entries: Dict[Tuple, Tuple[float, object]], key: Tuple,
+                fetch: Callable[[Tuple], None]) -> Optional[Tuple[float, object, bool]]:
+        """
+        Entrada fresca, vencida-pero-reciente (refrescándose en segundo plano) o
+        recién consultada de una caché.
+
+        Returns:
+            (cached_at, valor, stale), o None si la consulta falló
+        """
+        with self._lock:
+            entry = entries.get(key)
+
+        age = time.time() - entry[0] if entry else None
+        if entry and age < self.ttl_seconds:
+            return entry[0], entry[1], False
+
+        if entry and age < self.max_stale_seconds:
+            self._start_fetch(key, fetch, background=True)
+            return entry[0], entry[1], True
+
+        self._start_fetch(key, fetch, background=False).wait(timeout=60)
+        with self._lock:
+            entry = entries.get(key)
+        if entry is None:
+            return None
+        return entry[0], entry[1], False
+
+    def get(self, date: str, product_id: int, visitor_num: int = DEFAULT_VISITOR_NUM) -> Optional[dict]:
+        """
+        Horarios de un producto para una fecha.
+
+        Returns:
+            dict con 'timetable', 'cached_at' y 'stale', o None si la API falló
+        """
+        key = (date, product_id, visitor_num)
+        entry = self._lookup(self._entries, key, self._fetch_timeslots)
+        if entry is None:
+            return None
+        cached_at, data, stale = entry
+        return {**data, 'cached_at': cached_at, 'stale': stale}
+
+    def purge(self):
+        """Descarta las entradas demasiado viejas para servirse."""
+        cutoff = time.time() - self.max_stale_seconds
+        with self._lock:
+            for key in [k for k, (t, _) in self._entries.items() if t < cutoff]:
+                del self._entries[key]
+            for key in [k for k, (t, _) in self._products.items() if t < cutoff]:
+                del self._products[key]
@@ -7,6 +7,7 @@ import requests
 import random
 import time
 from typing import Optional, List, Dict
+from request_budget import request_budget
 from config import (
     VATICAN_API_BASE,
     DEFAULT_VISIT_TAG,
@@ -36,6 +37,7 @@ class WebshareProxyManager:
         self.api_key = api_key
         self.proxies = []
         self.current_index = 0
+        self.partition = (0, 1)  # (índice, total) del subconjunto asignado a este worker
 
     def fetch_proxies(self) -> bool:
         """Obtiene lista de proxies desde Webshare API."""
@@ -68,13 +70,24 @@ class WebshareProxyManager:
             print(f"Error obteniendo proxies de Webshare: {e}")
             return False
 
+    def set_partition(self, index: int, count: int):
+        """Restringe la rotación al subconjunto de proxies de un worker (sharding)."""
+        self.partition = (index, max(1, count))
+        self.current_index = 0
+
+    def _partition_proxies(self) -> List[dict]:
+        """Proxies asignados a este worker (todos si hay menos proxies que workers)."""
+        index, count = self.partition
+        return self.proxies[index::count] or self.proxies
+
     def get_random_proxy(self) -> Optional[dict]:
         """Retorna un proxy aleatorio."""
         if not self.proxies:
             self.fetch_proxies()
 
-        if self.proxies:
-            proxy = random.choice(self.proxies)
+        proxies = self._partition_proxies()
+        if proxies:
+            proxy = random.choice(proxies)
             return {'http': proxy['http'], 'https': proxy['https']}
         return None
 
@@ -83,22 +96,54 @@ class WebshareProxyManager:
         if not self.proxies:
             self.fetch_proxies()
 
-        if self.proxies:
-            proxy = self.proxies[self.current_index]
-            self.current_index = (self.current_index + 1) % len(self.proxies)
+        proxies = self._partition_proxies()
+        if proxies:
+            proxy = proxies[self.current_index % len(proxies)]
+            self.current_index = (self.current_index + 1) % len(proxies)
             print(f"Usando proxy: {proxy['address']} ({proxy['country']})")
             return {'http': proxy['http'], 'https': proxy['https']}
         return None
 
 
+def filter_products(visits: List[Dict], product_filter: str = None) -> List[Dict]:
+    """
+    Filtra los productos disponibles (AVAILABLE o LOW_AVAILABILITY).
+
+    Args:
+        visits: Productos devueltos por resultPerTag
+        product_filter: Filtro opcional para el nombre del producto
+    """
+    # Productos a excluir
+    excluded_products = ['palazzo papale', 'castel gandolfo']
+
+    available = []
+    for visit in visits:
+        availability = visit.get('availability', '')
+        if availability in ['AVAILABLE', 'LOW_AVAILABILITY']:
+            name = visit.get('name', '').lower()
+
+            # Excluir productos no deseados
+            if any(excluded in name for excluded in excluded_products):
+                continue
+
+            # Aplicar filtro de producto si existe
+            if product_filter:
+                if product_filter.lower() not in name:
+                    continue
+            available.append(visit)
+
+    return available
+
+
 # Instancia global del gestor de proxies
 proxy_manager = WebshareProxyManager(WEBSHARE_API_KEY) if WEBSHARE_API_KEY else None
 
 
 class VaticanClient:
-    def __init__(self):
+    def __init__(self, budget=None):
         self.session = requests.Session()
         self.proxy_manager = proxy_manager
+        self.budget = budget or request_budget
         self._rotate_proxy()
         self._update_headers()
         self._init_session()
@@ -125,12 +170,17 @@ class VaticanClient:
             'Sec-Fetch-Site': 'same-origin',
         })
 
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """GET contra la API del Vaticano, contabilizado en el presupuesto."""
+        self.budget.record()
+        return self.session.get(url, **kwargs)
+
     def _init_session(self):
         """Inicializa sesión visitando la página para obtener cookies."""
         try:
             # Visitar página principal para obtener JSESSIONID
             self.session.headers['Accept'] = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
-            response = self.session.get(f'{BASE_URL}/home', timeout=30)
+            response = self._get(f'{BASE_URL}/home', timeout=30)
 
             # Restaurar Accept para API
             self.session.headers['Accept'] = 'application/json, text/plain, */*'
@@ -181,7 +231,7 @@ class VaticanClient:
         }
 
         try:
-            response = self.session.get(
+            response = self._get(
                 f'{VATICAN_API_BASE}/search/calendar',
                 params=params,
                 timeout=30
@@ -245,6 +295,7 @@ class VaticanClient:
             dict con 'visits': lista de productos disponibles
             Cada producto tiene: id, name, availability, who, etc.
             availability: AVAILABLE, LOW_AVAILABILITY, SOLD_OUT, NOT_ALLOWED
+            Si la petición falla, 'visits' viene vacío e 'error' indica el motivo
         """
         self._random_delay(1, 3)
         self._update_headers()
@@ -259,7 +310,7 @@ class VaticanClient:
         }
 
         try:
-            response = self.session.get(
+            response = self._get(
                 f'{VATICAN_API_BASE}/search/resultPerTag',
                 params=params,
                 timeout=30
@@ -270,7 +321,7 @@ class VaticanClient:
                 print(f"Error 500 para {visit_date}, refrescando sesión...")
                 self.refresh_session()
                 self._random_delay(2, 4)
-                response = self.session.get(
+                response = self._get(
                     f'{VATICAN_API_BASE}/search/resultPerTag',
                     params=params,
                     timeout=30
@@ -280,7 +331,7 @@ class VaticanClient:
             return response.json()
         except requests.RequestException as e:
             print(f"Error buscando disponibilidad para {visit_date}: {e}")
-            return {'visits': [], 'totalResults': 0}
+            return {'visits': [], 'totalResults': 0, 'error': str(e)}
 
     def get_available_products(
         self,
@@ -304,27 +355,49 @@ class VaticanClient:
             Lista de productos disponibles
         """
         data = self.search_availability(visit_date, visitor_num, tag, who_id)
+        return filter_products(data.get('visits', []), product_filter)
 
-        # Productos a excluir
-        excluded_products = ['palazzo papale', 'castel gandolfo']
+    def get_timeslots(
+        self,
+        visit_date: str,
+        product_id: int,
+        visitor_num: int = DEFAULT_VISITOR_NUM,
+        lang: str = 'it'
+    ) -> dict:
+        """
+        Obtiene los horarios de un producto para una fecha.
 
-        available = []
-        for visit in data.get('visits', []):
-            availability = visit.get('availability', '')
-            if availability in ['AVAILABLE', 'LOW_AVAILABILITY']:
-                name = visit.get('name', '').lower()
+        Args:
+            visit_date: Fecha en formato DD/MM/YYYY
+            product_id: ID del producto (campo 'id' de resultPerTag)
+            visitor_num: Número de visitantes
+            lang: Idioma
 
-                # Excluir productos no deseados
-                if any(excluded in name for excluded in excluded_products):
-                    continue
+        Returns:
+            dict con 'timetable': lista de {time, availability, ...}
+            availability: AVAILABLE, LOW_AVAILABILITY, SOLD_OUT
+        """
+        self._update_headers()
 
-                # Aplicar filtro de producto si existe
-                if product_filter:
-                    if product_filter.lower() not in name:
-                        continue
-                available.append(visit)
+        params = {
+            'lang': lang,
+            'visitLang': '',
+            'visitTypeId': product_id,
+            'visitorNum': visitor_num,
+            'visitDate': visit_date
+        }
 
-        return available
+        try:
+            response = self._get(
+                f'{VATICAN_API_BASE}/visit/timeavail',
+                params=params,
+                timeout=30
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            print(f"Error obteniendo horarios para {visit_date} ({product_id}): {e}")
+            return {'timetable': [], 'error': str(e)}
 
     def check_availability(
         self,
@@ -377,7 +450,7 @@ class VaticanClient:
         }
 
         try:
-            response = self.session.get(
+            response = self._get(
                 f'{VATICAN_API_BASE}/search/filter',
                 params=params,
                 timeout=30
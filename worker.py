@@ -0,0 +1,64 @@
+"""
+Proceso worker del monitor
+
+Ejecuta el monitor (scheduler, verificaciones y Telegram) fuera del proceso
+de Flask. Publica su estado y atiende órdenes de la app web a través del
+canal IPC en SQLite (ver ipc.py).
+
+Uso:
+    python worker.py                      # worker
+    MONITOR_MODE=worker python app.py     # app web que delega en el worker
+"""
+import time
+from monitor import monitor
+from ipc import MonitorIPC
+from config import WORKER_POLL_SECONDS
+
+
+def handle_command(command: str) -> dict:
+    """Ejecuta una orden recibida de la app web."""
+    if command == 'check_now':
+        return {'success': True, 'job': monitor.enqueue_check()}
+    if command == 'clear_alerts':
+        monitor.clear_alerted_slots()
+        return {'success': True}
+    if command == 'start':
+        if not monitor.is_running():
+            monitor.start()
+        return {'success': True, 'running': True}
+    if command == 'stop':
+        if monitor.is_running():
+            monitor.stop()
+        return {'success': True, 'running': False}
+    return {'success': False, 'error': f'Orden desconocida: {command}'}
+
+
+def run_worker(poll_seconds: float = WORKER_POLL_SECONDS):
+    """Bucle principal: atiende órdenes y publica el estado."""
+    ipc = MonitorIPC()
+    monitor.start()
+    print(f"🔌 Worker escuchando órdenes en {ipc.path}")
+
+    while True:
+        for cmd in ipc.pending_commands():
+            try:
+                result = handle_command(cmd['command'])
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            ipc.complete_command(cmd['id'], result)
+
+        try:
+            ipc.publish_status(monitor.get_status(), monitor.jobs.snapshot())
+        except Exception as e:
+            print(f"Error publicando estado del worker: {e}")
+
+        time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    try:
+        run_worker()
+    except KeyboardInterrupt:
+        if monitor.is_running():
+            monitor.stop()
+        print("\n👋 Worker detenido")